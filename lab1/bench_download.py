@@ -0,0 +1,77 @@
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from client import download, download_segmented, parse_http_response
+
+
+def buffered(host, port, path, save_path):
+    # the old client, kept as it was: 4 KB recv()s appended with +=, which copies
+    # everything received so far on each one, then the whole response in memory
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    client_socket.connect((host, port))
+    client_socket.sendall(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+    response_data = b''
+    while True:
+        chunk = client_socket.recv(4096)
+        if not chunk:
+            break
+        response_data += chunk
+    client_socket.close()
+    status_code, _, body = parse_http_response(response_data)
+    if status_code != 200:
+        raise IOError(f"status {status_code}")
+    with open(save_path, 'wb') as f:
+        f.write(body)
+    return len(body)
+
+
+def single_stream(host, port, path, save_path):
+    # recv_into one reusable buffer, straight to the file
+    with open(save_path, 'wb') as f:
+        status_code, _, written = download(host, port, path, f)
+    if status_code != 200:
+        raise IOError(f"status {status_code}")
+    return written
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python bench_download.py <server_host> <server_port> <url_path> [runs]")
+        print("Example: python bench_download.py localhost 8001 /document2.pdf 5")
+        sys.exit(1)
+
+    host = sys.argv[1]
+    port = int(sys.argv[2])
+    path = sys.argv[3]
+    runs = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+
+    save_path = os.path.join(tempfile.mkdtemp(prefix="bench_download_"), "download")
+    strategies = [("buffered (+=)", lambda: buffered(host, port, path, save_path)),
+                  ("single stream", lambda: single_stream(host, port, path, save_path))]
+    for segments in (2, 4, 8):
+        strategies.append((f"{segments} segments",
+                           lambda n=segments: download_segmented(host, port, path, save_path, n)))
+
+    print("=" * 70)
+    print(f"Downloading {path} from {host}:{port}, best of {runs}")
+    print("=" * 70)
+    for name, download in strategies:
+        best = None
+        size = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            size = download()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rate = size / best / 1024 / 1024 if size and best else 0
+        print(f"{name:<16} {best * 1000:>9.1f} ms {rate:>9.1f} MB/s")
+    print("=" * 70)
+    os.remove(save_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,23 @@
+import io
+import random
 import socket
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import unquote, urljoin, urlsplit
+
+# receive buffer, reused for the whole response: memory use does not grow with the file
+CHUNK_SIZE = 256 * 1024
+# seconds between progress lines
+PROGRESS_INTERVAL = 0.5
+# batch mode: attempts per file, and the first backoff delay (doubled each retry)
+MAX_ATTEMPTS = 4
+BACKOFF = 0.25
+# statuses worth retrying: the server is busy or rate limiting, not refusing
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 def parse_http_response(response_data):
     """Parse HTTP response into status, headers, and body"""
@@ -31,44 +48,422 @@ def parse_http_response(response_data):
     
     return status_code, headers, body
 
-def send_http_request(host, port, path):
-    """Send HTTP GET request and return response"""
-    try:
-        # Create socket
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.settimeout(10)
-        
-        # Connect to server
-        client_socket.connect((host, port))
-        
-        # Create HTTP GET request
-        request = f"GET {path} HTTP/1.1\r\n"
-        request += f"Host: {host}:{port}\r\n"
-        request += "Connection: close\r\n"
-        request += "\r\n"
-        
-        # Send request
-        client_socket.sendall(request.encode('utf-8'))
-        
-        # Receive response
-        response_data = b''
+class ResponseReader:
+    """Reads HTTP responses off a socket through one reusable buffer.
+
+    read_head() receives until the blank line and parses the status line and
+    headers. stream_body() then copies the body into a file object,
+    recv_into() the same buffer at a time. Nothing is concatenated, so a
+    multi-GB download runs in constant memory. Bytes that arrived past the
+    end of a response stay buffered for the next one on the connection.
+    """
+    
+    def __init__(self, client_socket, chunk_size=CHUNK_SIZE):
+        self.socket = client_socket
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+        # unread bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+    
+    def read_head(self):
+        """Return (status_code, headers) of the next response; header names are lower-cased"""
+        # keep what is left of the previous response at the front of the buffer
+        if self.start:
+            self.buffer[:self.end - self.start] = self.buffer[self.start:self.end]
+            self.end -= self.start
+            self.start = 0
+        scanned = 0
         while True:
-            chunk = client_socket.recv(4096)
-            if not chunk:
+            head_end = self.buffer.find(b'\r\n\r\n', max(scanned - 3, 0), self.end)
+            if head_end >= 0:
                 break
-            response_data += chunk
-        
-        client_socket.close()
+            scanned = self.end
+            if self.end == len(self.buffer):
+                raise ValueError('response head does not fit in the receive buffer')
+            received = self.socket.recv_into(self.view[self.end:])
+            if not received:
+                raise ConnectionError('connection closed before the response head')
+            self.end += received
         
-        return response_data
+        lines = self.buffer[:head_end].decode('latin-1').split('\r\n')
+        self.start = head_end + 4
+        status_line = lines[0].split(' ', 2)
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            raise ValueError(f'malformed status line: {lines[0]!r}')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        return int(status_line[1]), headers
+    
+    def stream_body(self, out, length=None, progress=None):
+        """Copy the body to `out`; `length` is Content-Length, None reads to EOF. Returns bytes copied"""
+        written = 0
+        if self.end > self.start:
+            take = self.end - self.start if length is None else min(length, self.end - self.start)
+            out.write(self.view[self.start:self.start + take])
+            self.start += take
+            written = take
+        if self.start == self.end:
+            self.start = self.end = 0
+        while length is None or written < length:
+            want = len(self.buffer) if length is None else min(len(self.buffer), length - written)
+            received = self.socket.recv_into(self.view, want)
+            if not received:
+                if length is None:
+                    break
+                raise ConnectionError(f'connection closed after {written} of {length} body bytes')
+            out.write(self.view[:received])
+            written += received
+            if progress is not None:
+                progress.update(written)
+        if progress is not None:
+            progress.finish(written)
+        return written
+
+class Progress:
+    """Prints bytes received, percentage and throughput on one updating line"""
     
+    def __init__(self, total=None, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.last = self.started
+    
+    def _line(self, done, now):
+        rate = done / max(now - self.started, 1e-9) / 1024 / 1024
+        line = f'{done / 1024 / 1024:.1f} MB'
+        if self.total:
+            line += f' / {self.total / 1024 / 1024:.1f} MB ({done * 100 // self.total}%)'
+        return f'{line}  {rate:.1f} MB/s'
+    
+    def update(self, done):
+        now = time.perf_counter()
+        if now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            self.stream.write('\r' + self._line(done, now) + '   ')
+            self.stream.flush()
+    
+    def finish(self, done):
+        self.stream.write('\r' + self._line(done, time.perf_counter()) + '   \n')
+        self.stream.flush()
+
+def content_length(headers):
+    """Content-Length as an int, None when absent or invalid"""
+    value = headers.get('content-length', '')
+    return int(value) if value.isdigit() else None
+
+def open_request(host, port, path, extra_headers=None, keep_alive=False):
+    """Connect and send a GET request; returns the socket to read the response from"""
+    client_socket = socket.create_connection((host, port), timeout=10)
+    request = f"GET {path} HTTP/1.1\r\n"
+    request += f"Host: {host}:{port}\r\n"
+    for name, value in (extra_headers or {}).items():
+        request += f"{name}: {value}\r\n"
+    request += "Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n"
+    request += "\r\n"
+    client_socket.sendall(request.encode('utf-8'))
+    return client_socket
+
+def download(host, port, path, out, extra_headers=None, show_progress=False):
+    """GET path and stream its body into the file object `out`.
+
+    Returns (status_code, headers, bytes_written), or (None, None, 0) when
+    the request failed (the reason is printed).
+    """
+    try:
+        client_socket = open_request(host, port, path, extra_headers)
+        with client_socket:
+            reader = ResponseReader(client_socket)
+            status_code, headers = reader.read_head()
+            length = content_length(headers)
+            progress = Progress(length) if show_progress else None
+            written = reader.stream_body(out, length, progress)
+        return status_code, headers, written
     except socket.timeout:
         print("Error: Connection timed out")
-        return None
     except ConnectionRefusedError:
         print("Error: Connection refused. Is the server running?")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+    return None, None, 0
+
+class ConnectionPool:
+    """Keep-alive connections to one server, shared by the batch download threads.
+
+    get() hands out an idle connection, or opens a new one if there is none.
+    put() returns it for reuse, unless the server said it will close it. Each
+    connection keeps its ResponseReader, so bytes read past a response are
+    not lost.
+    """
+    
+    def __init__(self, host, port, max_idle=32):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+    
+    def get(self):
+        """Return (reader, reused)"""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+            self.opened += 1
+        return ResponseReader(socket.create_connection((self.host, self.port), timeout=10)), False
+    
+    def put(self, reader):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(reader)
+                return
+        reader.socket.close()
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for reader in idle:
+            reader.socket.close()
+    
+    def fetch(self, path, out, extra_headers=None):
+        """GET path on a pooled connection and stream the body into `out`.
+
+        Returns (status_code, headers, bytes_written); raises OSError/ValueError.
+        A reused connection the server has meanwhile closed is retried once on
+        a fresh one.
+        """
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        for name, value in (extra_headers or {}).items():
+            request += f"{name}: {value}\r\n"
+        request = (request + "Connection: keep-alive\r\n\r\n").encode('utf-8')
+        while True:
+            reader, reused = self.get()
+            position = out.tell()
+            try:
+                reader.socket.sendall(request)
+                status_code, headers = reader.read_head()
+                written = reader.stream_body(out, content_length(headers))
+            except (OSError, ValueError):
+                reader.socket.close()
+                if reused:
+                    # an idle connection the server timed out: nothing was received, go again
+                    out.seek(position)
+                    out.truncate()
+                    continue
+                raise
+            if headers.get('connection', '').lower() == 'close' or 'content-length' not in headers:
+                reader.socket.close()
+            else:
+                self.put(reader)
+            return status_code, headers, written
+
+class _LinkParser(HTMLParser):
+    """Collects (url, is_directory) from the links and images of a listing or page"""
+    
+    def __init__(self):
+        super().__init__()
+        self.links = []
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'img' and attrs.get('src'):
+            self.links.append((attrs['src'], False))
+        elif tag == 'a' and attrs.get('href'):
+            href = attrs['href']
+            # lab2 listings end directory links with '/', lab1 listings mark them class="dir"
+            self.links.append((href, href.endswith('/') or 'dir' in (attrs.get('class') or '').split()))
+
+def fetch_with_retries(pool, path, out):
+    """pool.fetch() into the file object `out`, retrying with exponential backoff.
+
+    Connection errors and the statuses in RETRY_STATUSES are retried, up to
+    MAX_ATTEMPTS in all; `out` is emptied before each attempt. Returns
+    (status_code, headers, bytes_written); status_code is None when the last
+    attempt got no response.
+    """
+    status_code, headers, written = None, None, 0
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            # Retry-After when the server sent one, otherwise 0.25s, 0.5s, 1s... with jitter
+            delay = BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if headers is not None and headers.get('retry-after', '').isdigit():
+                delay = max(delay, int(headers['retry-after']))
+            time.sleep(delay)
+            out.seek(0)
+            out.truncate()
+        try:
+            status_code, headers, written = pool.fetch(path, out)
+        except (OSError, ValueError) as e:
+            status_code, headers, written = None, None, 0
+            print(f"  {path}: {e}" + (", retrying" if attempt + 1 < MAX_ATTEMPTS else ""))
+            continue
+        if status_code not in RETRY_STATUSES:
+            break
+    return status_code, headers, written
+
+def download_with_retries(pool, path, save_path):
+    """Download path to save_path through a .part file; returns (status_code, bytes_written)"""
+    os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+    partial_path = save_path + '.part'
+    with open(partial_path, 'wb') as f:
+        status_code, _, written = fetch_with_retries(pool, path, f)
+    if status_code == 200:
+        os.replace(partial_path, save_path)
+    else:
+        os.remove(partial_path)
+    return status_code, written
+
+def list_directory(pool, dir_path):
+    """Fetch a directory listing; returns (file paths, subdirectory paths) below dir_path"""
+    listing = io.BytesIO()
+    status_code, _, _ = fetch_with_retries(pool, dir_path, listing)
+    if status_code != 200:
+        raise IOError(f"listing {dir_path} returned status {status_code}")
+    parser = _LinkParser()
+    parser.feed(listing.getvalue().decode('utf-8', errors='ignore'))
+    files, dirs = [], []
+    for href, is_directory in parser.links:
+        parts = urlsplit(urljoin(dir_path, href))
+        if parts.netloc or parts.query:
+            continue
+        path = parts.path
+        if is_directory and not path.endswith('/'):
+            path += '/'
+        # only what is below this directory: no parent or sibling links, no loops
+        if not path.startswith(dir_path) or path == dir_path:
+            continue
+        (dirs if is_directory else files).append(path)
+    return files, dirs
+
+def batch_download(host, port, paths, save_directory, parallel, mirror=False):
+    """Download many paths over a shared keep-alive connection pool.
+
+    With mirror=True, `paths` are directories whose listings are crawled
+    recursively and every file found is downloaded. Files are saved under
+    save_directory with their URL path. Returns the number of failures.
+    """
+    pool = ConnectionPool(host, port, max_idle=parallel)
+    started = time.perf_counter()
+    failures = 0
+    total_bytes = 0
+    files = []
+    
+    def crawl(dir_path):
+        try:
+            return list_directory(pool, dir_path)
+        except (OSError, ValueError) as e:
+            print(f"  {dir_path}: {e}")
+            return None
+    
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            if mirror:
+                level = [p if p.endswith('/') else p + '/' for p in paths]
+                root = level[0] if len(level) == 1 else '/'
+                # one level of the tree at a time, its listings fetched in parallel
+                while level:
+                    next_level = []
+                    for found in executor.map(crawl, level):
+                        if found is None:
+                            failures += 1
+                            continue
+                        files.extend(found[0])
+                        next_level.extend(found[1])
+                    level = next_level
+                print(f"Found {len(files)} files")
+            else:
+                files, root = paths, '/'
+            
+            def fetch_one(path):
+                relative = unquote(path[len(root):] if path.startswith(root) else path.lstrip('/'))
+                save_path = os.path.join(save_directory, *[p for p in relative.split('/') if p not in ('', '.', '..')])
+                return path, save_path, download_with_retries(pool, path, save_path)
+            
+            for path, save_path, (status_code, written) in executor.map(fetch_one, files):
+                if status_code == 200:
+                    total_bytes += written
+                    print(f"  {path} -> {save_path} ({written} bytes)")
+                else:
+                    failures += 1
+                    print(f"  {path}: failed (status {status_code})")
+    finally:
+        pool.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"\n{total_bytes} bytes, {failures} failures in {elapsed:.2f}s "
+          f"({pool.opened} connections opened, {pool.reused} reuses)")
+    return failures
+
+class FileChanged(IOError):
+    """A segment came back whole (200): the file changed since the probe"""
+
+def download_segmented(host, port, path, save_path, segments, attempts=3):
+    """Download path as byte ranges over parallel connections and reassemble it.
+
+    Returns the number of bytes written, or None on failure. Falls back to a
+    single stream when the server does not answer the probe with 206, and
+    starts over (up to `attempts` times) when the file changes mid-download.
+    """
+    for _ in range(attempts):
+        try:
+            return _download_segments(host, port, path, save_path, segments)
+        except FileChanged as e:
+            print(f"{e}, starting over")
+    print(f"Error: {path} kept changing, gave up after {attempts} attempts")
+    return None
+
+def _download_segments(host, port, path, save_path, segments):
+    # Probe with a one-byte range to learn the total size; a server without
+    # range support sends the whole file, which is then already on disk
+    with open(save_path, 'wb') as f:
+        status_code, headers, written = download(host, port, path, f, {'Range': 'bytes=0-0'})
+    if status_code == 200:
+        print("Server does not support ranges, downloaded as a single stream")
+        return written
+    if status_code == 416 and headers.get('content-range', '').replace(' ', '') == 'bytes*/0':
+        # Nothing to split: an empty file has no satisfiable range
+        return 0
+    if status_code != 206 or '/' not in headers.get('content-range', ''):
+        print(f"Error: Range probe returned status {status_code}")
         return None
-    except Exception as e:
+    total = int(headers['content-range'].rsplit('/', 1)[1])
+    # With If-Range the server sends the whole file (200) instead of the
+    # range once the file no longer matches the probe's validator
+    validator = headers.get('etag') or headers.get('last-modified')
+    
+    segment_size = -(-total // segments)
+    ranges = [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+    
+    with open(save_path, 'wb') as f:
+        f.truncate(total)
+    
+    def fetch_segment(byte_range):
+        start, end = byte_range
+        request_headers = {'Range': f'bytes={start}-{end}'}
+        if validator:
+            request_headers['If-Range'] = validator
+        # Each segment streams into its own slice of the preallocated file
+        with open(save_path, 'r+b') as f:
+            f.seek(start)
+            status_code, _, written = download(host, port, path, f, request_headers)
+        if status_code == 200:
+            raise FileChanged(f"{path} changed on the server during the download")
+        if status_code != 206 or written != end - start + 1:
+            raise IOError(f"segment {start}-{end} failed (status {status_code})")
+        return written
+    
+    print(f"Downloading {total} bytes in {len(ranges)} segments")
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            return sum(pool.map(fetch_segment, ranges))
+    except FileChanged:
+        raise
+    except IOError as e:
         print(f"Error: {e}")
         return None
 
@@ -104,15 +499,36 @@ def get_content_type(headers, filename):
     return 'unknown'
 
 def main():
-    if len(sys.argv) != 5:
-        print("Usage: python client.py <server_host> <server_port> <url_path> <directory>")
+    if len(sys.argv) not in (5, 6) and not (len(sys.argv) in (6, 7) and sys.argv[3] in ('--batch', '--mirror')):
+        print("Usage: python client.py <server_host> <server_port> <url_path> <directory> [segments]")
+        print("       python client.py <server_host> <server_port> --batch <paths_file> <directory> [parallel]")
+        print("       python client.py <server_host> <server_port> --mirror <url_path> <directory> [parallel]")
         print("Example: python client.py localhost 8080 /document.pdf ./downloads")
+        print("Parallel: python client.py localhost 8080 /document.pdf ./downloads 4")
+        print("Batch: python client.py localhost 8080 --batch paths.txt ./downloads 8")
+        print("Mirror: python client.py localhost 8001 --mirror / ./mirror 8")
         sys.exit(1)
     
     host = sys.argv[1]
     port = int(sys.argv[2])
+    
+    # Batch modes: many files over a pool of keep-alive connections
+    if sys.argv[3] in ('--batch', '--mirror'):
+        source, save_directory = sys.argv[4], sys.argv[5]
+        parallel = int(sys.argv[6]) if len(sys.argv) == 7 else 8
+        if sys.argv[3] == '--mirror':
+            paths = [source if source.startswith('/') else '/' + source]
+        else:
+            # one path per line; '-' reads them from stdin
+            with (sys.stdin if source == '-' else open(source)) as f:
+                lines = [line.strip() for line in f]
+            paths = [p if p.startswith('/') else '/' + p for p in lines if p and not p.startswith('#')]
+        failures = batch_download(host, port, paths, save_directory, parallel, sys.argv[3] == '--mirror')
+        sys.exit(1 if failures else 0)
+    
     path = sys.argv[3]
     save_directory = sys.argv[4]
+    segments = int(sys.argv[5]) if len(sys.argv) == 6 else 1
     
     # Ensure path starts with /
     if not path.startswith('/'):
@@ -125,17 +541,26 @@ def main():
     
     print(f"Requesting: http://{host}:{port}{path}")
     
-    # Send request
-    response_data = send_http_request(host, port, path)
+    # Segmented mode: N ranges over N connections, saved straight to disk
+    if segments > 1:
+        save_path = os.path.join(save_directory, get_filename_from_path(path))
+        written = download_segmented(host, port, path, save_path, segments)
+        if written is None:
+            sys.exit(1)
+        print(f"\nFile saved to: {save_path}")
+        print(f"Size: {written} bytes")
+        return
     
-    if response_data is None:
-        sys.exit(1)
+    filename = get_filename_from_path(path)
+    save_path = os.path.join(save_directory, filename)
+    partial_path = save_path + '.part'
     
-    # Parse response
-    status_code, headers, body = parse_http_response(response_data)
+    # Stream the body to disk as it arrives; moved into place once it is complete
+    with open(partial_path, 'wb') as f:
+        status_code, headers, written = download(host, port, path, f, show_progress=True)
     
     if status_code is None:
-        print("Error: Failed to parse response")
+        os.remove(partial_path)
         sys.exit(1)
     
     print(f"Status: {status_code}")
@@ -143,11 +568,12 @@ def main():
     if status_code != 200:
         print(f"Error: Server returned status {status_code}")
         print("Response body:")
-        print(body.decode('utf-8', errors='ignore'))
+        with open(partial_path, 'rb') as f:
+            print(f.read().decode('utf-8', errors='ignore'))
+        os.remove(partial_path)
         sys.exit(1)
     
     # Determine file type
-    filename = get_filename_from_path(path)
     file_type = get_content_type(headers, filename)
     
     print(f"Content-Type: {headers.get('content-type', 'unknown')}")
@@ -156,6 +582,9 @@ def main():
     # Handle based on file type
     if file_type == 'html':
         # Print HTML body
+        with open(partial_path, 'rb') as f:
+            body = f.read()
+        os.remove(partial_path)
         print("\n" + "="*50)
         print("HTML CONTENT:")
         print("="*50)
@@ -164,20 +593,14 @@ def main():
     
     elif file_type in ['pdf', 'png']:
         # Save file
-        save_path = os.path.join(save_directory, filename)
-        
-        with open(save_path, 'wb') as f:
-            f.write(body)
+        os.replace(partial_path, save_path)
         
         print(f"\nFile saved to: {save_path}")
-        print(f"Size: {len(body)} bytes")
+        print(f"Size: {written} bytes")
     
     else:
         print(f"\nUnknown file type. Saving as: {filename}")
-        save_path = os.path.join(save_directory, filename)
-        
-        with open(save_path, 'wb') as f:
-            f.write(body)
+        os.replace(partial_path, save_path)
         
         print(f"File saved to: {save_path}")
 
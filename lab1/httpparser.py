@@ -0,0 +1,134 @@
+from typing import Dict, NamedTuple, Optional
+
+# lab1/httpparser.py and lab2/httpparser.py are the same file: each lab is its own
+# Docker build context, so each carries a copy
+
+MAX_REQUEST_LINE = 8190
+MAX_HEADER_BYTES = 8192
+MAX_HEADERS = 100
+# GET requests have no use for a body; a small one is read and thrown away
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {
+    400: "Bad Request",
+    413: "Content Too Large",
+    414: "URI Too Long",
+    431: "Request Header Fields Too Large",
+    501: "Not Implemented",
+    505: "HTTP Version Not Supported",
+}
+
+
+class ParseError(Exception):
+    """A request the server cannot take; `status` is the HTTP status to answer with.
+
+    The connection is out of sync after one of these, so it has to be closed.
+    """
+
+    def __init__(self, status: int, detail: str = ""):
+        super().__init__(detail or REASONS[status])
+        self.status = status
+        self.reason = REASONS[status]
+
+
+class RequestHead(NamedTuple):
+    method: str
+    # as sent: not percent-decoded
+    target: str
+    version: str
+    # names lower-cased; repeated headers joined with ", "
+    headers: Dict[str, str]
+
+
+class RequestParser:
+    """Incremental HTTP/1.x request parser for one connection.
+
+    feed() whatever recv() returned, then call next_request() until it returns
+    None. Requests may arrive split over any number of segments, or several
+    (pipelined) in one; bytes past the current request stay buffered. The
+    buffer is scanned once: a search for the end of the head resumes where
+    the previous one stopped, and the head is decoded in one go.
+    """
+
+    def __init__(self, max_header_bytes: int = MAX_HEADER_BYTES, max_headers: int = MAX_HEADERS,
+                 max_body_bytes: int = MAX_BODY_BYTES):
+        self.max_header_bytes = max_header_bytes
+        self.max_headers = max_headers
+        self.max_body_bytes = max_body_bytes
+        self._buf = bytearray()
+        # where the search for the blank line resumes
+        self._scanned = 0
+        # body bytes of the previous request still to be dropped
+        self._skip = 0
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf)
+
+    def next_request(self) -> Optional[RequestHead]:
+        # the next complete request head, None if more data is needed; raises ParseError
+        if self._skip:
+            dropped = min(self._skip, len(self._buf))
+            del self._buf[:dropped]
+            self._skip -= dropped
+            if self._skip:
+                return None
+
+        # leading CRLFs between requests are allowed (RFC 9112, section 2.2)
+        while self._buf[:2] == b"\r\n":
+            del self._buf[:2]
+            self._scanned = 0
+
+        # the request line's own limit comes first: an over-long target is 414
+        # even when it also takes the whole head over max_header_bytes
+        if self._buf.find(b"\r\n", 0, MAX_REQUEST_LINE + 2) < 0 and len(self._buf) > MAX_REQUEST_LINE:
+            raise ParseError(414)
+        end = self._buf.find(b"\r\n\r\n", max(self._scanned - 3, 0))
+        if end < 0:
+            self._scanned = len(self._buf)
+            if len(self._buf) > self.max_header_bytes:
+                raise ParseError(431)
+            return None
+        if end > self.max_header_bytes:
+            raise ParseError(431)
+
+        head = self._buf[:end].decode("latin-1")
+        del self._buf[:end + 4]
+        self._scanned = 0
+
+        lines = head.split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3 or not all(parts):
+            raise ParseError(400, "malformed request line")
+        method, target, version = parts
+        if not version.startswith("HTTP/1."):
+            raise ParseError(505 if version.startswith("HTTP/") else 400)
+        if len(lines) - 1 > self.max_headers:
+            raise ParseError(431, "too many header fields")
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            # no obsolete line folding, no whitespace between name and colon
+            if not sep or not name or name[0] in " \t" or name[-1] in " \t":
+                raise ParseError(400, "malformed header field")
+            name = name.lower()
+            value = value.strip(" \t")
+            if name in headers:
+                headers[name] += ", " + value
+            else:
+                headers[name] = value
+
+        if "transfer-encoding" in headers:
+            raise ParseError(501, "request bodies are not supported")
+        length = headers.get("content-length")
+        if length is not None:
+            if not (length.isascii() and length.isdigit()):
+                raise ParseError(400, "bad Content-Length")
+            if int(length) > self.max_body_bytes:
+                raise ParseError(413)
+            self._skip = int(length)
+        return RequestHead(method, target, version, headers)
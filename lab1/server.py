@@ -1,8 +1,11 @@
 import socket
 import os
 import sys
+from email.utils import formatdate, parsedate_to_datetime
 from urllib.parse import unquote
 
+from httpparser import ParseError, RequestParser
+
 # MIME types for different file extensions
 MIME_TYPES = {
     '.html': 'text/html',
@@ -10,36 +13,44 @@ MIME_TYPES = {
     '.png': 'image/png'
 }
 
-def parse_http_request(request_data):
-    """Parse HTTP request and return method, path, and headers"""
-    lines = request_data.split('\r\n')
-    request_line = lines[0].split()
-    
-    if len(request_line) < 3:
-        return None, None, None
-    
-    method = request_line[0]
-    path = request_line[1]
-    
-    # Parse headers
-    headers = {}
-    for line in lines[1:]:
-        if ':' in line:
-            key, value = line.split(':', 1)
-            headers[key.strip()] = value.strip()
-    
-    return method, path, headers
+# Cache-Control max-age for served files, in seconds (0 leaves the header out)
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '0'))
+
+def read_request(client_socket):
+    """Read one request head, however many recv() calls it takes.
+
+    Returns the parsed head, or None if the client closed or went quiet first.
+    Raises ParseError for requests that are malformed or over the size limits.
+    """
+    parser = RequestParser()
+    request = parser.next_request()
+    while request is None:
+        try:
+            data = client_socket.recv(4096)
+        except socket.timeout:
+            return None
+        if not data:
+            return None
+        parser.feed(data)
+        request = parser.next_request()
+    return request
 
 def generate_directory_listing(directory_path, url_path):
     """Generate HTML page showing directory contents"""
+    # Sort: directories first, then files (one scandir pass, d_type instead of stat calls)
+    dirs = []
+    files = []
     try:
-        items = os.listdir(directory_path)
+        with os.scandir(directory_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
     except (OSError, PermissionError):
         return None
-    
-    # Sort: directories first, then files
-    dirs = sorted([i for i in items if os.path.isdir(os.path.join(directory_path, i))])
-    files = sorted([i for i in items if os.path.isfile(os.path.join(directory_path, i))])
+    dirs.sort()
+    files.sort()
     
     html = f"""<!DOCTYPE html>
 <html>
@@ -85,39 +96,156 @@ def generate_directory_listing(directory_path, url_path):
     
     return html
 
-def create_http_response(status_code, status_text, content_type, body):
-    """Create HTTP response with headers and body"""
-    if isinstance(body, str):
-        body = body.encode('utf-8')
-    
+def create_http_header(status_code, status_text, content_type, content_length, extra_headers=None):
+    """Create the status line and headers of an HTTP response"""
     response = f"HTTP/1.1 {status_code} {status_text}\r\n"
-    response += f"Content-Type: {content_type}\r\n"
-    response += f"Content-Length: {len(body)}\r\n"
+    # a 304 has no body, so it carries neither Content-Type nor Content-Length
+    if content_type is not None:
+        response += f"Content-Type: {content_type}\r\n"
+        response += f"Content-Length: {content_length}\r\n"
+    for name, value in (extra_headers or {}).items():
+        response += f"{name}: {value}\r\n"
     response += "Connection: close\r\n"
     response += "\r\n"
     
-    return response.encode('utf-8') + body
+    return response.encode('utf-8')
 
-def handle_request(client_socket, base_directory):
-    """Handle a single HTTP request"""
+def parse_range_header(range_header, file_size):
+    """Parse a single 'bytes=start-end' Range header.
+
+    Only one range is supported: a multi-range request is not understood and
+    gets the whole file. Returns (start, end) with end inclusive, 'unsatisfiable' when the range
+    lies outside the file, or None when the header is not understood, in
+    which case the whole file is sent.
+    """
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
     try:
-        # Receive request
-        request_data = client_socket.recv(4096).decode('utf-8')
+        if first:
+            start = int(first)
+            end = int(last) if last else file_size - 1
+            if last and end < start:
+                return None
+        else:
+            start = max(file_size - int(last), 0)
+            end = file_size - 1
+    except ValueError:
+        return None
+    if start >= file_size or end < 0:
+        return 'unsatisfiable'
+    return start, min(end, file_size - 1)
+
+def get_header(headers, name):
+    """Header lookup; RequestParser already lower-cases the names"""
+    return headers.get(name.lower())
+
+def file_etag(st):
+    """Strong ETag for one version of a file, from its inode, mtime and size.
+
+    Costs no read of the file, and describes exactly the version stat() saw.
+    """
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+def parse_http_date(value):
+    """Parse an HTTP date into a timestamp, or None if it is malformed"""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+def is_not_modified(headers, etag, mtime):
+    """True when the client's cached copy is current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = get_header(headers, 'If-None-Match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return any(t.removeprefix('W/') == etag for t in tags)
+    since = get_header(headers, 'If-Modified-Since')
+    if since:
+        parsed = parse_http_date(since)
+        return parsed is not None and int(mtime) <= parsed
+    return False
+
+def range_still_valid(headers, etag, mtime):
+    """If-Range: a Range is only honoured when the client's copy is still current"""
+    condition = get_header(headers, 'If-Range')
+    if not condition:
+        return True
+    condition = condition.strip()
+    if condition.startswith('"'):
+        return condition == etag
+    parsed = parse_http_date(condition)
+    return parsed is not None and int(mtime) <= parsed
+
+def create_http_response(status_code, status_text, content_type, body):
+    """Create HTTP response with headers and body"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    
+    return create_http_header(status_code, status_text, content_type, len(body)) + body
+
+def send_file(client_socket, file_path, content_type, headers=None):
+    """Send a file response (200, 304, or 206/416 for a Range request) streamed from file_path"""
+    headers = headers or {}
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        etag = file_etag(st)
+        validators = {'ETag': etag, 'Last-Modified': formatdate(st.st_mtime, usegmt=True)}
+        if STATIC_MAX_AGE > 0:
+            validators['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}'
         
-        if not request_data:
+        if is_not_modified(headers, etag, st.st_mtime):
+            client_socket.sendall(create_http_header(304, "Not Modified", None, 0, validators))
             return
         
-        print(f"Received request:\n{request_data[:200]}...")
+        range_header = get_header(headers, 'Range')
+        if range_header and not range_still_valid(headers, etag, st.st_mtime):
+            range_header = None
+        byte_range = parse_range_header(range_header, size) if range_header else None
         
-        # Parse request
-        method, path, headers = parse_http_request(request_data)
+        if byte_range == 'unsatisfiable':
+            client_socket.sendall(create_http_header(416, "Range Not Satisfiable", content_type, 0,
+                                                     {'Content-Range': f'bytes */{size}'}))
+            return
         
-        if method is None:
-            response = create_http_response(400, "Bad Request", "text/html", 
-                                           "<h1>400 Bad Request</h1>")
+        if byte_range is None:
+            start, length = 0, size
+            header = create_http_header(200, "OK", content_type, size,
+                                        {**validators, 'Accept-Ranges': 'bytes'})
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            header = create_http_header(206, "Partial Content", content_type, length,
+                                        {**validators, 'Accept-Ranges': 'bytes',
+                                         'Content-Range': f'bytes {start}-{end}/{size}'})
+        client_socket.sendall(header)
+        # Uses os.sendfile() when available, otherwise send() in bounded chunks
+        client_socket.sendfile(f, start, length)
+
+def handle_request(client_socket, base_directory):
+    """Handle a single HTTP request"""
+    try:
+        # Receive and parse request (buffers across recv() calls, enforces size limits)
+        try:
+            request = read_request(client_socket)
+        except ParseError as e:
+            response = create_http_response(e.status, e.reason, "text/html",
+                                           f"<h1>{e.status} {e.reason}</h1>")
             client_socket.sendall(response)
             return
         
+        if request is None:
+            return
+        
+        method, path, headers = request.method, request.target, request.headers
+        print(f"Received request: {method} {path} {request.version}")
+        
         # Only support GET method
         if method != 'GET':
             response = create_http_response(405, "Method Not Allowed", "text/html",
@@ -178,12 +306,8 @@ def handle_request(client_socket, base_directory):
             print(f"415: Unsupported file type - {ext}")
             return
         
-        # Read and send file
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-        
-        response = create_http_response(200, "OK", content_type, file_content)
-        client_socket.sendall(response)
+        # Send file without loading it into memory
+        send_file(client_socket, file_path, content_type, headers)
         print(f"200: Served {file_path}")
         
     except Exception as e:
@@ -216,6 +340,8 @@ def start_server(host, port, directory):
             # Accept client connection
             client_socket, client_address = server_socket.accept()
             print(f"\nConnection from {client_address}")
+            # a client that never finishes its request must not block the server
+            client_socket.settimeout(10)
             
             # Handle request
             handle_request(client_socket, directory)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+TICKS = os.sysconf("SC_CLK_TCK")
+
+# (label, environment): a served baseline, then floods the rate limit refuses at accept
+CASES = (
+    ("admitted", {"REQUESTS_PER_SECOND": "0"}),
+    ("429, batch 1", {"REQUESTS_PER_SECOND": "1", "TIME_WINDOW": "3600", "ACCEPT_BATCH": "1"}),
+    ("429, batch 64", {"REQUESTS_PER_SECOND": "1", "TIME_WINDOW": "3600"}),
+    ("close, batch 64", {"REQUESTS_PER_SECOND": "1", "TIME_WINDOW": "3600", "RATE_REJECT": "close"}),
+)
+
+
+def _cpu_seconds(pid: int) -> float:
+    # user + system CPU time the server has used so far
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / TICKS
+
+
+async def _flood(port: int, connections: int, concurrency: int) -> Dict[str, int]:
+    # `concurrency` clients, each opening a connection, sending one request and
+    # reading to the end, until `connections` have been made
+    statuses: Dict[str, int] = {}
+    remaining = [connections]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET /index.html HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                status_line = await reader.readline()
+                await reader.read()
+                writer.close()
+                parts = status_line.split()
+                status = parts[1].decode() if len(parts) > 1 else "closed"
+            except OSError as e:
+                status = type(e).__name__
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return statuses
+
+
+def _run(mode: str, env: Dict[str, str], port: int, directory: str, connections: int,
+         concurrency: int) -> Dict:
+    env = dict(os.environ, PORT=str(port), SERVER_MODE=mode, WORK_DELAY="0", COUNT_DELAY="0", **env)
+    proc = subprocess.Popen([sys.executable, SERVER, directory], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    try:
+        cpu_before = _cpu_seconds(proc.pid)
+        start = time.perf_counter()
+        statuses = asyncio.run(_flood(port, connections, concurrency))
+        elapsed = time.perf_counter() - start
+        cpu_after = _cpu_seconds(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "us_per_conn": (cpu_after - cpu_before) / connections * 1e6,
+        "conn_per_s": connections / elapsed,
+        "statuses": statuses,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 bench_admission.py <directory> [connections] [concurrency] [modes]")
+        print("\nExample:")
+        print("  python3 bench_admission.py ./public 20000 32 thread,async")
+        sys.exit(1)
+    directory = sys.argv[1]
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    modes = sys.argv[4].split(",") if len(sys.argv) > 4 else ["thread", "pool", "async"]
+
+    rows = []
+    port = 18401
+    for mode in modes:
+        for label, env in CASES:
+            rows.append((mode, label, _run(mode, env, port, directory, connections, concurrency)))
+            port += 1
+
+    print(f"\n{'=' * 70}")
+    print(f"{connections} connections, {concurrency} at a time, one GET /index.html each")
+    print(f"{'=' * 70}")
+    print(f"{'mode':<7} {'case':<16} {'server CPU us/conn':>18} {'conn/s':>8}  statuses")
+    for mode, label, r in rows:
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        print(f"{mode:<7} {label:<16} {r['us_per_conn']:>18.1f} {r['conn_per_s']:>8.0f}  {statuses}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
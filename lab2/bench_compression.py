@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+import server_mt
+from compression import can_compress
+
+
+def _paths(root: str):
+    # every directory listing and served file under root, as request targets
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        rel = os.path.relpath(dirpath, root)
+        prefix = "/" if rel == "." else "/" + rel.replace(os.sep, "/") + "/"
+        yield prefix
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in server_mt.ALLOWED_EXTENSIONS:
+                yield prefix + name
+
+
+def _wire_bytes(reply: server_mt.Reply) -> int:
+    # what one response puts on the socket: head plus body
+    if reply.file_path is None:
+        return sum(len(b) for b in server_mt._reply_buffers(reply, True, 1)[1])
+    size = os.path.getsize(reply.file_path)
+    status, headers, parts, trailer = server_mt._body_plan(reply, size)
+    head = server_mt._encode_head(status, headers) + server_mt._connection_tail(True, 1)
+    return len(head) + int(headers["Content-Length"])
+
+
+def _measure(root: str, path: str, accept: str, repeats: int):
+    headers = {"accept-encoding": accept} if accept else {}
+    request = server_mt.Request(path, "HTTP/1.1", headers)
+    reply = server_mt._route(request, root)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        reply = server_mt._route(request, root)
+        _wire_bytes(reply)
+    per_request = (time.perf_counter() - start) / repeats
+    return _wire_bytes(reply), per_request, reply.headers.get("Content-Encoding", "-")
+
+
+def main():
+    root = os.path.realpath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "public"))
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    # link speed used to turn bytes into transfer time, in Mbit/s
+    link = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    encodings = [""] + [enc for enc in ("gzip", "br") if can_compress(enc)]
+    print(f"\n{'=' * 70}")
+    print(f"Content-Encoding on {root}")
+    print(f"(server-side time per request after warm-up; transfer at {link:g} Mbit/s)")
+    print(f"{'=' * 70}")
+    print(f"{'path':<28} {'accept':<8} {'sent':<6} {'bytes':>9} {'server':>9} {'transfer':>9}")
+    totals = {enc: 0 for enc in encodings}
+    for path in _paths(root):
+        for accept in encodings:
+            size, seconds, sent = _measure(root, path, accept, repeats)
+            totals[accept] += size
+            transfer = size * 8 / (link * 1e6)
+            print(f"{path[-28:]:<28} {accept or 'none':<8} {sent:<6} {size:>9} "
+                  f"{seconds * 1e6:>7.1f}us {transfer * 1000:>7.1f}ms")
+    print(f"{'=' * 70}")
+    for accept, total in totals.items():
+        saved = 1 - total / totals[""]
+        print(f"Total with Accept-Encoding {accept or 'none':<6} {total:>10} bytes  ({saved:>6.1%} saved)")
+    print(f"Compressed variants: {server_mt.COMPRESSED_CACHE.stats()}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+from typing import Callable, Dict
+
+from counters import ShardedCounter
+
+WORKER_COUNTS = [1, 2, 4, 8, 16, 32]
+
+
+def _global_lock_bump(delay: float) -> Callable[[str], None]:
+    # the previous _bump_count: read, simulated work and write under one lock
+    counts: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def bump(key: str) -> None:
+        with lock:
+            current = counts.get(key, 0)
+            time.sleep(delay)
+            counts[key] = current + 1
+
+    bump.total = lambda key: counts.get(key, 0)
+    return bump
+
+
+def _sharded_bump(delay: float) -> Callable[[str], None]:
+    counter = ShardedCounter()
+
+    def bump(key: str) -> None:
+        time.sleep(delay)
+        counter.increment(key)
+
+    bump.total = counter.get
+    return bump
+
+
+def _run(bump: Callable[[str], None], workers: int, per_worker: int) -> float:
+    start_barrier = threading.Barrier(workers + 1)
+
+    def worker():
+        start_barrier.wait()
+        for _ in range(per_worker):
+            bump("/index.html")
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def main():
+    delay = float(sys.argv[1]) if len(sys.argv) > 1 else 0.01
+    per_worker = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"\n{'=' * 70}")
+    print(f"Counter contention: {per_worker} bumps per worker, {delay * 1000:.0f}ms simulated work each")
+    print(f"{'=' * 70}")
+    print(f"{'workers':>7} {'global lock':>14} {'sharded':>14} {'speedup':>8}  exact")
+    for workers in WORKER_COUNTS:
+        rates = []
+        exact = True
+        for make in (_global_lock_bump, _sharded_bump):
+            bump = make(delay)
+            seconds = _run(bump, workers, per_worker)
+            rates.append(workers * per_worker / seconds)
+            exact = exact and bump.total("/index.html") == workers * per_worker
+        print(f"{workers:>7} {rates[0]:>10.1f}/s {rates[1]:>10.1f}/s {rates[1] / rates[0]:>7.1f}x  {exact}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import socket
+import sys
+import time
+from typing import List, Tuple
+
+PAGE = ["/index.html", "/logo.png"]
+
+
+def _read_response(sock: socket.socket, buf: bytes) -> Tuple[int, bytes]:
+    # one response off a (possibly persistent) connection -> (status, leftover)
+    while b"\r\n\r\n" not in buf:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("server closed before the response head")
+        buf += chunk
+    head, _, buf = buf.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    while len(buf) < length:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("server closed mid-body")
+        buf += chunk
+    return status, buf[length:]
+
+
+def _request(path: str, host: str, close: bool) -> bytes:
+    connection = "close" if close else "keep-alive"
+    return f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: {connection}\r\n\r\n".encode()
+
+
+def load_page_fresh(host: str, port: int) -> Tuple[float, int]:
+    # one TCP connection per asset, like the server used to force
+    start = time.perf_counter()
+    for path in PAGE:
+        with socket.create_connection((host, port)) as sock:
+            sock.sendall(_request(path, host, close=True))
+            _read_response(sock, b"")
+    return time.perf_counter() - start, len(PAGE)
+
+
+def load_page_keepalive(host: str, port: int, pipeline: bool) -> Tuple[float, int]:
+    start = time.perf_counter()
+    with socket.create_connection((host, port)) as sock:
+        buf = b""
+        if pipeline:
+            sock.sendall(b"".join(_request(p, host, close=(i == len(PAGE) - 1)) for i, p in enumerate(PAGE)))
+            for _ in PAGE:
+                _, buf = _read_response(sock, buf)
+        else:
+            for i, path in enumerate(PAGE):
+                sock.sendall(_request(path, host, close=(i == len(PAGE) - 1)))
+                _, buf = _read_response(sock, buf)
+    return time.perf_counter() - start, 1
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 bench_keepalive.py <ip> <port> [page_loads]")
+        print("\nExample:")
+        print("  python3 bench_keepalive.py 127.0.0.1 8001 20")
+        sys.exit(1)
+
+    host = sys.argv[1]
+    port = int(sys.argv[2])
+    loads = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    strategies = [
+        ("connection per asset", lambda: load_page_fresh(host, port)),
+        ("keep-alive", lambda: load_page_keepalive(host, port, pipeline=False)),
+        ("keep-alive + pipelining", lambda: load_page_keepalive(host, port, pipeline=True)),
+    ]
+
+    print(f"\n{'=' * 70}")
+    print(f"Page: {', '.join(PAGE)}  x{loads} loads")
+    print(f"{'=' * 70}")
+    print(f"{'strategy':<26} {'avg page':>10} {'best page':>10} {'connections':>12}")
+    for name, load in strategies:
+        timings: List[float] = []
+        connections = 0
+        for _ in range(loads):
+            seconds, conns = load()
+            timings.append(seconds)
+            connections += conns
+        print(f"{name:<26} {sum(timings) / len(timings) * 1000:>8.1f}ms {min(timings) * 1000:>8.1f}ms "
+              f"{connections:>12}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
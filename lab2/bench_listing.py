@@ -0,0 +1,41 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import server_mt
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    root = tempfile.mkdtemp(prefix="bench_listing_")
+    try:
+        for i in range(files):
+            with open(os.path.join(root, f"file{i:06d}.pdf"), "wb") as f:
+                f.write(b"%PDF")
+
+        start = time.perf_counter()
+        cold = server_mt._minimal_listing_html("/", root)
+        cold_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            warm = server_mt._minimal_listing_html("/", root)
+        warm_seconds = (time.perf_counter() - start) / repeats
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n{'=' * 70}")
+    print(f"Listing a directory with {files} files ({len(cold) / 1024 ** 2:.1f} MB of HTML)")
+    print(f"{'=' * 70}")
+    print(f"First request (scandir + render):   {cold_seconds * 1000:>9.1f}ms")
+    print(f"Cached request (hits patched in):   {warm_seconds * 1000:>9.1f}ms")
+    print(f"Identical output:                   {cold == warm}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
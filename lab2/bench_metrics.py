@@ -0,0 +1,49 @@
+import sys
+import threading
+import time
+
+from metrics import FILE, FILESYSTEM, PARSE, Metrics
+
+
+def _record(metrics: Metrics, count: int):
+    # what one served request adds: parse and filesystem timings, then the response
+    for _ in range(count):
+        metrics.observe(PARSE, 0.00004)
+        metrics.observe(FILESYSTEM, 0.0003)
+        metrics.response("200 OK", FILE, 2048, 0.0002)
+
+
+def _time(threads: int, count: int) -> float:
+    metrics = Metrics()
+    workers = [threading.Thread(target=_record, args=(metrics, count)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (threads * count) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # per-request budget to compare against, in microseconds
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+
+    metrics = Metrics()
+    _record(metrics, 1000)
+    start = time.perf_counter()
+    scrape = metrics.render({"path": {"hits": 1, "misses": 2, "entries": 3}})
+    scrape_ms = (time.perf_counter() - start) * 1e3
+
+    print(f"\n{'=' * 70}")
+    print(f"Recording {count} requests, split over the threads (3 timings + status + bytes each)")
+    print(f"{'=' * 70}")
+    for threads in (1, 4, 16):
+        us = _time(threads, count // threads)
+        print(f"{threads:>2} thread(s) {us:>9.2f}us per request  {us / budget:>7.2%} of {budget:g}us")
+    print(f"render(): {scrape_ms:.2f}ms for {len(scrape)} bytes")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
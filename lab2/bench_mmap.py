@@ -0,0 +1,96 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+
+
+def _memory(pid: int) -> Dict[str, int]:
+    # anonymous memory is what per-request buffers cost; file-backed pages of a
+    # shared mapping are page cache and counted once however many clients read them
+    mem = {"RssAnon": 0, "RssFile": 0}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name = line.split(":", 1)[0]
+                if name in mem:
+                    mem[name] = int(line.split()[1])
+    except OSError:
+        pass
+    return mem
+
+
+def _download(port: int, results: list) -> None:
+    received = 0
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=300) as sock:
+            sock.sendall(b"GET /big.pdf HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            buf = bytearray(256 * 1024)
+            while True:
+                n = sock.recv_into(buf)
+                if n == 0:
+                    break
+                received += n
+                # a slowish reader keeps all downloads in flight at the same time
+                time.sleep(0.001)
+    except OSError:
+        pass
+    results.append(received)
+
+
+def _run(mode: str, port: int, root: str, clients: int) -> Dict:
+    env = dict(os.environ, PORT=str(port), LARGE_FILE_MODE=mode,
+               REQUESTS_PER_SECOND="0", SERVER_MODE="thread", MAX_CONNECTIONS_PER_IP="0")
+    proc = subprocess.Popen([sys.executable, SERVER, root], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    peak = {"RssAnon": 0, "RssFile": 0}
+    results: list = []
+    try:
+        threads = [threading.Thread(target=_download, args=(port, results)) for _ in range(clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            for name, value in _memory(proc.pid).items():
+                peak[name] = max(peak[name], value)
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {"elapsed": elapsed, "bytes": sum(results), **peak}
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    root = tempfile.mkdtemp(prefix="bench_mmap_")
+    try:
+        with open(os.path.join(root, "big.pdf"), "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(block)
+        rows = [(mode, _run(mode, 18201 + i, root, clients)) for i, mode in enumerate(("sendfile", "mmap"))]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n{'=' * 70}")
+    print(f"{clients} concurrent downloads of one {size_mb} MB file")
+    print(f"{'=' * 70}")
+    print(f"{'mode':<9} {'time':>8} {'GB sent':>8} {'peak anon MB':>13} {'peak file MB':>13}")
+    for mode, r in rows:
+        print(f"{mode:<9} {r['elapsed']:>7.1f}s {r['bytes'] / 1024 ** 3:>8.2f} "
+              f"{r['RssAnon'] / 1024:>13.1f} {r['RssFile'] / 1024:>13.1f}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
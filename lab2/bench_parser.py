@@ -0,0 +1,87 @@
+import sys
+import time
+from typing import Dict
+
+from httpparser import RequestParser
+
+# what a browser sends for a page: ~500 bytes, a dozen headers
+REQUEST = (
+    "GET /books/document1.pdf HTTP/1.1\r\n"
+    "Host: localhost:8001\r\n"
+    "User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0\r\n"
+    "Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n"
+    "Accept-Language: en-US,en;q=0.5\r\n"
+    "Accept-Encoding: gzip, deflate, br\r\n"
+    "Connection: keep-alive\r\n"
+    "Referer: http://localhost:8001/books/\r\n"
+    "Upgrade-Insecure-Requests: 1\r\n"
+    "Sec-Fetch-Dest: document\r\n"
+    "Sec-Fetch-Mode: navigate\r\n"
+    "Sec-Fetch-Site: same-origin\r\n"
+    "If-None-Match: \"74ec1ab39c0c4247d058135d\"\r\n"
+    "\r\n"
+).encode()
+
+
+def _old_parse(data: bytes) -> Dict[str, str]:
+    # the previous _parse_request: one buffer that had to hold the whole head
+    lines = data.split(b"\r\n")
+    headers: Dict[str, str] = {}
+    for raw in lines[1:]:
+        name, sep, value = raw.partition(b":")
+        if sep:
+            headers[name.strip().lower().decode("latin-1")] = value.strip().decode("latin-1")
+    return headers
+
+
+def _time(fn, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # per-request budget to compare against, in microseconds
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+
+    def whole():
+        parser = RequestParser()
+        parser.feed(REQUEST)
+        parser.next_request()
+
+    segments = [REQUEST[i:i + 64] for i in range(0, len(REQUEST), 64)]
+
+    def segmented():
+        # one next_request() per recv(), as on a slow link
+        parser = RequestParser()
+        for segment in segments:
+            parser.feed(segment)
+            parser.next_request()
+
+    pipelined_batch = REQUEST * 10
+
+    def pipelined():
+        parser = RequestParser()
+        parser.feed(pipelined_batch)
+        while parser.next_request() is not None:
+            pass
+
+    rows = [
+        ("old split parser, whole head", _time(lambda: _old_parse(REQUEST[:-4]), count)),
+        ("RequestParser, whole head", _time(whole, count)),
+        (f"RequestParser, {len(segments)} x 64-byte segments", _time(segmented, count)),
+        ("RequestParser, 10 pipelined (per request)", _time(pipelined, count // 10) / 10),
+    ]
+
+    print(f"\n{'=' * 70}")
+    print(f"Parsing a {len(REQUEST)}-byte request head, {count} times")
+    print(f"{'=' * 70}")
+    for label, us in rows:
+        print(f"{label:<44} {us:>7.2f}us  {us / budget:>7.2%} of {budget:g}us")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
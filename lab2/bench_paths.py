@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+from contentindex import ContentIndex
+from pathcache import PathCache, resolve
+
+
+def _old_resolve(content_dir: str, target: str):
+    # what _route did per request: realpath, the guard's two more realpaths, isdir, isfile
+    rel = "" if target == "/" else target.lstrip("/")
+    requested_abs = os.path.realpath(os.path.join(content_dir, rel))
+    child_real = os.path.realpath(requested_abs)
+    parent_real = os.path.realpath(content_dir)
+    try:
+        inside = os.path.commonpath([child_real, parent_real]) == parent_real
+    except ValueError:
+        inside = False
+    if inside and not os.path.isdir(requested_abs):
+        os.path.isfile(requested_abs)
+
+
+def _time(fn, targets, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for target in targets:
+            fn(target)
+    return (time.perf_counter() - start) / (repeats * len(targets)) * 1e6
+
+
+def main():
+    root = os.path.realpath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "public"))
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    targets = ["/"]
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        prefix = "/" if rel == "." else "/" + rel.replace(os.sep, "/") + "/"
+        targets.extend(prefix + name for name in filenames)
+    targets.append("/../../etc/passwd")
+    targets.append("/missing.html")
+
+    cache = PathCache(4096, ttl=3600)
+    index = ContentIndex()
+    index.build(root)
+    rows = [
+        ("realpath x3 + isdir + isfile (old)", _time(lambda t: _old_resolve(root, t), targets, repeats)),
+        ("resolve() once, no cache", _time(lambda t: resolve(root, t), targets, repeats)),
+        ("PathCache hit", _time(lambda t: cache.resolve(root, t), targets, repeats)),
+        ("ContentIndex lookup", _time(index.lookup, targets, repeats)),
+    ]
+
+    print(f"\n{'=' * 70}")
+    print(f"Resolving {len(targets)} targets under {root}, {repeats} rounds")
+    print(f"{'=' * 70}")
+    for label, us in rows:
+        print(f"{label:<40} {us:>8.2f}us per request")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
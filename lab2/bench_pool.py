@@ -0,0 +1,120 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchutil import proc_stats, raise_fd_limit
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+DEFAULT_LEVELS = [100, 1000, 10000]
+
+
+async def _one_request(host: str, port: int, path: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 30)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), 120)
+        await reader.read()
+        writer.close()
+        parts = status_line.split()
+        status = parts[1].decode() if len(parts) > 1 else "no response"
+    except (OSError, asyncio.TimeoutError) as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+async def _burst(host: str, port: int, path: str, clients: int, pid: int) -> Dict:
+    peak = {"rss": 0, "threads": 0}
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            rss, threads = proc_stats(pid)
+            peak["rss"] = max(peak["rss"], rss)
+            peak["threads"] = max(peak["threads"], threads)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample())
+    start = time.perf_counter()
+    results: List[Tuple[str, float]] = await asyncio.gather(
+        *(_one_request(host, port, path) for _ in range(clients))
+    )
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+
+    statuses: Dict[str, int] = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = sorted(d for s, d in results if s == "200")
+    return {
+        "elapsed": elapsed,
+        "statuses": statuses,
+        "p50": ok[len(ok) // 2] if ok else 0.0,
+        "p99": ok[int(len(ok) * 0.99)] if ok else 0.0,
+        "peak_rss_kb": peak["rss"],
+        "peak_threads": peak["threads"],
+    }
+
+
+def _start_server(mode: str, port: int, directory: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "SERVER_MODE": mode,
+        # the benchmark measures concurrency, not the 5 req/s limiter or the connection caps
+        "REQUESTS_PER_SECOND": "1000000000",
+        "MAX_CONNECTIONS": "0",
+        "MAX_CONNECTIONS_PER_IP": "0",
+    })
+    proc = subprocess.Popen([sys.executable, SERVER, directory], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    return proc
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 bench_pool.py <directory> <path> [clients,clients,...]")
+        print("\nExample:")
+        print("  python3 bench_pool.py ./public /index.html 100,1000,10000")
+        sys.exit(1)
+
+    directory = sys.argv[1]
+    path = sys.argv[2] if sys.argv[2].startswith("/") else "/" + sys.argv[2]
+    levels = DEFAULT_LEVELS
+    if len(sys.argv) > 3:
+        levels = [int(x) for x in sys.argv[3].split(",")]
+    raise_fd_limit(max(levels) + 256)
+
+    port = 18001
+    rows = []
+    for mode in ("thread", "pool", "async"):
+        for clients in levels:
+            proc = _start_server(mode, port, directory)
+            try:
+                stats = asyncio.run(_burst("127.0.0.1", port, path, clients, proc.pid))
+            finally:
+                proc.terminate()
+                proc.wait()
+            port += 1
+            rows.append((mode, clients, stats))
+            print(f"{mode:<7} {clients:>6} clients done in {stats['elapsed']:.2f}s")
+
+    print(f"\n{'=' * 70}")
+    print("RESULTS SUMMARY")
+    print(f"{'=' * 70}")
+    print(f"{'mode':<7} {'clients':>7} {'time':>8} {'p50':>7} {'p99':>7} {'threads':>8} {'rss MB':>7}  statuses")
+    for mode, clients, st in rows:
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(st["statuses"].items()))
+        print(f"{mode:<7} {clients:>7} {st['elapsed']:>7.2f}s {st['p50']:>6.2f}s {st['p99']:>6.2f}s "
+              f"{st['peak_threads']:>8} {st['peak_rss_kb'] / 1024:>7.1f}  {statuses}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchutil import raise_fd_limit
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+PROCESS_COUNTS = [1, 2, 4, 8]
+
+
+async def _client(port: int, deadline: float, latencies: List[float]):
+    # one keep-alive connection sending requests back to back until the deadline
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return
+    request = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if b"Connection: close" in head:
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _load(port: int, connections: int, seconds: float) -> List[float]:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(_client(port, deadline, latencies) for _ in range(connections)))
+    return latencies
+
+
+def _run(processes: int, cpus: List[int], port: int, root: str, connections: int, seconds: float) -> Dict:
+    env = dict(os.environ, PORT=str(port), PROCESSES=str(processes), SERVER_MODE="async",
+               REQUESTS_PER_SECOND="0", KEEPALIVE_MAX_REQUESTS="1000000", COMPRESSION="0",
+               MAX_CONNECTIONS_PER_IP="0")
+    proc = subprocess.Popen([sys.executable, SERVER, root], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            preexec_fn=lambda: os.sched_setaffinity(0, cpus))
+    time.sleep(1.5)
+    try:
+        latencies = sorted(asyncio.run(_load(port, connections, seconds)))
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "rps": len(latencies) / seconds,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+    }
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    raise_fd_limit(connections + 256)
+
+    available = sorted(os.sched_getaffinity(0))
+    root = tempfile.mkdtemp(prefix="bench_prefork_")
+    rows = []
+    try:
+        # a big listing makes every request CPU work for the server
+        for i in range(files):
+            with open(os.path.join(root, f"file{i:06d}.pdf"), "wb") as f:
+                f.write(b"%PDF")
+        for i, processes in enumerate(PROCESS_COUNTS):
+            cpus = available[:processes]
+            stats = _run(processes, cpus, 18301 + i, root, connections, seconds)
+            rows.append((processes, len(cpus), stats))
+            print(f"{processes} processes on {len(cpus)} cores: {stats['rps']:.0f} req/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n{'=' * 70}")
+    print(f"Pre-fork: listing of {files} files, {connections} keep-alive connections, {seconds:g}s each")
+    print(f"({len(available)} cores available to this benchmark; the load generator shares them)")
+    print(f"{'=' * 70}")
+    print(f"{'processes':>9} {'cores':>6} {'req/s':>9} {'p50':>9} {'p99':>9}")
+    for processes, cores, st in rows:
+        print(f"{processes:>9} {cores:>6} {st['rps']:>9.1f} {st['p50'] * 1000:>7.0f}ms {st['p99'] * 1000:>7.0f}ms")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
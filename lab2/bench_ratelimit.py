@@ -0,0 +1,82 @@
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from ratelimit import RateLimiter
+
+
+def _sliding_window(limit: int, window: float):
+    # the previous allow_request: a list of timestamps per IP, never evicted
+    client_requests: Dict[str, List[float]] = {}
+
+    def allow(ip: str, now: float) -> bool:
+        timestamps = client_requests.setdefault(ip, [])
+        client_requests[ip] = [t for t in timestamps if now - t < window]
+        if len(client_requests[ip]) < limit:
+            client_requests[ip].append(now)
+            return True
+        return False
+
+    allow.tracked = lambda: len(client_requests)
+    return allow
+
+
+def _gcra(limit: int, window: float):
+    limiter = RateLimiter(limit, window)
+
+    def allow(ip: str, now: float) -> bool:
+        return limiter.allow(ip, now)
+
+    allow.tracked = lambda: len(limiter)
+    return allow
+
+
+def _scan(allow, ips: int, per_second: int) -> Dict:
+    # one request from each of `ips` distinct addresses at a simulated arrival rate
+    tracemalloc.start()
+    peak_tracked = 0
+    start = time.perf_counter()
+    for i in range(ips):
+        now = i / per_second
+        allow(f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", now)
+        if i % 10000 == 0:
+            peak_tracked = max(peak_tracked, allow.tracked())
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_call": elapsed / ips * 1e6,
+        "peak_tracked": peak_tracked,
+        "final_tracked": allow.tracked(),
+        "peak_mb": peak_bytes / 1024 ** 2,
+    }
+
+
+def _hot_client(allow, calls: int) -> float:
+    # one client hammering at 1000 req/s: cost per check in microseconds
+    start = time.perf_counter()
+    for i in range(calls):
+        allow("127.0.0.1", i / 1000)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    ips = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    per_second = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    limit = 5
+
+    print(f"\n{'=' * 70}")
+    print(f"Scan: {ips} distinct IPs at {per_second} req/s, limit {limit} req/s per IP")
+    print(f"{'=' * 70}")
+    print(f"{'limiter':<16} {'us/call':>8} {'peak IPs':>10} {'final IPs':>10} {'peak MB':>8} {'hot us/call':>12}")
+    for name, make in (("sliding window", _sliding_window), ("GCRA sharded", _gcra)):
+        st = _scan(make(limit, 1.0), ips, per_second)
+        hot = _hot_client(make(limit, 1.0), 100_000)
+        print(f"{name:<16} {st['us_per_call']:>8.2f} {st['peak_tracked']:>10} {st['final_tracked']:>10} "
+              f"{st['peak_mb']:>8.1f} {hot:>12.2f}")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
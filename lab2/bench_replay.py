@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, NamedTuple
+
+from histogram import LatencyHistogram
+from httpparser import ParseError, RequestParser
+from request_test import Connection
+
+# request headers worth recording: the ones that change what the server sends back
+REPLAYED_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since", "accept-encoding")
+
+
+class TraceEntry(NamedTuple):
+    # seconds since the first request of the trace
+    t: float
+    method: str
+    path: str
+    headers: Dict[str, str]
+
+
+def load_trace(path: str) -> List[TraceEntry]:
+    # one JSON object per line: {"t": 0.25, "method": "GET", "path": "/", "headers": {...}};
+    # only "path" is required, and lines without one are skipped
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict) or "path" not in record:
+                continue
+            entries.append(TraceEntry(float(record.get("t", 0.0)), record.get("method", "GET"),
+                                      record["path"], record.get("headers", {})))
+    entries.sort(key=lambda e: e.t)
+    if entries:
+        first = entries[0].t
+        entries = [e._replace(t=e.t - first) for e in entries]
+    return entries
+
+
+class PathStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses: Dict[int, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    @property
+    def failed(self) -> int:
+        # transport errors and 4xx/5xx answers
+        return sum(self.errors.values()) + sum(n for s, n in self.statuses.items() if s >= 400)
+
+
+async def replay(entries: List[TraceEntry], host: str, port: int, speed: float,
+                 concurrency: int, keep_alive: bool) -> Dict[str, PathStats]:
+    # each entry is due at t / speed (all at once for speed 0) and takes one of
+    # `concurrency` connections; latency runs from the due time, as in request_test.py
+    stats: Dict[str, PathStats] = {}
+    idle: "asyncio.Queue[Connection]" = asyncio.Queue()
+    for _ in range(concurrency):
+        idle.put_nowait(Connection(host, port, keep_alive))
+
+    async def send(entry: TraceEntry, due: float):
+        path_stats = stats.setdefault(entry.path, PathStats())
+        conn = await idle.get()
+        try:
+            status, _ = await conn.request(entry.method, entry.path, entry.headers)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError) as e:
+            path_stats.errors[type(e).__name__] = path_stats.errors.get(type(e).__name__, 0) + 1
+            return
+        finally:
+            idle.put_nowait(conn)
+        path_stats.latency.record(time.perf_counter() - due)
+        path_stats.statuses[status] = path_stats.statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    tasks = []
+    for entry in entries:
+        due = start + (entry.t / speed if speed else 0.0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(entry, due)))
+    await asyncio.gather(*tasks)
+    while not idle.empty():
+        idle.get_nowait().close()
+    return stats
+
+
+async def record(listen_port: int, upstream_host: str, upstream_port: int, out_path: str):
+    # a byte-for-byte relay in front of the server that writes every request
+    # passing through it to `out_path`, in the format load_trace() reads
+    out = open(out_path, "a")
+    start = time.perf_counter()
+    recorded = [0]
+
+    async def pump(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, parser=None):
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                if parser is not None:
+                    parser.feed(chunk)
+                    try:
+                        head = parser.next_request()
+                        while head is not None:
+                            headers = {k: v for k, v in head.headers.items() if k in REPLAYED_HEADERS}
+                            out.write(json.dumps({"t": round(time.perf_counter() - start, 6),
+                                                  "method": head.method, "path": head.target,
+                                                  "headers": headers}) + "\n")
+                            recorded[0] += 1
+                            head = parser.next_request()
+                    except ParseError:
+                        # the server will reject it too; keep relaying, stop recording
+                        parser = None
+                    out.flush()
+                writer.write(chunk)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except OSError:
+            writer.close()
+
+    async def handle(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(upstream_host, upstream_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(pump(client_reader, upstream_writer, RequestParser()),
+                             pump(upstream_reader, client_writer))
+        upstream_writer.close()
+        client_writer.close()
+
+    server = await asyncio.start_server(handle, "0.0.0.0", listen_port)
+    print(f"Recording to {out_path}: point clients at port {listen_port}, "
+          f"forwarding to {upstream_host}:{upstream_port}. Ctrl+C to stop.")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        out.close()
+        print(f"\nRecorded {recorded[0]} requests")
+
+
+def _report(args, entries: List[TraceEntry], stats: Dict[str, PathStats], elapsed: float) -> None:
+    total = LatencyHistogram()
+    for path_stats in stats.values():
+        total.merge(path_stats.latency)
+    failed = sum(s.failed for s in stats.values())
+    speed = f"{args.speed:g}x speed" if args.speed else "as fast as possible"
+
+    print(f"\n{'=' * 70}")
+    print(f"Replayed {len(entries)} requests from {args.trace} at {speed} "
+          f"({entries[-1].t if entries else 0:.1f}s of trace) in {elapsed:.2f}s")
+    print(f"{'=' * 70}")
+    print(f"{'path':<28} {'count':>6} {'failed':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for path, s in sorted(stats.items(), key=lambda item: -item[1].latency.count):
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(s.statuses.items()))
+        statuses += "".join(f" {error}:{n}" for error, n in sorted(s.errors.items()))
+        print(f"{path[:28]:<28} {s.latency.count + sum(s.errors.values()):>6} {s.failed:>6} "
+              f"{s.latency.percentile(50) * 1e3:>8.2f} {s.latency.percentile(99) * 1e3:>8.2f} "
+              f"{s.latency.max_us / 1e3:>8.2f}  {statuses}")
+    print(f"{'=' * 70}")
+    print(f"{'all':<28} {len(entries):>6} {failed:>6} {total.percentile(50) * 1e3:>8.2f} "
+          f"{total.percentile(99) * 1e3:>8.2f} {total.max_us / 1e3:>8.2f}")
+    print(f"{'=' * 70}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {k: getattr(args, k) for k in ("trace", "host", "port", "speed", "concurrency", "close")},
+                "elapsed_s": round(elapsed, 3),
+                "latency_ms": total.summary(),
+                "failed": failed,
+                "paths": {path: {"latency_ms": s.latency.summary(),
+                                 "statuses": {str(k): v for k, v in sorted(s.statuses.items())},
+                                 "errors": s.errors}
+                          for path, s in sorted(stats.items())},
+            }, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded request trace against server_mt.py or lab1/server.py, or record one.",
+        epilog="examples:\n"
+               "  python3 bench_replay.py replay traces/mixed.jsonl localhost 8001\n"
+               "  python3 bench_replay.py replay traces/mixed.jsonl localhost 8080 --speed 10 -c 4\n"
+               "  python3 bench_replay.py record 8002 localhost 8001 traces/live.jsonl",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("replay", help="send a trace's requests on its schedule")
+    run.add_argument("trace")
+    run.add_argument("host")
+    run.add_argument("port", type=int)
+    run.add_argument("-s", "--speed", type=float, default=1.0,
+                     help="1 keeps the recorded timing, N replays N times faster, 0 sends as fast as possible")
+    run.add_argument("-c", "--concurrency", type=int, default=32, help="connections (most requests in flight)")
+    run.add_argument("--close", action="store_true", help="a new connection for every request")
+    run.add_argument("--json", help="write per-path results here")
+
+    rec = commands.add_parser("record", help="relay live traffic to a server and append its requests to a trace")
+    rec.add_argument("listen_port", type=int)
+    rec.add_argument("upstream_host")
+    rec.add_argument("upstream_port", type=int)
+    rec.add_argument("trace")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            asyncio.run(record(args.listen_port, args.upstream_host, args.upstream_port, args.trace))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error("speed must be non-negative and concurrency positive")
+    entries = load_trace(args.trace)
+    if not entries:
+        print(f"No requests in {args.trace}")
+        sys.exit(1)
+    start = time.perf_counter()
+    stats = asyncio.run(replay(entries, args.host, args.port, args.speed, args.concurrency, not args.close))
+    _report(args, entries, stats, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import server_mt
+
+
+def _old_encode(status, headers, body) -> bytes:
+    # the previous respond(): an f-string and an encode() per header, then one copy with the body
+    head = [f"HTTP/1.1 {status}".encode()]
+    for k, v in headers.items():
+        head.append(f"{k}: {v}".encode())
+    head.append(b"")
+    head.append(b"")
+    return b"\r\n".join(head) + body
+
+
+def _old_429() -> bytes:
+    # what every rate-limited request used to cost: the page re-encoded, then the headers
+    body = server_mt._TOO_MANY_BODY.decode("utf-8").encode("utf-8")
+    return _old_encode("429 Too Many Requests", {
+        "Content-Type": "text/html; charset=utf-8",
+        "Retry-After": "1",
+        "Content-Length": str(len(body)),
+        "Connection": "close",
+    }, body)
+
+
+def _drain(sock: socket.socket):
+    while sock.recv(1 << 20):
+        pass
+
+
+def _run(send, count: int) -> float:
+    server, client = socket.socketpair()
+    reader = threading.Thread(target=_drain, args=(client,))
+    reader.start()
+    start = time.perf_counter()
+    for _ in range(count):
+        send(server)
+    elapsed = time.perf_counter() - start
+    server.close()
+    reader.join()
+    client.close()
+    return elapsed / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    index = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "index.html")
+    cached = server_mt.FILE_CACHE.get(index, "text/html; charset=utf-8")
+    page = server_mt.Reply("200 OK", {}, cached.body, head=cached.head)
+    page_headers = {"Content-Type": "text/html; charset=utf-8", "ETag": cached.etag,
+                    "Accept-Ranges": "bytes", "Content-Length": str(len(cached.body)),
+                    "Connection": "keep-alive", "Keep-Alive": "timeout=5, max=99"}
+
+    rows = [
+        ("429, rebuilt per request", _run(lambda s: s.sendall(_old_429()), count)),
+        ("429, pre-rendered + sendmsg", _run(lambda s: server_mt._sendmsg_all(
+            s, server_mt._reply_buffers(server_mt._TOO_MANY_REQUESTS, False, 1)[1]), count)),
+        ("200, headers encoded + joined", _run(lambda s: s.sendall(
+            _old_encode("200 OK", page_headers, cached.body)), count)),
+        ("200, cached head + sendmsg", _run(lambda s: server_mt._sendmsg_all(
+            s, server_mt._reply_buffers(page, True, 1)[1]), count)),
+    ]
+
+    print(f"\n{'=' * 70}")
+    print(f"Building and sending {count} responses over a socketpair")
+    print(f"{'=' * 70}")
+    for label, us in rows:
+        print(f"{label:<34} {us:>8.2f}us per response")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import glob
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from benchutil import proc_stats
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+BIG_FILE_SIZE = 1024 ** 3
+
+
+def _prepare_tree(public_dir: str, big_size: int) -> Tuple[str, List[str]]:
+    # copy the pdf fixtures and add one generated big file next to them
+    root = tempfile.mkdtemp(prefix="bench_sendfile_")
+    names = []
+    for pdf in sorted(glob.glob(os.path.join(public_dir, "*.pdf"))):
+        shutil.copy(pdf, root)
+        names.append(os.path.basename(pdf))
+    big = os.path.join(root, "generated_big.pdf")
+    with open(big, "wb") as f:
+        # real bytes, not a sparse hole, so the server actually reads from disk
+        block = os.urandom(1024 * 1024)
+        for _ in range(big_size // len(block)):
+            f.write(block)
+    names.append("generated_big.pdf")
+    return root, names
+
+
+def _read_whole_server(root: str, port: int) -> None:
+    # the baseline the server used before sendfile: read the whole file into
+    # memory, then send head and body joined into one buffer
+    with socket.socket() as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("127.0.0.1", port))
+        s.listen()
+        while True:
+            conn, _ = s.accept()
+            with conn:
+                request = b""
+                while b"\r\n\r\n" not in request:
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        break
+                    request += chunk
+                target = request.split(b" ", 2)[1].decode()
+                with open(os.path.join(root, target.lstrip("/")), "rb") as f:
+                    body = f.read()
+                head = [b"HTTP/1.1 200 OK", b"Content-Type: application/pdf",
+                        f"Content-Length: {len(body)}".encode(), b"Connection: close", b"", b""]
+                conn.sendall(b"\r\n".join(head) + body)
+
+
+def _download(port: int, path: str) -> Tuple[int, float]:
+    # (body bytes, seconds from first body byte to EOF), body is discarded
+    with socket.create_connection(("127.0.0.1", port), timeout=120) as sock:
+        sock.sendall(f"GET /{path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        buf = bytearray(256 * 1024)
+        view = memoryview(buf)
+        head = b""
+        while b"\r\n\r\n" not in head:
+            n = sock.recv_into(view)
+            if n == 0:
+                return 0, 0.0
+            head += bytes(view[:n])
+        start = time.perf_counter()
+        received = len(head.split(b"\r\n\r\n", 1)[1])
+        while True:
+            n = sock.recv_into(view)
+            if n == 0:
+                break
+            received += n
+        return received, time.perf_counter() - start
+
+
+def _measure(mode: str, port: int, root: str, names: List[str]) -> List[Dict]:
+    if mode == "read":
+        proc = multiprocessing.Process(target=_read_whole_server, args=(root, port), daemon=True)
+        proc.start()
+    else:
+        env = dict(os.environ, PORT=str(port), SERVER_MODE=mode, REQUESTS_PER_SECOND="1000000000")
+        proc = subprocess.Popen([sys.executable, SERVER, root], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    rows = []
+    try:
+        for name in names:
+            baseline_rss, _ = proc_stats(proc.pid)
+            peak = [baseline_rss]
+            stop = threading.Event()
+
+            def sample():
+                while not stop.is_set():
+                    peak[0] = max(peak[0], proc_stats(proc.pid)[0])
+                    time.sleep(0.01)
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            size, seconds = _download(port, name)
+            stop.set()
+            sampler.join()
+            rows.append({
+                "mode": mode,
+                "file": name,
+                "bytes": size,
+                "mb_per_s": size / seconds / 1024 ** 2 if seconds > 0 else 0.0,
+                "rss_growth_kb": peak[0] - baseline_rss,
+            })
+    finally:
+        proc.terminate()
+        if mode == "read":
+            proc.join()
+        else:
+            proc.wait()
+    return rows
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 bench_sendfile.py <public_dir> [big_file_mb]")
+        print("\nExample:")
+        print("  python3 bench_sendfile.py ./public 1024")
+        sys.exit(1)
+
+    big_size = BIG_FILE_SIZE
+    if len(sys.argv) > 2:
+        big_size = int(sys.argv[2]) * 1024 * 1024
+
+    root, names = _prepare_tree(sys.argv[1], big_size)
+    rows: List[Dict] = []
+    try:
+        port = 18101
+        # "read" is the read-everything-then-sendall baseline, for comparison
+        for mode in ("read", "thread", "async"):
+            rows.extend(_measure(mode, port, root, names))
+            port += 1
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n{'=' * 70}")
+    print("RESULTS SUMMARY")
+    print(f"{'=' * 70}")
+    print(f"{'mode':<7} {'file':<20} {'size MB':>9} {'MB/s':>9} {'server RSS growth':>18}")
+    for r in rows:
+        print(f"{r['mode']:<7} {r['file']:<20} {r['bytes'] / 1024 ** 2:>9.1f} {r['mb_per_s']:>9.1f} "
+              f"{r['rss_growth_kb'] / 1024:>15.1f} MB")
+    print(f"{'=' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchutil import proc_stats
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_mt.py")
+# attackers connect from a second loopback address so that the per-IP cap tells them
+# apart from the well-behaved probe on 127.0.0.1
+ATTACKER_IP = "127.0.0.2"
+BIG_FILE_MB = 16
+
+# the same server with every slow-client defence off, and on with short deadlines
+CONFIGS = {
+    "off": {"HEADER_TIMEOUT": "0", "SEND_TIMEOUT": "0", "MAX_CONNECTIONS": "0",
+            "MAX_CONNECTIONS_PER_IP": "0", "KEEPALIVE_TIMEOUT": "5"},
+    "on": {"HEADER_TIMEOUT": "2", "SEND_TIMEOUT": "2", "MIN_SEND_RATE": str(4 * 1024 * 1024),
+           "MAX_CONNECTIONS": "0", "MAX_CONNECTIONS_PER_IP": "8", "KEEPALIVE_TIMEOUT": "5"},
+}
+
+
+def _median(values: List[float]) -> float:
+    return sorted(values)[len(values) // 2] if values else 0.0
+
+
+async def _connect(port: int, rcvbuf: int = 0) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if rcvbuf:
+        # a small window makes the server's sends stall instead of filling our memory
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.bind((ATTACKER_IP, 0))
+    sock.setblocking(False)
+    try:
+        await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+async def _answer(loop, sock: socket.socket) -> bytes:
+    # whatever the server sent without being asked, b"" while it has sent nothing;
+    # raises ConnectionError once it has closed the connection
+    try:
+        data = await asyncio.wait_for(loop.sock_recv(sock, 1024), 0.001)
+    except asyncio.TimeoutError:
+        return b""
+    if not data:
+        raise ConnectionError("closed")
+    return data
+
+
+async def _slowloris(loop, sock: socket.socket, stop: float) -> bytes:
+    # a request head that never ends: one more header line every second
+    await loop.sock_sendall(sock, b"GET /index.html HTTP/1.1\r\nHost: localhost\r\n")
+    i = 0
+    while time.perf_counter() < stop:
+        await asyncio.sleep(1.0)
+        answer = await _answer(loop, sock)
+        if answer:
+            return answer
+        i += 1
+        await loop.sock_sendall(sock, f"X-Padding-{i}: {i}\r\n".encode())
+    return b""
+
+
+async def _slow_reader(loop, sock: socket.socket, stop: float) -> bytes:
+    # asks for a large file, then takes 1 KB of it a second
+    await loop.sock_sendall(sock, b"GET /big.pdf HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    first = b""
+    while time.perf_counter() < stop:
+        try:
+            data = await asyncio.wait_for(loop.sock_recv(sock, 1024), 1.0)
+        except asyncio.TimeoutError:
+            continue
+        if not data:
+            raise ConnectionError("closed")
+        if not first:
+            first = data
+            if not first.startswith(b"HTTP/1.1 200"):
+                return first
+        await asyncio.sleep(1.0)
+    return first
+
+
+async def _idle(loop, sock: socket.socket, stop: float) -> bytes:
+    # connects and sends nothing
+    while time.perf_counter() < stop:
+        await asyncio.sleep(0.5)
+        answer = await _answer(loop, sock)
+        if answer:
+            return answer
+    return b""
+
+
+ATTACKS = {"slowloris": _slowloris, "slow reader": _slow_reader, "idle": _idle}
+
+
+async def _attacker(kind: str, port: int, stop: float, held: List[float], refused: List[int]) -> None:
+    # one attacker slot: reconnects as soon as the server lets go, like the real thing
+    loop = asyncio.get_running_loop()
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        try:
+            sock = await _connect(port, 4096 if kind == "slow reader" else 0)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        answer = b""
+        try:
+            answer = await ATTACKS[kind](loop, sock, stop)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+        if answer.startswith(b"HTTP/1.1 503"):
+            # turned away at the door by a connection cap
+            refused[0] += 1
+            await asyncio.sleep(0.1)
+        else:
+            held.append(time.perf_counter() - start)
+
+
+async def _probe(port: int, stop: float, latencies: List[float], failures: List[int]) -> None:
+    # a well-behaved client: a fresh connection and one small request every 200 ms
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), 5)
+            writer.write(b"GET /index.html HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            status_line = await asyncio.wait_for(reader.readline(), 5)
+            await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            if b" 200 " in status_line:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures[0] += 1
+        except (OSError, asyncio.TimeoutError):
+            failures[0] += 1
+        await asyncio.sleep(max(0.0, 0.2 - (time.perf_counter() - start)))
+
+
+async def _attack(port: int, pid: int, slow_clients: int, seconds: float) -> Dict:
+    stop = time.perf_counter() + seconds
+    held: Dict[str, List[float]] = {kind: [] for kind in ATTACKS}
+    refused = [0]
+    latencies: List[float] = []
+    failures = [0]
+    peak_threads = [0]
+
+    async def sample():
+        while time.perf_counter() < stop:
+            peak_threads[0] = max(peak_threads[0], proc_stats(pid)[1])
+            await asyncio.sleep(0.2)
+
+    # half the slots trickle headers, a quarter read slowly, a quarter idle
+    kinds = (["slowloris"] * (slow_clients // 2) + ["slow reader"] * (slow_clients // 4)
+             + ["idle"] * (slow_clients - slow_clients // 2 - slow_clients // 4))
+    await asyncio.gather(sample(), _probe(port, stop, latencies, failures),
+                         *(_attacker(kind, port, stop, held[kind], refused) for kind in kinds))
+    latencies.sort()
+    return {
+        "probe_ok": len(latencies),
+        "probe_failed": failures[0],
+        "probe_p50": _median(latencies),
+        "probe_p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        # median time a connection of each kind stayed open, refusals left out
+        "held": {kind: _median(times) for kind, times in held.items()},
+        "refused": refused[0],
+        "peak_threads": peak_threads[0],
+    }
+
+
+def _run(mode: str, config: str, port: int, root: str, slow_clients: int, seconds: float) -> Dict:
+    env = dict(os.environ, PORT=str(port), SERVER_MODE=mode, REQUESTS_PER_SECOND="0",
+               WORK_DELAY="0", COUNT_DELAY="0", **CONFIGS[config])
+    proc = subprocess.Popen([sys.executable, SERVER, root], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    try:
+        return asyncio.run(_attack(port, proc.pid, slow_clients, seconds))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    slow_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 15.0
+    modes = sys.argv[3].split(",") if len(sys.argv) > 3 else ["thread", "pool", "async"]
+
+    root = tempfile.mkdtemp(prefix="bench_slowloris_")
+    try:
+        with open(os.path.join(root, "index.html"), "w") as f:
+            f.write("<html><body>probe</body></html>")
+        with open(os.path.join(root, "big.pdf"), "wb") as f:
+            f.write(os.urandom(BIG_FILE_MB * 1024 * 1024))
+        rows = []
+        port = 18301
+        for mode in modes:
+            for config in CONFIGS:
+                rows.append((mode, config, _run(mode, config, port, root, slow_clients, seconds)))
+                port += 1
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n{'=' * 70}")
+    print(f"{slow_clients} slow clients from {ATTACKER_IP} for {seconds:g}s, probe every 200ms from 127.0.0.1")
+    print(f"defences on: {' '.join(f'{k}={v}' for k, v in CONFIGS['on'].items())}")
+    print(f"{'=' * 70}")
+    print(f"{'mode':<7} {'def.':<4} {'probe ok':>8} {'failed':>6} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'loris s':>7} {'reader s':>8} {'idle s':>6} {'refused':>7} {'threads':>7}")
+    for mode, config, r in rows:
+        print(f"{mode:<7} {config:<4} {r['probe_ok']:>8} {r['probe_failed']:>6} "
+              f"{r['probe_p50'] * 1e3:>7.1f} {r['probe_p99'] * 1e3:>7.1f} "
+              f"{r['held']['slowloris']:>7.1f} {r['held']['slow reader']:>8.1f} {r['held']['idle']:>6.1f} "
+              f"{r['refused']:>7} {r['peak_threads']:>7}")
+    print(f"{'=' * 70}")
+    print("loris/reader/idle: median seconds a slow connection was held open before the server cut it")
+
+
+if __name__ == "__main__":
+    main()
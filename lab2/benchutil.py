@@ -0,0 +1,25 @@
+import resource
+from typing import Tuple
+
+
+def raise_fd_limit(wanted: int) -> None:
+    # every client socket is a file descriptor on this side too
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, wanted))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def proc_stats(pid: int) -> Tuple[int, int]:
+    # (resident KB, thread count) of a process, read from /proc
+    rss, threads = 0, 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, threads
@@ -0,0 +1,119 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    # gzip only; pre-built .br files are still served when a client takes br
+    brotli = None
+
+# server preference when the client rates several encodings the same
+ENCODINGS = ("br", "gzip")
+SIBLING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+# only text is worth encoding; PNG, PDF and other compressed formats are sent as-is
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json",
+                      "application/xml", "image/svg+xml")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# bookkeeping charged per cache entry on top of its bytes, so that remembered
+# "not worth it" results are bounded too
+ENTRY_OVERHEAD = 64
+
+
+def compressible(mime_type: str) -> bool:
+    return mime_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepted_encodings(header: str) -> List[str]:
+    # Accept-Encoding value -> the encodings we know that the client takes, best first
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    default = weights.get("*", 0.0)
+    ranked = sorted(((weights.get(enc, default), -i, enc) for i, enc in enumerate(ENCODINGS)), reverse=True)
+    return [enc for weight, _, enc in ranked if weight > 0]
+
+
+def can_compress(encoding: str) -> bool:
+    return encoding == "gzip" or (encoding == "br" and brotli is not None)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so its ETag, stable across runs
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    # each encoding is its own representation, so it needs its own strong validator
+    return etag[:-1] + "-" + encoding + '"'
+
+
+class CompressedCache:
+    """Byte-bounded LRU of compressed bodies keyed by (content tag, encoding).
+
+    The tag identifies the uncompressed bytes: the file's ETag. Bodies under
+    `min_size` bytes, and bodies that do not get smaller, are remembered as
+    not worth compressing. Bodies that change on every request (listings,
+    with their hit counts) go through encode() and are never cached.
+    """
+
+    def __init__(self, max_bytes: int, min_size: int = 256):
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, body: bytes, encoding: str, tag: str) -> Optional[bytes]:
+        if len(body) < self.min_size:
+            return None
+        key = (tag, encoding)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return encoded or None
+            self.misses += 1
+
+        encoded = self.encode(body, encoding) or b""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old) + ENTRY_OVERHEAD
+            self._entries[key] = encoded
+            self._bytes += len(encoded) + ENTRY_OVERHEAD
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted) + ENTRY_OVERHEAD
+        return encoded or None
+
+    def encode(self, body: bytes, encoding: str) -> Optional[bytes]:
+        # the same rules as get(), without the cache: None if not worth it
+        if len(body) < self.min_size:
+            return None
+        encoded = compress(body, encoding)
+        return encoded if len(encoded) < len(body) else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,250 @@
+import heapq
+import itertools
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# why a connection was dropped, as reported by stats() and the metrics
+HEADER_DEADLINE = "header_timeout"
+SEND_DEADLINE = "send_timeout"
+PER_IP_LIMIT = "per_ip_limit"
+CONNECTION_LIMIT = "connection_limit"
+
+
+def linger_off(sock) -> None:
+    # close() then resets the connection instead of waiting to deliver what is
+    # still queued for a client that has stopped reading
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    except OSError:
+        pass
+
+
+class ConnectionLimiter:
+    """Caps on open connections: per client IP and in total.
+
+    open() (or open_many() for a burst) is called from the accept loop before
+    any thread, queue slot or coroutine is spent on the connection, and
+    close() when the connection ends. A limit of 0 turns that cap off. The per-IP table only holds clients
+    with a connection open, so it is bounded by `total` (or by the open
+    connections when that cap is off).
+    """
+
+    def __init__(self, total: int, per_ip: int):
+        self.total = total
+        self.per_ip = per_ip
+        self.enabled = total > 0 or per_ip > 0
+        self._lock = threading.Lock()
+        self._open = 0
+        self._by_ip: Dict[str, int] = {}
+        self.refused = {PER_IP_LIMIT: 0, CONNECTION_LIMIT: 0}
+
+    def open(self, ip: str) -> Optional[str]:
+        # None if the connection may proceed, else the limit it hit
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._open_locked(ip)
+
+    def open_many(self, ips: List[str]) -> List[Optional[str]]:
+        # open() for a burst of connections, in order, under one lock acquisition
+        if not self.enabled:
+            return [None] * len(ips)
+        with self._lock:
+            return [self._open_locked(ip) for ip in ips]
+
+    def _open_locked(self, ip: str) -> Optional[str]:
+        if self.total and self._open >= self.total:
+            self.refused[CONNECTION_LIMIT] += 1
+            return CONNECTION_LIMIT
+        count = self._by_ip.get(ip, 0)
+        if self.per_ip and count >= self.per_ip:
+            self.refused[PER_IP_LIMIT] += 1
+            return PER_IP_LIMIT
+        self._by_ip[ip] = count + 1
+        self._open += 1
+        return None
+
+    def close(self, ip: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._open -= 1
+            count = self._by_ip.pop(ip) - 1
+            if count:
+                self._by_ip[ip] = count
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": self._open, "clients": len(self._by_ip), **self.refused}
+
+
+class Reaper:
+    """Enforces per-connection deadlines for blocking sockets from one thread.
+
+    A serving thread arms a deadline before a phase that a client can stretch
+    (receiving the rest of a request head, sending a response) and disarms it
+    when the phase is over. If the deadline passes first, the reaper thread
+    shuts the socket down. The recv(), sendall() or sendfile() blocked on it
+    then returns or fails at once, and the serving thread unwinds as it does
+    for a client that went away. Its close() then resets the connection, so
+    the kernel drops the unsent data too. A stalled connection therefore
+    costs one heap entry, not a timer thread, and arming and disarming are
+    O(log n) and O(1).
+
+    Disarmed entries are left in the heap and skipped when they come up. The
+    heap is rebuilt from the armed ones whenever stale entries outnumber them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._heap: List[Tuple[float, int, socket.socket, str]] = []
+        # socket -> token of its current deadline; heap entries with another token are stale
+        self._armed: Dict[socket.socket, int] = {}
+        self._tokens = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self.reaped = {HEADER_DEADLINE: 0, SEND_DEADLINE: 0}
+
+    def arm(self, conn: socket.socket, seconds: float, reason: str) -> None:
+        # replaces any deadline already armed for `conn`
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            token = next(self._tokens)
+            self._armed[conn] = token
+            heapq.heappush(self._heap, (deadline, token, conn, reason))
+            if len(self._heap) > 2 * len(self._armed) + 64:
+                self._heap = [entry for entry in self._heap if self._armed.get(entry[2]) == entry[1]]
+                heapq.heapify(self._heap)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="reaper", daemon=True)
+                self._thread.start()
+            elif self._heap[0][1] == token:
+                # the new deadline is the earliest: wake the reaper to wait for it instead
+                self._cond.notify()
+
+    def disarm(self, conn: socket.socket) -> None:
+        if conn in self._armed:
+            with self._cond:
+                self._armed.pop(conn, None)
+
+    def expired(self, reason: str) -> None:
+        # a deadline enforced by the caller ran out (the asyncio engine uses loop
+        # timers instead of this thread); call from one thread only
+        self.reaped[reason] += 1
+
+    def _run(self) -> None:
+        while True:
+            expired = []
+            with self._cond:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, token, conn, reason = heapq.heappop(self._heap)
+                    if self._armed.get(conn) == token:
+                        del self._armed[conn]
+                        expired.append((conn, reason))
+                if not expired:
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                    continue
+            for conn, reason in expired:
+                self.reaped[reason] += 1
+                linger_off(conn)
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    # closed in the meantime
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"armed": len(self._armed), **self.reaped}
+
+
+class KeepAlivePark:
+    """Idle keep-alive connections, waited on by one thread instead of a worker each.
+
+    A worker that has answered every request it has parks the connection with
+    park() and moves on. The park thread waits for all parked sockets in one
+    selector. When one becomes readable, it goes to `resume` with its data, to
+    be queued for a worker again. One that stays idle for `timeout` seconds goes
+    to `expire`, to be closed. Parked connections expire in the order they were
+    parked, so timing them out is O(1) each.
+    """
+
+    def __init__(self, timeout: float, resume: Callable[[socket.socket, object], None],
+                 expire: Callable[[socket.socket, object], None]):
+        self.timeout = timeout
+        self._resume = resume
+        self._expire = expire
+        self._selector = selectors.DefaultSelector()
+        # parked from other threads, registered by the park thread
+        self._incoming: List[Tuple[socket.socket, object]] = []
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        # socket -> (deadline, data), oldest first
+        self._parked: "OrderedDict[socket.socket, Tuple[float, object]]" = OrderedDict()
+        self.resumed = 0
+        self.expired = 0
+        threading.Thread(target=self._run, name="keepalive-park", daemon=True).start()
+
+    def park(self, conn: socket.socket, data: object) -> None:
+        with self._lock:
+            self._incoming.append((conn, data))
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            # the park thread has wake-ups pending already
+            pass
+
+    def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._parked:
+                deadline = next(iter(self._parked.values()))[0]
+                timeout = max(deadline - time.monotonic(), 0.0)
+            ready = []
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    self._take_incoming()
+                else:
+                    ready.append(key.fileobj)
+            for conn in ready:
+                self._selector.unregister(conn)
+                _, data = self._parked.pop(conn)
+                self.resumed += 1
+                self._resume(conn, data)
+            now = time.monotonic()
+            while self._parked:
+                conn, (deadline, data) = next(iter(self._parked.items()))
+                if deadline > now:
+                    break
+                del self._parked[conn]
+                self._selector.unregister(conn)
+                self.expired += 1
+                self._expire(conn, data)
+
+    def _take_incoming(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        deadline = time.monotonic() + self.timeout
+        for conn, data in incoming:
+            try:
+                self._selector.register(conn, selectors.EVENT_READ)
+            except (ValueError, OSError):
+                # closed before it got here
+                self._expire(conn, data)
+                continue
+            self._parked[conn] = (deadline, data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"parked": len(self._parked), "resumed": self.resumed, "expired": self.expired}
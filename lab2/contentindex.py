@@ -0,0 +1,404 @@
+import ctypes
+import ctypes.util
+import errno
+import mimetypes
+import os
+import posixpath
+import stat
+import struct
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
+
+from pathcache import ResolvedPath, is_subpath
+
+# inotify(7) event bits
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+# struct inotify_event without its name: wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+
+def _child(key: str, name: str) -> str:
+    return ("" if key == "/" else key) + "/" + name
+
+
+def _parent(key: str) -> str:
+    return key.rsplit("/", 1)[0] or "/"
+
+
+class _Inotify:
+    """The three inotify calls, through libc; None from open() where they are missing."""
+
+    def __init__(self, libc, fd: int):
+        self._libc = libc
+        self.fd = fd
+
+    @classmethod
+    def open(cls) -> Optional["_Inotify"]:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        return cls(libc, fd) if fd >= 0 else None
+
+    def add(self, path: str) -> int:
+        # watch descriptor; the same one again for a directory that is already
+        # watched (say, under a new name after a rename)
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def remove(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> List[tuple]:
+        # blocks for the next batch: [(wd, mask, name), ...]
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            events.append((wd, mask, os.fsdecode(data[offset:offset + length].rstrip(b"\0"))))
+            offset += length
+        return events
+
+
+class ContentIndex:
+    """Everything under the content root, scanned once, keyed by URL path.
+
+    build() walks the tree and records, per URL path, the same ResolvedPath
+    that resolve() would compute for it: symlinks followed, anything that
+    lands outside the root, is neither a file nor a directory, or is gone
+    left out. lookup() is then a normpath() and one dict read, with no
+    system call, and a target that is not in the index does not exist.
+
+    watch() keeps the index current from a background thread: inotify
+    where it is available, else a stat() of every entry each `poll`
+    seconds. A change to one name re-scans that name only (a whole subtree
+    for a directory), and the resolved paths it touched are passed to
+    `on_change` so that caches keyed by them can drop what they hold.
+    Readers never lock: each update replaces dict entries whole. A
+    directory reached again through a symlink to one of its ancestors is
+    indexed but not descended into.
+    """
+
+    def __init__(self, poll: float = 2.0):
+        self.poll = poll
+        self.root = ""
+        self._entries: Dict[str, ResolvedPath] = {}
+        # what lookup() reads: _entries itself, except during a rescan, which
+        # fills a new _entries and publishes it when it is complete
+        self._published = self._entries
+        # URL path of each indexed directory -> the names listed in it
+        self._children: Dict[str, Set[str]] = {}
+        # resolved directory -> the URL paths it is indexed under
+        self._dirs: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._on_change: Callable[[List[str]], None] = lambda paths: None
+        self.watching = ""
+        self.watches = 0
+        self.updates = 0
+        self.rescans = 0
+        self.errors = 0
+
+    def build(self, root_real: str) -> None:
+        # root_real already went through os.path.realpath()
+        self.root = root_real
+        with self._lock:
+            self._rescan()
+
+    def lookup(self, target: str) -> Optional[ResolvedPath]:
+        # the leading "/" + lstrip() keeps normpath() from leaving "//" alone
+        return self._published.get(posixpath.normpath("/" + target.lstrip("/")))
+
+    def refresh(self, target: str) -> None:
+        # for a caller that found the entry no longer matches the disk
+        key = posixpath.normpath("/" + target.lstrip("/"))
+        with self._lock:
+            changed = self._refresh(key)
+        self._on_change(changed)
+
+    def _rescan(self) -> List[str]:
+        # the whole tree again, swapped in at once; resolved paths that changed
+        old = self._entries
+        self._entries, self._children, self._dirs = {}, {}, {}
+        self._add("/", self.root, frozenset(), self._entries)
+        self._published = self._entries
+        self.rescans += 1
+        return [entry.path for key, entry in old.items() if self._entries.get(key) != entry]
+
+    def _add(self, key: str, joined: str, chain: FrozenSet[str], entries: Dict[str, ResolvedPath]) -> None:
+        # index `key` from `joined`, where its parent directory lists it, into
+        # `entries`; `chain` holds the resolved directories above it
+        real = os.path.realpath(joined)
+        if not is_subpath(real, self.root):
+            return
+        try:
+            st = os.stat(real)
+        except OSError:
+            return
+        if stat.S_ISREG(st.st_mode):
+            entries[key] = ResolvedPath(real, "file", st.st_size, st.st_mtime_ns,
+                                        mimetypes.guess_type(real)[0])
+            return
+        if not stat.S_ISDIR(st.st_mode):
+            return
+        entries[key] = ResolvedPath(real, "dir", 0, st.st_mtime_ns, None)
+        if real in chain:
+            return
+        try:
+            names = os.listdir(real)
+        except OSError:
+            names = []
+        self._children[key] = set(names)
+        self._dirs.setdefault(real, set()).add(key)
+        inner = chain | {real}
+        for name in names:
+            self._add(_child(key, name), os.path.join(real, name), inner, entries)
+
+    def _forget(self, key: str, old: Dict[str, ResolvedPath]) -> None:
+        # drops `key` and everything under it from the directory bookkeeping and
+        # collects their entries in `old`; _entries is left to the caller
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        old[key] = entry
+        if entry.kind != "dir":
+            return
+        keys = self._dirs.get(entry.path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._dirs[entry.path]
+        for name in self._children.pop(key, ()):
+            self._forget(_child(key, name), old)
+
+    def _refresh(self, key: str) -> List[str]:
+        # re-reads one name from disk; resolved paths that were removed, added or
+        # changed. The new entries are built to the side and written over the old
+        # ones before the ones that went away are deleted, so lookup() never
+        # misses a name that is there both before and after
+        if key == "/":
+            return self._rescan()
+        old: Dict[str, ResolvedPath] = {}
+        self._forget(key, old)
+        new: Dict[str, ResolvedPath] = {}
+        parent = _parent(key)
+        names = self._children.get(parent)
+        # None: parent gone, or not descended into
+        if names is not None:
+            name = key.rsplit("/", 1)[1]
+            joined = os.path.join(self._entries[parent].path, name)
+            if os.path.lexists(joined):
+                names.add(name)
+                chain = set()
+                k = parent
+                while True:
+                    chain.add(self._entries[k].path)
+                    if k == "/":
+                        break
+                    k = _parent(k)
+                self._add(key, joined, frozenset(chain), new)
+            else:
+                names.discard(name)
+            self.updates += 1
+        self._entries.update(new)
+        for k in old.keys() - new.keys():
+            del self._entries[k]
+        changed = [entry.path for k, entry in old.items() if k == key or new.get(k) != entry]
+        changed.extend(entry.path for k, entry in new.items() if k == key or old.get(k) != entry)
+        return changed
+
+    def _touch(self, key: str) -> List[str]:
+        # only the attributes of `key` changed (chmod, utime, ...): a new stat()
+        # for its own entry, without re-reading what is under it
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._refresh(key)
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            return self._refresh(key)
+        if entry.kind == "dir" and stat.S_ISDIR(st.st_mode):
+            fresh = entry._replace(mtime_ns=st.st_mtime_ns)
+        elif entry.kind == "file" and stat.S_ISREG(st.st_mode):
+            fresh = entry._replace(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        else:
+            return self._refresh(key)
+        if fresh == entry:
+            return []
+        self._entries[key] = fresh
+        self.updates += 1
+        return [entry.path]
+
+    def _changed(self, real_dir: str, masks: Dict[str, int]) -> List[str]:
+        # names in resolved directory `real_dir` changed, with the inotify event
+        # bits seen for each: re-read them under every URL path the directory is
+        # indexed at
+        changed: List[str] = []
+        for key in list(self._dirs.get(real_dir, ())):
+            for name, mask in masks.items():
+                if mask & ~(IN_ATTRIB | IN_ISDIR):
+                    changed.extend(self._refresh(_child(key, name)))
+                else:
+                    changed.extend(self._touch(_child(key, name)))
+        return changed
+
+    def watch(self, on_change: Callable[[List[str]], None]) -> None:
+        # starts the watcher thread; call once per process (a forked worker
+        # inherits the index but not the thread)
+        self._on_change = on_change
+        inotify = _Inotify.open()
+        if inotify is not None:
+            self.watching = "inotify"
+            target = lambda: self._run_inotify(inotify)
+        else:
+            self.watching = "poll"
+            target = self._run_poll
+        threading.Thread(target=target, name="content-index", daemon=True).start()
+
+    def _sync_watches(self, inotify: _Inotify, wds: Dict[int, str], watched: Dict[str, int]) -> None:
+        # one watch per indexed directory; OSError once the kernel runs out of them
+        with self._lock:
+            dirs = set(self._dirs)
+        stale = {watched.pop(path) for path in set(watched) - dirs}
+        for path in dirs - set(watched):
+            try:
+                wd = inotify.add(path)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    # gone already; its parent's event will say so
+                    continue
+                raise
+            wds[wd] = path
+            watched[path] = wd
+            stale.discard(wd)
+        for wd in stale:
+            inotify.remove(wd)
+            wds.pop(wd, None)
+        self.watches = len(watched)
+
+    def _run_inotify(self, inotify: _Inotify) -> None:
+        wds: Dict[int, str] = {}
+        watched: Dict[str, int] = {}
+        try:
+            self._sync_watches(inotify, wds, watched)
+            # whatever changed between build() and the watches being in place
+            with self._lock:
+                changed = self._rescan()
+            self._on_change(changed)
+            while True:
+                overflow = False
+                by_dir: Dict[str, Dict[str, int]] = {}
+                for wd, mask, name in inotify.read():
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                    elif mask & IN_IGNORED:
+                        wds.pop(wd, None)
+                    elif name and wd in wds:
+                        masks = by_dir.setdefault(wds[wd], {})
+                        masks[name] = masks.get(name, 0) | mask
+                with self._lock:
+                    if overflow:
+                        # events were lost: nothing short of a full scan is safe
+                        changed = self._rescan()
+                    else:
+                        changed = []
+                        for real_dir, masks in by_dir.items():
+                            changed.extend(self._changed(real_dir, masks))
+                self._on_change(changed)
+                self._sync_watches(inotify, wds, watched)
+        except OSError as e:
+            # typically ENOSPC: more directories than fs.inotify.max_user_watches
+            print(f"Content index: inotify failed ({e.strerror}), polling every {self.poll:g}s instead")
+            rescan = False
+        except Exception as e:
+            # a bug, but the index must not go stale without a word: an update may
+            # have stopped halfway, so start polling from a fresh scan
+            self.errors += 1
+            print(f"Content index: watcher error ({e!r}), rescanning and polling every {self.poll:g}s")
+            rescan = True
+        os.close(inotify.fd)
+        self.watching = "poll"
+        self.watches = 0
+        self._run_poll(rescan)
+
+    def _run_poll(self, rescan: bool = False) -> None:
+        while True:
+            if not rescan:
+                time.sleep(self.poll)
+            try:
+                if rescan:
+                    with self._lock:
+                        changed = self._rescan()
+                    rescan = False
+                else:
+                    changed = self._poll()
+                self._on_change(changed)
+            except Exception as e:
+                self.errors += 1
+                print(f"Content index: poll error ({e!r}), rescanning")
+                rescan = True
+                # not at once: a failure that persists must not spin
+                time.sleep(self.poll)
+
+    def _poll(self) -> List[str]:
+        # one stat() pass: a changed directory mtime means names were added,
+        # removed or renamed in it; a changed file size or mtime means new content
+        changed: List[str] = []
+        for key, entry in list(self._entries.items()):
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                st = None
+            is_dir = st is not None and stat.S_ISDIR(st.st_mode)
+            if st is not None and st.st_mtime_ns == entry.mtime_ns and (
+                    is_dir if entry.kind == "dir" else stat.S_ISREG(st.st_mode) and st.st_size == entry.size):
+                continue
+            with self._lock:
+                if self._entries.get(key) is not entry:
+                    # already re-read along with its parent
+                    continue
+                if entry.kind == "dir" and is_dir and key in self._children:
+                    changed.extend(self._sync_dir(key))
+                else:
+                    changed.extend(self._refresh(key))
+        return changed
+
+    def _sync_dir(self, key: str) -> List[str]:
+        # the listing of indexed directory `key` changed: re-read the names that
+        # came or went (the ones that stayed are checked through their own entries)
+        entry = self._entries[key]
+        try:
+            st = os.stat(entry.path)
+            names = set(os.listdir(entry.path))
+        except OSError:
+            return self._refresh(key)
+        changed: List[str] = []
+        known = self._children[key]
+        for name in names ^ known:
+            changed.extend(self._refresh(_child(key, name)))
+        self._entries[key] = entry._replace(mtime_ns=st.st_mtime_ns)
+        self.updates += 1
+        return changed
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "directories": len(self._dirs),
+                "watches": self.watches, "updates": self.updates, "rescans": self.rescans,
+                "errors": self.errors}
@@ -0,0 +1,47 @@
+import itertools
+import threading
+from typing import Dict, List
+
+
+class ShardedCounter:
+    """Per-key hit counter split into independently locked shards.
+
+    Each thread is assigned a shard round-robin on first use, so threads
+    only contend when they share a shard, and each lock is held for
+    a single dict update. Reads add the key up across all shards, which gives
+    the exact total without a process-wide critical section.
+    """
+
+    def __init__(self, shards: int = 64):
+        self._shards: List[Dict[str, int]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        # thread ids are aligned addresses, so hashing them would pile threads onto a few shards
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+
+    def _shard_index(self) -> int:
+        try:
+            return self._local.index
+        except AttributeError:
+            self._local.index = next(self._next_shard) % len(self._shards)
+            return self._local.index
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        i = self._shard_index()
+        shard = self._shards[i]
+        with self._locks[i]:
+            shard[key] = shard.get(key, 0) + amount
+
+    def get(self, key: str, default: int = 0) -> int:
+        # dict.get is atomic under the GIL, so readers never take the shard locks
+        total = sum(shard.get(key, 0) for shard in self._shards)
+        return total if total else default
+
+    def snapshot(self) -> Dict[str, int]:
+        merged: Dict[str, int] = {}
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items = list(shard.items())
+            for key, value in items:
+                merged[key] = merged.get(key, 0) + value
+        return merged
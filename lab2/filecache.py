@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from validators import etag_of_stat, http_date
+
+
+class CachedFile(NamedTuple):
+    body: bytes
+    # status line and entity headers, each CRLF-terminated; the engine appends
+    # the per-connection headers and the blank line
+    head: bytes
+    mtime_ns: int
+    size: int
+    etag: str
+
+
+class FileCache:
+    """Byte-bounded LRU cache of small file bodies keyed by resolved path.
+
+    An entry is trusted for `revalidate` seconds after it was last checked;
+    after that one os.stat() decides whether it still matches the file on
+    disk (same mtime and size) or has to be reloaded. Files larger than
+    `max_file_bytes` are never cached and keep going through sendfile.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int, revalidate: float = 1.0,
+                 cache_control: str = ""):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.revalidate = revalidate
+        # optional Cache-Control value baked into every cached head
+        self.cache_control = cache_control
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._checked: Dict[str, float] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: str, mime_type: str) -> Optional[CachedFile]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - self._checked[path] < self.revalidate:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+
+        if entry is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._drop(path)
+                return None
+            if st.st_mtime_ns == entry.mtime_ns and st.st_size == entry.size:
+                with self._lock:
+                    if path in self._entries:
+                        self._checked[path] = now
+                        self._entries.move_to_end(path)
+                    self.hits += 1
+                return entry
+            self._drop(path)
+            with self._lock:
+                self.invalidations += 1
+
+        with self._lock:
+            self.misses += 1
+        return self._load(path, mime_type, now)
+
+    def _load(self, path: str, mime_type: str, now: float) -> Optional[CachedFile]:
+        try:
+            with open(path, "rb") as f:
+                # size and mtime from the descriptor we read, so they describe these bytes
+                st = os.fstat(f.fileno())
+                if st.st_size > self.max_file_bytes or st.st_size > self.max_bytes:
+                    return None
+                body = f.read()
+        except OSError:
+            return None
+        if len(body) != st.st_size:
+            # changed while we were reading; let the caller stream it instead
+            return None
+
+        etag = etag_of_stat(st)
+        head = (f"HTTP/1.1 200 OK\r\n"
+                f"Content-Type: {mime_type}\r\n"
+                f"ETag: {etag}\r\n"
+                f"Last-Modified: {http_date(st.st_mtime)}\r\n"
+                + (f"Cache-Control: {self.cache_control}\r\n" if self.cache_control else "") +
+                f"Accept-Ranges: bytes\r\n"
+                f"Content-Length: {len(body)}\r\n").encode()
+        entry = CachedFile(body, head, st.st_mtime_ns, st.st_size, etag)
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[path] = entry
+            self._checked[path] = now
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                evicted_path, evicted = self._entries.popitem(last=False)
+                del self._checked[evicted_path]
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, path: str) -> None:
+        # the file is known to have changed: don't wait for the next revalidation
+        with self._lock:
+            if path in self._entries:
+                self.invalidations += 1
+        self._drop(path)
+
+    def _drop(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                del self._checked[path]
+                self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,94 @@
+from typing import Dict, Iterator, List, Tuple
+
+# 2**7 sub-buckets per power of two: every recorded value is kept to within 1/128
+# (under 0.8%), which is HdrHistogram with about 2 significant digits
+SUB_BUCKET_BITS = 7
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram in the style of HdrHistogram.
+
+    Values are kept in whole microseconds. Below 2 * 128 us every value has
+    its own bucket. Above that, each power of two is split into 128 equal
+    buckets, so the relative error stays under 1/128 from microseconds up to
+    hours. Memory therefore grows with the logarithm of the largest value,
+    whatever the number of samples. Recording is an index computation and a
+    list increment. Histograms from several workers or time slices can be
+    merged without losing precision.
+    """
+
+    def __init__(self):
+        self._sub = 1 << SUB_BUCKET_BITS
+        self._counts: List[int] = []
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    def _index(self, value: int) -> int:
+        if value < 2 * self._sub:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return self._sub * (shift + 1) + (value >> shift) - self._sub
+
+    def _bounds(self, index: int) -> Tuple[int, int]:
+        # lowest and highest microsecond value that land in bucket `index`
+        if index < 2 * self._sub:
+            return index, index
+        shift = index // self._sub - 1
+        top = index % self._sub + self._sub
+        return top << shift, ((top + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = max(int(seconds * 1e6), 0)
+        index = self._index(value)
+        if index >= len(self._counts):
+            self._counts.extend([0] * (index + 1 - len(self._counts)))
+        self._counts[index] += 1
+        if self.count == 0 or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+        self.count += 1
+        self.total_us += value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0] * (len(other._counts) - len(self._counts)))
+        for index, n in enumerate(other._counts):
+            self._counts[index] += n
+        if other.count:
+            self.min_us = other.min_us if self.count == 0 else min(self.min_us, other.min_us)
+            self.max_us = max(self.max_us, other.max_us)
+        self.count += other.count
+        self.total_us += other.total_us
+
+    def percentile(self, p: float) -> float:
+        # seconds; the highest value equivalent to the p-th percentile sample,
+        # capped at the largest value actually recorded
+        if self.count == 0:
+            return 0.0
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                return min(self._bounds(index)[1], self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def mean(self) -> float:
+        return self.total_us / self.count / 1e6 if self.count else 0.0
+
+    def buckets(self) -> Iterator[Tuple[int, int]]:
+        # (highest microsecond value of the bucket, samples) for non-empty buckets
+        for index, n in enumerate(self._counts):
+            if n:
+                yield self._bounds(index)[1], n
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)) -> Dict[str, float]:
+        # milliseconds, for reports
+        out = {f"p{p:g}": round(self.percentile(p) * 1e3, 3) for p in percentiles}
+        out["min"] = round(self.min_us / 1e3, 3)
+        out["mean"] = round(self.mean() * 1e3, 3)
+        out["max"] = round(self.max_us / 1e3, 3)
+        return out
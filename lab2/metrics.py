@@ -0,0 +1,184 @@
+import bisect
+import itertools
+import threading
+from typing import Dict, List, Optional
+
+# request phases with a latency histogram each
+PARSE, FILESYSTEM, SEND = range(3)
+PHASES = ("parse", "filesystem", "send")
+# what a request asked for, judged from its target
+FILE, LISTING, OTHER = range(3)
+PATH_CLASSES = ("file", "listing", "other")
+# latency bucket upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# distinct status lines tracked; anything past that is counted under the last slot
+MAX_STATUSES = 32
+
+
+class _Shard:
+    # one thread's (or a few threads') share of every metric, behind one lock
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = [0] * (MAX_STATUSES * len(PATH_CLASSES))
+        self.buckets = [[0] * (len(LATENCY_BUCKETS) + 1) for _ in PHASES]
+        self.sums = [0.0] * len(PHASES)
+        self.bytes_sent = 0
+        self.connections = 0
+        self.rate_limited = 0
+        self.shed = [0] * MAX_STATUSES
+
+
+class Metrics:
+    """Request counters and latency histograms in the Prometheus text format.
+
+    Like ShardedCounter, every thread is given a shard round-robin and only
+    ever updates that shard, so the locks are practically uncontended. All
+    storage is preallocated: an update is a bisect over the bucket bounds and
+    a few integer increments, with no dict, tuple or label string built per
+    request. render() merges the shards when scraped.
+    """
+
+    def __init__(self, shards: int = 64):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        # status line ("200 OK") -> slot, filled in as statuses are first seen
+        self._statuses: Dict[str, int] = {}
+        self._statuses_lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+            return self._local.shard
+
+    def _status_slot(self, status: str) -> int:
+        slot = self._statuses.get(status)
+        if slot is None:
+            with self._statuses_lock:
+                slot = self._statuses.get(status)
+                if slot is None:
+                    slot = min(len(self._statuses), MAX_STATUSES - 1)
+                    if len(self._statuses) < MAX_STATUSES:
+                        self._statuses[status] = slot
+        return slot
+
+    def response(self, status: str, path_class: int, sent: int, seconds: float) -> None:
+        # one response went out: its status, what was asked for, bytes and send time
+        slot = self._status_slot(status) * len(PATH_CLASSES) + path_class
+        shard = self._shard()
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with shard.lock:
+            shard.requests[slot] += 1
+            shard.bytes_sent += sent
+            shard.buckets[SEND][bucket] += 1
+            shard.sums[SEND] += seconds
+
+    def shed(self, status: str, sent: int) -> None:
+        # a connection refused at accept with a canned reply: counted apart
+        # from the served responses, so it adds no sample to the send latencies
+        slot = self._status_slot(status)
+        shard = self._shard()
+        with shard.lock:
+            shard.shed[slot] += 1
+            shard.bytes_sent += sent
+
+    def observe(self, phase: int, seconds: float) -> None:
+        shard = self._shard()
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with shard.lock:
+            shard.buckets[phase][bucket] += 1
+            shard.sums[phase] += seconds
+
+    def connection_opened(self) -> None:
+        shard = self._shard()
+        with shard.lock:
+            shard.connections += 1
+
+    def connection_closed(self) -> None:
+        # may land on another shard than the open did; only the total matters
+        shard = self._shard()
+        with shard.lock:
+            shard.connections -= 1
+
+    def rate_limited(self) -> None:
+        shard = self._shard()
+        with shard.lock:
+            shard.rate_limited += 1
+
+    def render(self, extra: Dict[str, Dict[str, int]], dropped: Optional[Dict[str, int]] = None) -> bytes:
+        # `extra`: cache name -> its stats() dict, exported as gauges;
+        # `dropped`: reason -> connections refused or cut off for it
+        requests = [0] * (MAX_STATUSES * len(PATH_CLASSES))
+        shed = [0] * MAX_STATUSES
+        buckets = [[0] * (len(LATENCY_BUCKETS) + 1) for _ in PHASES]
+        sums = [0.0] * len(PHASES)
+        bytes_sent = connections = rate_limited = 0
+        for shard in self._shards:
+            with shard.lock:
+                for i, value in enumerate(shard.requests):
+                    requests[i] += value
+                for i, value in enumerate(shard.shed):
+                    shed[i] += value
+                for phase in range(len(PHASES)):
+                    for i, value in enumerate(shard.buckets[phase]):
+                        buckets[phase][i] += value
+                    sums[phase] += shard.sums[phase]
+                bytes_sent += shard.bytes_sent
+                connections += shard.connections
+                rate_limited += shard.rate_limited
+
+        lines: List[str] = [
+            "# HELP http_requests_total Responses sent, by status code and path class.",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._statuses_lock:
+            statuses = list(self._statuses.items())
+        for status, slot in statuses:
+            code = status.split(" ", 1)[0]
+            for c, name in enumerate(PATH_CLASSES):
+                value = requests[slot * len(PATH_CLASSES) + c]
+                if value:
+                    lines.append(f'http_requests_total{{code="{code}",class="{name}"}} {value}')
+        lines.append("# HELP http_connections_shed_total Connections answered with a canned refusal at accept, by status code.")
+        lines.append("# TYPE http_connections_shed_total counter")
+        for status, slot in statuses:
+            if shed[slot]:
+                lines.append(f'http_connections_shed_total{{code="{status.split(" ", 1)[0]}"}} {shed[slot]}')
+
+        lines.append("# HELP http_phase_seconds Time spent per request in each phase.")
+        lines.append("# TYPE http_phase_seconds histogram")
+        for phase, name in enumerate(PHASES):
+            cumulative = 0
+            for bound, value in zip(LATENCY_BUCKETS + (float("inf"),), buckets[phase]):
+                cumulative += value
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'http_phase_seconds_bucket{{phase="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'http_phase_seconds_sum{{phase="{name}"}} {sums[phase]:.6f}')
+            lines.append(f'http_phase_seconds_count{{phase="{name}"}} {cumulative}')
+
+        lines += [
+            "# HELP http_response_bytes_total Bytes sent in responses, heads included.",
+            "# TYPE http_response_bytes_total counter",
+            f"http_response_bytes_total {bytes_sent}",
+            "# HELP http_connections_active Client connections currently open.",
+            "# TYPE http_connections_active gauge",
+            f"http_connections_active {connections}",
+            "# HELP http_rate_limited_total Requests rejected by the per-IP rate limit.",
+            "# TYPE http_rate_limited_total counter",
+            f"http_rate_limited_total {rate_limited}",
+            "# HELP http_connections_dropped_total Connections refused by a limit or cut off at a deadline.",
+            "# TYPE http_connections_dropped_total counter",
+        ]
+        for reason, value in (dropped or {}).items():
+            lines.append(f'http_connections_dropped_total{{reason="{reason}"}} {value}')
+        lines += [
+            "# HELP cache_stat Counters and sizes reported by the server's caches.",
+            "# TYPE cache_stat gauge",
+        ]
+        for cache, stats in extra.items():
+            for stat, value in stats.items():
+                lines.append(f'cache_stat{{cache="{cache}",stat="{stat}"}} {value}')
+        return ("\n".join(lines) + "\n").encode()
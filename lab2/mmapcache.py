@@ -0,0 +1,123 @@
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class SharedMapping:
+    """One read-only mapping of a file, shared by every request serving it.
+
+    `refs` counts the requests currently sending from it. A mapping that has
+    been replaced or evicted is only retired; it is unmapped when the last
+    request releases it.
+    """
+
+    def __init__(self, path: str, mm: mmap.mmap, size: int, mtime_ns: int):
+        self.path = path
+        self.mmap = mm
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.refs = 0
+        self.retired = False
+
+    def close(self) -> None:
+        try:
+            self.mmap.close()
+        except BufferError:
+            # a transport still holds a slice; the mapping goes away with it
+            pass
+
+
+class MmapCache:
+    """Keeps up to `max_entries` files mapped, least recently used evicted first.
+
+    Like FileCache, an entry is re-checked against the file's mtime and size
+    once `revalidate` seconds have passed since the last check.
+    """
+
+    def __init__(self, max_entries: int, revalidate: float = 1.0):
+        self.max_entries = max_entries
+        self.revalidate = revalidate
+        self._entries: "OrderedDict[str, SharedMapping]" = OrderedDict()
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.maps = 0
+        self.unmaps = 0
+
+    def acquire(self, path: str) -> Optional[SharedMapping]:
+        now = time.monotonic()
+        with self._lock:
+            mapping = self._entries.get(path)
+            if mapping is not None and now - self._checked[path] < self.revalidate:
+                self._entries.move_to_end(path)
+                mapping.refs += 1
+                return mapping
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            mapping = self._entries.get(path)
+            if mapping is not None and mapping.mtime_ns == st.st_mtime_ns and mapping.size == st.st_size:
+                self._checked[path] = now
+                self._entries.move_to_end(path)
+                mapping.refs += 1
+                return mapping
+
+        fresh = self._map(path)
+        if fresh is None:
+            return None
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._retire(old)
+            self._entries[path] = fresh
+            self._checked[path] = now
+            fresh.refs += 1
+            while len(self._entries) > self.max_entries:
+                evicted_path, evicted = self._entries.popitem(last=False)
+                del self._checked[evicted_path]
+                self._retire(evicted)
+        return fresh
+
+    def release(self, mapping: SharedMapping) -> None:
+        with self._lock:
+            mapping.refs -= 1
+            if mapping.retired and mapping.refs == 0:
+                self.unmaps += 1
+                mapping.close()
+
+    def _map(self, path: str) -> Optional[SharedMapping]:
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_size == 0:
+                    # mmap refuses empty files; those are cheap to stream anyway
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.maps += 1
+        return SharedMapping(path, mm, st.st_size, st.st_mtime_ns)
+
+    def _retire(self, mapping: SharedMapping) -> None:
+        # caller holds the lock
+        mapping.retired = True
+        if mapping.refs == 0:
+            self.unmaps += 1
+            mapping.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "mapped": len(self._entries),
+                "mapped_bytes": sum(m.size for m in self._entries.values()),
+                "maps": self.maps,
+                "unmaps": self.unmaps,
+            }
@@ -0,0 +1,93 @@
+import mimetypes
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class ResolvedPath(NamedTuple):
+    # symlink-free path, known to be inside the content root
+    path: str
+    # "dir", "file" or "missing" (gone, or neither a directory nor a regular file)
+    kind: str
+    size: int
+    mtime_ns: int
+    mime: Optional[str]
+
+
+def is_subpath(child_real: str, parent_real: str) -> bool:
+    # both arguments already went through os.path.realpath()
+    try:
+        return os.path.commonpath([child_real, parent_real]) == parent_real
+    except ValueError:
+        return False
+
+
+def resolve(root_real: str, target: str) -> Optional[ResolvedPath]:
+    # URL path -> where it lands on disk; None if that is outside root_real
+    rel = "" if target == "/" else target.lstrip("/")
+    try:
+        path = os.path.realpath(os.path.join(root_real, rel))
+    except ValueError:
+        # embedded NUL: names nothing on disk
+        return None
+    if not is_subpath(path, root_real):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ResolvedPath(path, "missing", 0, 0, None)
+    if stat.S_ISDIR(st.st_mode):
+        return ResolvedPath(path, "dir", 0, st.st_mtime_ns, None)
+    if stat.S_ISREG(st.st_mode):
+        return ResolvedPath(path, "file", st.st_size, st.st_mtime_ns, mimetypes.guess_type(path)[0])
+    return ResolvedPath(path, "missing", 0, 0, None)
+
+
+class PathCache:
+    """Bounded LRU from (content root, URL target) to its ResolvedPath.
+
+    realpath() lstat()s every component of the path and the traversal check
+    needs its result, so both are done once and the outcome, including
+    "outside the root" and "missing", is reused for `ttl` seconds. After that
+    the target is resolved from scratch, so a symlink swapped anywhere along
+    the path is seen within `ttl` seconds. Callers that find a cached entry
+    no longer matches the disk call invalidate().
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Optional[ResolvedPath]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, root_real: str, target: str) -> Optional[ResolvedPath]:
+        key = (root_real, target)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        entry = resolve(root_real, target)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, root_real: str, target: str) -> None:
+        with self._lock:
+            self._entries.pop((root_real, target), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
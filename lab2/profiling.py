@@ -0,0 +1,181 @@
+import cProfile
+import datetime
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# mark_phase() names, in the order a request normally reaches them; each phase runs
+# from the previous mark to its own
+PHASES = ("accept", "recv", "parse", "rate_limit", "work", "count", "resolve", "body", "send")
+# lines of a tracemalloc dump
+MEMORY_TOP = 30
+
+
+class Timeline:
+    """Timestamps taken while one request is served (time.perf_counter())."""
+
+    __slots__ = ("client", "start", "begun", "marks", "method", "target", "status", "sample")
+
+    def __init__(self, client: str, start: Optional[float]):
+        self.client = client
+        # when the request began: accept() for a connection's first request,
+        # else the arrival of its first bytes (see arrived())
+        self.start = start
+        self.begun = time.perf_counter()
+        self.marks: List[Tuple[str, float]] = []
+        self.method = ""
+        self.target = ""
+        self.status = ""
+        self.sample = None
+
+    def arrived(self, at: float) -> None:
+        # bytes of this request came in; waiting for them before that was idle
+        # keep-alive time, not part of the request
+        if self.start is None:
+            self.start = at
+
+    def mark(self, phase: str, at: Optional[float] = None) -> None:
+        self.marks.append((phase, time.perf_counter() if at is None else at))
+
+    def phases(self) -> Dict[str, float]:
+        # phase -> milliseconds; a phase marked twice adds up
+        out: Dict[str, float] = {}
+        previous = self.begun if self.start is None else self.start
+        for phase, at in self.marks:
+            out[phase] = out.get(phase, 0.0) + (at - previous) * 1e3
+            previous = at
+        return out
+
+    def total_ms(self) -> float:
+        if not self.marks:
+            return 0.0
+        return (self.marks[-1][1] - (self.begun if self.start is None else self.start)) * 1e3
+
+
+_CURRENT: ContextVar[Optional[Timeline]] = ContextVar("timeline", default=None)
+
+
+def current_timeline() -> Optional[Timeline]:
+    # the request being served by this thread or task, if it is being timed
+    return _CURRENT.get()
+
+
+def mark_phase(phase: str, at: Optional[float] = None) -> None:
+    timeline = _CURRENT.get()
+    if timeline is not None:
+        timeline.mark(phase, at)
+
+
+class RequestProfiler:
+    """Opt-in per-request phase timing, slow-request log and sampled profiles.
+
+    With both `slow_ms` and `sample_every` at 0 begin() returns None and the
+    server takes no timestamps at all. Otherwise every request gets a
+    Timeline, reachable through current_timeline() and mark_phase() from
+    anywhere in the thread (or asyncio task) serving it. Requests taking at
+    least `slow_ms` are written to `slow_log` as one JSON object per line
+    ("-" = stderr).
+
+    One request in `sample_every` also runs under cProfile ("cpu") or
+    tracemalloc ("memory"), and the result is dumped to `profile_dir`. Only
+    one request is sampled at a time. cProfile only sees the sampled thread,
+    but in the async engine other coroutines run on that thread while the
+    request awaits, so they show up in its profile too. tracemalloc is
+    process-wide, so a memory sample includes concurrent requests.
+    """
+
+    def __init__(self, slow_ms: float, slow_log: str = "-", sample_every: int = 0,
+                 mode: str = "cpu", profile_dir: str = "profiles"):
+        self.slow_ms = slow_ms
+        self.sample_every = sample_every
+        self.mode = mode
+        self.profile_dir = profile_dir
+        self.enabled = slow_ms > 0 or sample_every > 0
+        self._slow_log = slow_log
+        self._log_file = None
+        self._log_lock = threading.Lock()
+        self._requests = itertools.count(1)
+        self._sampling = threading.Lock()
+        self.slow = 0
+        self.samples = 0
+
+    def begin(self, client: str, start: Optional[float] = None) -> Optional[Timeline]:
+        if not self.enabled:
+            return None
+        timeline = Timeline(client, start)
+        if start is not None:
+            # from accept() until a thread or task picked the connection up
+            timeline.mark("accept", timeline.begun)
+        _CURRENT.set(timeline)
+        if self.sample_every and next(self._requests) % self.sample_every == 0:
+            if self._sampling.acquire(blocking=False):
+                timeline.sample = self._start_sample()
+        return timeline
+
+    def end(self, timeline: Optional[Timeline]) -> None:
+        if timeline is None:
+            return
+        _CURRENT.set(None)
+        if timeline.sample is not None:
+            try:
+                self._dump_sample(timeline)
+            finally:
+                self._sampling.release()
+        # nothing was sent: the client went away or idled out between requests
+        if not timeline.status:
+            return
+        if self.slow_ms > 0 and timeline.total_ms() >= self.slow_ms:
+            self.slow += 1
+            self._write_slow(timeline)
+
+    def _start_sample(self):
+        if self.mode == "memory":
+            tracemalloc.start()
+            return tracemalloc
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _dump_sample(self, timeline: Timeline) -> None:
+        if timeline.sample is tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        else:
+            timeline.sample.disable()
+        # an idle keep-alive wait that ended without a request is not worth a file
+        if not timeline.status:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.samples += 1
+        base = os.path.join(self.profile_dir, f"{os.getpid()}-{self.samples}")
+        if timeline.sample is tracemalloc:
+            with open(base + ".mem.txt", "w") as f:
+                f.write(f"{timeline.method} {timeline.target} {timeline.status}\n")
+                for stat in snapshot.statistics("lineno")[:MEMORY_TOP]:
+                    f.write(f"{stat}\n")
+        else:
+            # read with: python3 -m pstats <file>
+            timeline.sample.dump_stats(base + ".prof")
+
+    def _write_slow(self, timeline: Timeline) -> None:
+        record = {
+            "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "client": timeline.client,
+            "method": timeline.method,
+            "target": timeline.target,
+            "status": timeline.status.split(" ", 1)[0],
+            "total_ms": round(timeline.total_ms(), 3),
+            "phases": {phase: round(ms, 3) for phase, ms in timeline.phases().items()},
+        }
+        line = json.dumps(record) + "\n"
+        with self._log_lock:
+            if self._log_file is None:
+                self._log_file = sys.stderr if self._slow_log == "-" else open(self._slow_log, "a")
+            self._log_file.write(line)
+            self._log_file.flush()
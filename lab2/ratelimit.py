@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+# fraction of an interval added to the burst tolerance, see configure()
+BURST_SLACK = 1 / 1024
+
+
+class RateLimiter:
+    """Per-client rate limit using GCRA (the generic cell rate algorithm).
+
+    A client may send `rate` requests per `per` seconds, in bursts of up to
+    `rate`. The whole per-client state is one float, the theoretical arrival
+    time (TAT) of its next request, so every check is O(1) in time and memory.
+    A client whose TAT is in the past is indistinguishable from one never
+    seen, so such entries are swept out periodically. Memory is therefore
+    bounded by the clients active in the last `per` seconds, not by every IP
+    ever seen. Clients are spread over independently locked shards.
+    """
+
+    def __init__(self, rate: int, per: float = 1.0, shards: int = 64, sweep_interval: float = 1.0):
+        self._shards: List[Dict[str, float]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._next_sweep = [0.0] * shards
+        self.sweep_interval = sweep_interval
+        self.configure(rate, per)
+
+    def configure(self, rate: int, per: float = 1.0) -> None:
+        # safe while serving: existing TATs are simply judged by the new limits
+        self.rate = rate
+        self.per = per
+        self._interval = per / rate if rate > 0 else 0.0
+        # TATs are sums of float intervals on top of a clock in the thousands of
+        # seconds; a sliver of an interval of slack keeps rounding from costing
+        # the last request of a burst
+        self._tolerance = self._interval * (rate - 1 + BURST_SLACK) if rate > 0 else 0.0
+
+    def allow(self, client: str, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        if now is None:
+            now = time.monotonic()
+        i = hash(client) % len(self._shards)
+        with self._locks[i]:
+            return self._allow_locked(i, client, now)
+
+    def allow_many(self, clients: List[str], now: Optional[float] = None) -> List[bool]:
+        # allow() for a burst of clients, in order: one clock read, and each
+        # shard's lock taken once however many of the clients hash to it
+        if self.rate <= 0:
+            return [True] * len(clients)
+        if now is None:
+            now = time.monotonic()
+        by_shard: Dict[int, List[int]] = {}
+        for n, client in enumerate(clients):
+            by_shard.setdefault(hash(client) % len(self._shards), []).append(n)
+        out = [False] * len(clients)
+        for i, indices in by_shard.items():
+            with self._locks[i]:
+                for n in indices:
+                    out[n] = self._allow_locked(i, clients[n], now)
+        return out
+
+    def _allow_locked(self, i: int, client: str, now: float) -> bool:
+        shard = self._shards[i]
+        if now >= self._next_sweep[i]:
+            self._sweep(shard, now)
+            self._next_sweep[i] = now + self.sweep_interval
+        tat = shard.get(client, now)
+        if tat < now:
+            tat = now
+        if tat - now > self._tolerance:
+            return False
+        shard[client] = tat + self._interval
+        return True
+
+    @staticmethod
+    def _sweep(shard: Dict[str, float], now: float) -> None:
+        idle = [client for client, tat in shard.items() if tat <= now]
+        for client in idle:
+            del shard[client]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
@@ -1,148 +1,293 @@
+import argparse
+import asyncio
+import csv
+import json
 import sys
 import time
-import urllib.request
-import urllib.error
-import threading
-from typing import Tuple, List
+from typing import Dict, List, Optional, Tuple
 
+from histogram import LatencyHistogram
 
-def make_request(url: str, request_id: int, results: List, lock: threading.Lock) -> None:
-    start_time = time.time()
-    try:
-        with urllib.request.urlopen(url, timeout=120) as response:
-            # read the response to ensure full request completion
-            _ = response.read()
-            duration = time.time() - start_time
-            status = response.status
-            result = (request_id, duration, True, f"HTTP {status}")
-    except urllib.error.HTTPError as e:
-        duration = time.time() - start_time
-        result = (request_id, duration, False, f"HTTP {e.code} Error")
-    except urllib.error.URLError as e:
-        duration = time.time() - start_time
-        result = (request_id, duration, False, f"URL Error: {e.reason}")
-    except Exception as e:
-        duration = time.time() - start_time
-        result = (request_id, duration, False, f"Error: {str(e)}")
-    
-    with lock:
-        results.append(result)
-
-
-def run_concurrent_test(url: str, num_requests: int, delay_between: float = 0) -> None:
-    print(f"\n{'=' * 70}")
-    print(f"Testing URL: {url}")
-    print(f"Number of concurrent requests: {num_requests}")
-    if delay_between > 0:
-        print(f"Request submission delay: {delay_between:.3f}s (rate: {1 / delay_between:.2f} req/s)")
-    print(f"{'=' * 70}\n")
-
-    results: List[Tuple[int, float, bool, str]] = []
-    results_lock = threading.Lock()
-    threads = []
-
-    # start timing
-    overall_start = time.time()
-
-    # Create a thread for each request
-    for i in range(1, num_requests + 1):
-        thread = threading.Thread(
-            target=make_request,
-            args=(url, i, results, results_lock),
-            daemon=True
-        )
-        threads.append(thread)
-        thread.start()
-        
-        # Optional delay between thread creation
-        if delay_between > 0 and i < num_requests:
-            time.sleep(delay_between)
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-
-    overall_duration = time.time() - overall_start
-
-    # calculate statistics
-    successful_requests = [r for r in results if r[2]]
-    failed_requests = [r for r in results if not r[2]]
-
-    # calculate successful requests per second
-    successful_req_per_sec = len(successful_requests) / overall_duration if overall_duration > 0 else 0
-
-    # calculate average response time for successful requests
-    avg_response_time = sum(r[1] for r in successful_requests) / len(successful_requests) if successful_requests else 0
-
-    # print summary
-    print(f"\n{'=' * 70}")
-    print(f"RESULTS SUMMARY")
-    print(f"{'=' * 70}")
-    print(f"Total requests:        {num_requests}")
-    print(f"Successful:            {len(successful_requests)}")
-    print(f"Failed:                {len(failed_requests)}")
-    print(f"Total time:            {overall_duration:.3f}s")
-    print(f"Successful req/sec:    {successful_req_per_sec:.2f}")
-    print(f"{'=' * 70}")
 
-    # show breakdown of failed requests if any
-    if failed_requests:
-        print(f"\nFailed Request Details:")
-        error_counts = {}
-        for req_id, duration, success, status in failed_requests:
-            error_counts[status] = error_counts.get(status, 0) + 1
-        for error_type, count in sorted(error_counts.items()):
-            print(f"  {error_type}: {count}")
-    print()
+class Connection:
+    """One HTTP/1.1 client connection over asyncio streams, reopened as needed."""
 
+    def __init__(self, host: str, port: int, keep_alive: bool = True):
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
 
-def main():
-    if len(sys.argv) < 5 or len(sys.argv) > 6:
-        print("Usage: python3 request_test.py <ip> <port> <path> <nr_req> [delay]")
-        print("\nExamples:")
-        print("  python3 request_test.py 127.0.0.1 8001 public/index.html 100")
-        print("  python3 request_test.py localhost 8001 public/index.html 100 0.25")
-        sys.exit(1)
+    async def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, int]:
+        # -> (status, body bytes); raises OSError/asyncio.IncompleteReadError on failure
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if not self.keep_alive:
+            lines.append("Connection: close")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        try:
+            head = await self._reader.readuntil(b"\r\n\r\n")
+            status_line, *header_lines = head[:-4].split(b"\r\n")
+            status = int(status_line.split(b" ", 2)[1])
+            length = None
+            close = not self.keep_alive
+            for line in header_lines:
+                name, _, value = line.partition(b":")
+                name = name.strip().lower()
+                if name == b"content-length":
+                    length = int(value)
+                elif name == b"connection" and value.strip().lower() == b"close":
+                    close = True
+            if method == "HEAD" or status == 304 or status < 200:
+                received = 0
+            elif length is None:
+                # no length: the body runs to the end of the connection
+                received = len(await self._reader.read())
+                close = True
+            else:
+                await self._reader.readexactly(length)
+                received = length
+        except BaseException:
+            self.close()
+            raise
+        if close:
+            self.close()
+        return status, received
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
 
-    ip = sys.argv[1]
-    port = sys.argv[2]
-    path = sys.argv[3]
 
+class Results:
+    """What a run measured, past the warmup."""
+
+    def __init__(self, start: float):
+        # perf_counter() at which measurement starts (the end of the warmup)
+        self.start = start
+        self.latency = LatencyHistogram()
+        self.statuses: Dict[int, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes = 0
+        # one entry per second of the run: (latencies of requests finishing in it, errors)
+        self.seconds: List[Tuple[LatencyHistogram, int]] = []
+        self.end = start
+
+    def _second(self, now: float) -> int:
+        second = int(now - self.start)
+        while len(self.seconds) <= second:
+            self.seconds.append((LatencyHistogram(), 0))
+        return second
+
+    def ok(self, intended: float, done: float, status: int, received: int) -> None:
+        if done < self.start:
+            return
+        latency = done - intended
+        self.latency.record(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += received
+        self.seconds[self._second(done)][0].record(latency)
+        self.end = max(self.end, done)
+
+    def failed(self, done: float, error: str) -> None:
+        if done < self.start:
+            return
+        self.errors[error] = self.errors.get(error, 0) + 1
+        second = self._second(done)
+        histogram, errors = self.seconds[second]
+        self.seconds[second] = (histogram, errors + 1)
+        self.end = max(self.end, done)
+
+    @property
+    def elapsed(self) -> float:
+        return max(self.end - self.start, 1e-9)
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.latency.count,
+            "errors": sum(self.errors.values()),
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(self.latency.count / self.elapsed, 2),
+            "bytes": self.bytes,
+            "latency_ms": self.latency.summary(),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "error_types": dict(sorted(self.errors.items())),
+        }
+
+
+async def _one(conn: Connection, path: str, intended: float, results: Results) -> None:
+    # latency runs from when the request was due, not from when it was sent,
+    # so time spent queued behind a slow server counts (no coordinated omission)
     try:
-        num_requests = int(sys.argv[4])
-        if num_requests < 1:
-            raise ValueError("Number of requests must be positive")
-    except ValueError as e:
-        print(f"Error: Invalid number of requests: {e}")
-        sys.exit(1)
-
-    # Optional delay parameter
-    delay_between = 0
-    if len(sys.argv) == 6:
+        status, received = await conn.request("GET", path)
+    except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError) as e:
+        results.failed(time.perf_counter(), type(e).__name__)
+        return
+    results.ok(intended, time.perf_counter(), status, received)
+
+
+async def closed_loop(host: str, port: int, path: str, concurrency: int, requests: int,
+                      duration: float, warmup: float, keep_alive: bool) -> Results:
+    # `concurrency` clients, each sending its next request as soon as the last one is answered
+    start = time.perf_counter()
+    results = Results(start + warmup)
+    deadline = start + warmup + duration if duration else None
+    remaining = [requests]
+
+    async def client():
+        conn = Connection(host, port, keep_alive)
         try:
-            delay_between = float(sys.argv[5])
-            if delay_between < 0:
-                raise ValueError("Delay must be non-negative")
-        except ValueError as e:
-            print(f"Error: Invalid delay value: {e}")
-            sys.exit(1)
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif remaining[0] <= 0:
+                    return
+                elif time.perf_counter() >= results.start:
+                    # warmup requests come on top of the count
+                    remaining[0] -= 1
+                await _one(conn, path, time.perf_counter(), results)
+        finally:
+            conn.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(host: str, port: int, path: str, rate: float, concurrency: int, requests: int,
+                    duration: float, warmup: float, keep_alive: bool) -> Results:
+    # requests are due at a constant rate whatever the server does; at most
+    # `concurrency` are in flight and the rest wait for a connection, late
+    start = time.perf_counter()
+    results = Results(start + warmup)
+    total = int((warmup + duration) * rate) if duration else int(warmup * rate) + requests
+    idle: "asyncio.Queue[Connection]" = asyncio.Queue()
+    for _ in range(concurrency):
+        idle.put_nowait(Connection(host, port, keep_alive))
+
+    async def send(intended: float):
+        conn = await idle.get()
+        try:
+            await _one(conn, path, intended, results)
+        finally:
+            idle.put_nowait(conn)
+
+    tasks = []
+    for i in range(total):
+        intended = start + i / rate
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(intended)))
+    await asyncio.gather(*tasks)
+    while not idle.empty():
+        idle.get_nowait().close()
+    return results
+
 
-    # Ensure path starts with /
-    if not path.startswith('/'):
-        path = '/' + path
+def _report(args, results: Results) -> None:
+    summary = results.summary()
+    mode = f"open loop, {args.rate:g} req/s" if args.rate else "closed loop"
+    print(f"\n{'=' * 70}")
+    print(f"RESULTS: http://{args.host}:{args.port}{args.path}  ({mode}, {args.concurrency} connections)")
+    print(f"{'=' * 70}")
+    print(f"Requests:              {summary['requests']}")
+    print(f"Errors:                {summary['errors']}")
+    print(f"Measured time:         {summary['elapsed_s']:.3f}s (after {args.warmup:g}s warmup)")
+    print(f"Throughput:            {summary['throughput_rps']:.2f} req/s")
+    print(f"Statuses:              {summary['statuses']}")
+    latency = summary["latency_ms"]
+    print("Latency (ms):          " + "  ".join(f"{k} {v:.2f}" for k, v in latency.items()))
+    print(f"{'=' * 70}")
+    print(f"{'second':>6} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    for second, (histogram, errors) in enumerate(results.seconds):
+        print(f"{second:>6} {histogram.count:>8} {errors:>7} "
+              f"{histogram.percentile(50) * 1e3:>9.2f} {histogram.percentile(99) * 1e3:>9.2f}")
+    if summary["error_types"]:
+        print("\nFailed request details:")
+        for error, count in summary["error_types"].items():
+            print(f"  {error}: {count}")
+    print()
+
+    if args.json:
+        config = {k: getattr(args, k) for k in ("host", "port", "path", "concurrency", "rate",
+                                                "requests", "duration", "warmup", "close")}
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": config,
+                "summary": summary,
+                "timeline": [{"second": s, "requests": h.count, "errors": e, "latency_ms": h.summary()}
+                             for s, (h, e) in enumerate(results.seconds)],
+                # (highest microsecond value, count): enough to recompute any percentile
+                "histogram_us": list(results.latency.buckets()),
+            }, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            out = csv.writer(f)
+            out.writerow(["second", "requests", "errors", "p50_ms", "p90_ms", "p99_ms", "p99.9_ms", "max_ms"])
+            for second, (histogram, errors) in enumerate(results.seconds):
+                out.writerow([second, histogram.count, errors] +
+                             [round(histogram.percentile(p) * 1e3, 3) for p in (50, 90, 99, 99.9)] +
+                             [round(histogram.max_us / 1e3, 3)])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="HTTP load generator: closed loop at a fixed concurrency, or open loop at a fixed rate.",
+        epilog="examples:\n"
+               "  python3 request_test.py 127.0.0.1 8001 public/index.html 100\n"
+               "  python3 request_test.py localhost 8001 /index.html 100 0.25\n"
+               "  python3 request_test.py localhost 8001 / -c 32 -d 30 -w 5 --json run.json\n"
+               "  python3 request_test.py localhost 8001 / --rate 200 -c 64 -d 30 --csv run.csv",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("path")
+    parser.add_argument("requests", type=int, nargs="?", default=100,
+                        help="requests to send when no --duration is given (default 100)")
+    parser.add_argument("delay", type=float, nargs="?", default=0.0,
+                        help="seconds between requests; same as --rate 1/delay")
+    parser.add_argument("-c", "--concurrency", type=int,
+                        help="connections (closed loop) or most requests in flight (open loop); default "
+                             "one per request, as the old N simultaneous clients, or 10 with --duration")
+    parser.add_argument("-r", "--rate", type=float, default=0.0,
+                        help="open loop: requests per second, due on schedule")
+    parser.add_argument("-d", "--duration", type=float, default=0.0,
+                        help="run for this many seconds after the warmup instead of a request count")
+    parser.add_argument("-w", "--warmup", type=float, default=0.0,
+                        help="seconds of load whose results are discarded")
+    parser.add_argument("--close", action="store_true", help="a new connection for every request")
+    parser.add_argument("--json", help="write summary, per-second timeline and histogram here")
+    parser.add_argument("--csv", help="write the per-second timeline here")
+    args = parser.parse_args()
 
-    # Construct URL
-    url = f"http://{ip}:{port}{path}"
+    if args.concurrency is None:
+        args.concurrency = 10 if args.duration else args.requests
+    if args.requests < 1 or args.concurrency < 1 or args.delay < 0 or args.rate < 0:
+        parser.error("requests and concurrency must be positive, delay and rate non-negative")
+    if args.delay and not args.rate:
+        args.rate = 1 / args.delay
+    if not args.path.startswith("/"):
+        args.path = "/" + args.path
+    keep_alive = not args.close
 
     try:
-        run_concurrent_test(url, num_requests, delay_between)
+        if args.rate:
+            results = asyncio.run(open_loop(args.host, args.port, args.path, args.rate, args.concurrency,
+                                            args.requests, args.duration, args.warmup, keep_alive))
+        else:
+            results = asyncio.run(closed_loop(args.host, args.port, args.path, args.concurrency,
+                                              args.requests, args.duration, args.warmup, keep_alive))
     except KeyboardInterrupt:
         print("\n\nTest interrupted by user.")
         sys.exit(0)
-    except Exception as e:
-        print(f"\nError during test: {e}")
-        sys.exit(1)
+    _report(args, results)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
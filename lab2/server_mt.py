@@ -1,22 +1,143 @@
-import os, sys, socket, mimetypes
+import os, sys, socket, mimetypes, signal
 from urllib.parse import unquote, quote
+import asyncio
+import datetime
+import queue
+import selectors
 import threading
 import time
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from compression import (SIBLING_SUFFIX, CompressedCache, accepted_encodings, can_compress,
+                         compressible, variant_etag)
+from connlimits import (HEADER_DEADLINE, SEND_DEADLINE, ConnectionLimiter, KeepAlivePark, Reaper,
+                        linger_off)
+from contentindex import ContentIndex
+from counters import ShardedCounter
+from filecache import FileCache
+from httpparser import REASONS, ParseError, RequestHead, RequestParser
+from metrics import FILE, FILESYSTEM, LISTING, OTHER, PARSE, Metrics
+from mmapcache import MmapCache
+from pathcache import PathCache, ResolvedPath
+from profiling import RequestProfiler, current_timeline, mark_phase
+from ratelimit import RateLimiter
+from shared import SharedCounter, SharedRateLimiter
+from validators import etag_of_stat, http_date, not_modified, range_still_valid
 
 # config
 HOST = "0.0.0.0"
 PORT = int(os.environ.get("PORT", "8001"))
 ALLOWED_EXTENSIONS = {".html", ".png", ".pdf"}
 MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "16"))
-COUNTS: Dict[str, int] = {}
-COUNTS_LOCK = threading.Lock()
-REQUESTS_PER_SECOND = 5
-TIME_WINDOW = 1.0
-
-
-client_requests: Dict[str, List[float]] = {}
-requests_lock = threading.Lock()
+# "thread" = one thread per connection, "pool" = MAX_WORKERS threads fed by a bounded queue,
+# "async" = single asyncio event loop, one coroutine per connection
+SERVER_MODE = os.environ.get("SERVER_MODE", "thread")
+# listen() backlog and size of the pool's accept queue; overflow gets a 503
+ACCEPT_BACKLOG = int(os.environ.get("ACCEPT_BACKLOG", "128"))
+# persistent connections: idle seconds before closing, requests served per connection
+KEEPALIVE_TIMEOUT = float(os.environ.get("KEEPALIVE_TIMEOUT", "5"))
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get("KEEPALIVE_MAX_REQUESTS", "100"))
+# pool mode: where idle keep-alive connections wait for their next request, so that
+# they don't each hold a worker (set up by _run_pool)
+KEEPALIVE_PARK: Optional[KeepAlivePark] = None
+# slow clients: a request head must be complete HEADER_TIMEOUT seconds after its first
+# bytes, and a response sent within SEND_TIMEOUT seconds plus one per MIN_SEND_RATE
+# bytes (0 turns either deadline off). KEEPALIVE_TIMEOUT is the idle deadline, and
+# in the thread and pool engines also bounds a single recv/send that makes no progress
+HEADER_TIMEOUT = float(os.environ.get("HEADER_TIMEOUT", "10"))
+SEND_TIMEOUT = float(os.environ.get("SEND_TIMEOUT", "30"))
+MIN_SEND_RATE = int(os.environ.get("MIN_SEND_RATE", str(64 * 1024)))
+REAPER = Reaper()
+# open connections allowed per client IP and in total (0 = no cap); a connection over
+# either gets the 503 from the accept loop. Counted per worker process with PROCESSES > 1
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", "1024"))
+MAX_CONNECTIONS_PER_IP = int(os.environ.get("MAX_CONNECTIONS_PER_IP", "64"))
+LIMITER = ConnectionLimiter(MAX_CONNECTIONS, MAX_CONNECTIONS_PER_IP)
+# admission: the accept loops check each new connection against the rate limit (for its
+# first request) and the caps above before any thread, queue slot or task is spent on
+# it, deciding up to ACCEPT_BATCH connections that are already waiting in one go. What a
+# refused connection gets, per policy: "reply" (a pre-built 429 or 503 with no body) or
+# "close" (reset at once, nothing read or written)
+ACCEPT_BATCH = int(os.environ.get("ACCEPT_BATCH", "64"))
+RATE_REJECT = os.environ.get("RATE_REJECT", "reply")
+LIMIT_REJECT = os.environ.get("LIMIT_REJECT", "reply")
+# pause after accept() fails for lack of resources (EMFILE, ENOBUFS, ...), which
+# would otherwise fail again at once for as long as the shortage lasts
+ACCEPT_RETRY_DELAY = 0.1
+# request head limits: larger heads get 431, longer request lines 414
+MAX_HEAD_BYTES = 8192
+MAX_HEADERS = 100
+# more ranges than this in one Range header and the whole file is sent instead
+MAX_RANGES = 16
+# pre-fork: PROCESSES worker processes, each with its own SO_REUSEPORT socket on PORT,
+# running SERVER_MODE; hit counts and rate limits then live in shared memory
+PROCESSES = int(os.environ.get("PROCESSES", "1"))
+COUNTS = SharedCounter() if PROCESSES > 1 else ShardedCounter()
+# per-IP limit: REQUESTS_PER_SECOND requests every TIME_WINDOW seconds, 0 disables it;
+# RATE_LIMITER.configure() changes the limit on a running server
+REQUESTS_PER_SECOND = int(os.environ.get("REQUESTS_PER_SECOND", "5"))
+TIME_WINDOW = float(os.environ.get("TIME_WINDOW", "1.0"))
+RATE_LIMITER = (SharedRateLimiter(REQUESTS_PER_SECOND, TIME_WINDOW) if PROCESSES > 1
+                else RateLimiter(REQUESTS_PER_SECOND, TIME_WINDOW))
+# in-memory LRU of small file bodies (0 bytes disables it); entries are
+# re-checked against the file's mtime/size after FILE_CACHE_REVALIDATE seconds
+FILE_CACHE_BYTES = int(os.environ.get("FILE_CACHE_BYTES", str(64 * 1024 * 1024)))
+FILE_CACHE_MAX_FILE = int(os.environ.get("FILE_CACHE_MAX_FILE", str(1024 * 1024)))
+FILE_CACHE_REVALIDATE = float(os.environ.get("FILE_CACHE_REVALIDATE", "1.0"))
+# browsers may reuse static files for STATIC_MAX_AGE seconds without asking (0 = no
+# Cache-Control); after that they revalidate with If-None-Match / If-Modified-Since
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", "0"))
+CACHE_CONTROL = f"public, max-age={STATIC_MAX_AGE}" if STATIC_MAX_AGE > 0 else ""
+FILE_CACHE = FileCache(FILE_CACHE_BYTES, FILE_CACHE_MAX_FILE, FILE_CACHE_REVALIDATE,
+                       CACHE_CONTROL) if FILE_CACHE_BYTES > 0 else None
+# Content-Encoding for text types (gzip, and br when the brotli module is installed);
+# pre-built "<file>.gz" / "<file>.br" siblings win over compressing on the fly, which is
+# done for cached files and listings and kept in a COMPRESS_CACHE_BYTES LRU
+COMPRESSION = os.environ.get("COMPRESSION", "1") != "0"
+COMPRESS_CACHE_BYTES = int(os.environ.get("COMPRESS_CACHE_BYTES", str(8 * 1024 * 1024)))
+COMPRESSED_CACHE = CompressedCache(COMPRESS_CACHE_BYTES)
+# how files that are not in FILE_CACHE are sent: "sendfile", or "mmap" to map
+# each file once and send every concurrent download from the shared mapping
+LARGE_FILE_MODE = os.environ.get("LARGE_FILE_MODE", "sendfile")
+MMAP_CACHE_ENTRIES = int(os.environ.get("MMAP_CACHE_ENTRIES", "32"))
+MMAP_CHUNK = 256 * 1024
+MMAP_CACHE = MmapCache(MMAP_CACHE_ENTRIES, FILE_CACHE_REVALIDATE) if LARGE_FILE_MODE == "mmap" else None
+# URL target -> resolved, traversal-checked path with its kind and mime type; an
+# entry is trusted for PATH_CACHE_TTL seconds, then the target is resolved again
+PATH_CACHE_ENTRIES = int(os.environ.get("PATH_CACHE_ENTRIES", "4096"))
+PATH_CACHE_TTL = float(os.environ.get("PATH_CACHE_TTL", "1.0"))
+PATH_CACHE = PathCache(PATH_CACHE_ENTRIES, PATH_CACHE_TTL)
+# CONTENT_INDEX=1 scans the served tree once at startup and routes by URL path
+# with one dict lookup instead of PATH_CACHE. A watcher keeps it current: inotify,
+# or a stat() of every entry each CONTENT_INDEX_POLL seconds where that is missing
+CONTENT_INDEX_POLL = float(os.environ.get("CONTENT_INDEX_POLL", "2"))
+CONTENT_INDEX = ContentIndex(CONTENT_INDEX_POLL) if os.environ.get("CONTENT_INDEX", "0") != "0" else None
+# rendered directory listings, reused until the directory's mtime changes
+# (entries added/removed/renamed) or LISTING_CACHE_TTL passes (sizes/dates of entries)
+LISTING_CACHE_TTL = float(os.environ.get("LISTING_CACHE_TTL", "5"))
+LISTING_CACHE_ENTRIES = 256
+LISTING_CACHE: Dict[Tuple[str, str], Tuple[int, float, List[bytes], List[str]]] = {}
+LISTING_LOCK = threading.Lock()
+# Prometheus text endpoint on the serving port; "" turns it off. Scrapes skip the
+# simulated work, not the rate limit: each one is a new connection, and the accept
+# loop charges its first request like any other. With PROCESSES > 1 each worker
+# reports its own
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+METRICS = Metrics()
+# opt-in per-request phase timing. Requests slower than SLOW_REQUEST_MS (0 = off) are
+# logged to SLOW_LOG as JSON lines ("-" = stderr). One request in PROFILE_EVERY (0 = off)
+# runs under cProfile ("cpu") or tracemalloc ("memory"), per PROFILE_MODE, and is
+# dumped to PROFILE_DIR
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+SLOW_LOG = os.environ.get("SLOW_LOG", "-")
+PROFILE_EVERY = int(os.environ.get("PROFILE_EVERY", "0"))
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cpu")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILER = RequestProfiler(SLOW_REQUEST_MS, SLOW_LOG, PROFILE_EVERY, PROFILE_MODE, PROFILE_DIR)
+# the simulated work, in seconds: once per request, and inside the hit-count update
+# (thread and pool engines only)
+WORK_DELAY = float(os.environ.get("WORK_DELAY", "0.5"))
+COUNT_DELAY = float(os.environ.get("COUNT_DELAY", "0.1"))
 
 # ensure common types exist
 mimetypes.init()
@@ -33,53 +154,113 @@ def file_size(num_bytes: int) -> str:
     return f"{num_bytes:.1f} TB"
 
 
-def _bump_count(path_key: str):
-    with COUNTS_LOCK:
-        current = COUNTS.get(path_key, 0)
-        time.sleep(100 / 1000.0)
-        COUNTS[path_key] = current + 1
+class Reply(NamedTuple):
+    status: str
+    headers: Dict[str, str]
+    body: bytes = b""
+    # when set, the body is this file and is read by the engine at send time
+    file_path: Optional[str] = None
+    # pre-encoded status line and headers (from the file cache), used as-is
+    # with only the connection headers appended when there is no Range
+    head: bytes = b""
+    # the request's Range header, set on file replies only
+    range_spec: str = ""
 
 
-def respond(conn, status, headers, body):
-    head = [f"HTTP/1.1 {status}".encode()]
-    for k, v in headers.items():
-        head.append(f"{k}: {v}".encode())
-    head.append(b"")
-    head.append(b"")
-    conn.sendall(b"\r\n".join(head) + body)
+class Request(NamedTuple):
+    target: str
+    version: str
+    # header names lower-cased
+    headers: Dict[str, str]
 
 
-def _is_subpath(child: str, parent: str) -> bool:
-    child_real = os.path.realpath(child)
-    parent_real = os.path.realpath(parent)
-    try:
-        return os.path.commonpath([child_real, parent_real]) == parent_real
-    except ValueError:
-        return False
+def _bump_count(path_key: str, delay: float = COUNT_DELAY):
+    # the simulated work runs outside any lock; the increment itself only
+    # touches this thread's shard, so requests no longer queue behind each other
+    if delay:
+        time.sleep(delay)
+    COUNTS.increment(path_key)
 
 
-def allow_request(ip: str) -> bool:
-    #  Check if request from IP should be allowed based on rate limit
-    now = time.time()
+def _encode_head(status: str, headers: Dict[str, str]) -> bytes:
+    # status line and headers, each CRLF-terminated, without the blank line;
+    # one join and one encode however many headers there are
+    return ("HTTP/1.1 " + status + "\r\n" +
+            "".join([k + ": " + v + "\r\n" for k, v in headers.items()])).encode()
 
-    with requests_lock:
-        if ip not in client_requests:
-            client_requests[ip] = []
 
-        timestamps = client_requests[ip]
+def _encode_response(status, headers, body) -> bytes:
+    return _encode_head(status, headers) + b"\r\n" + body
 
-        # Clean old timestamps beyond window
-        client_requests[ip] = [t for t in timestamps if now - t < TIME_WINDOW]
 
-        # Check limit
-        if len(client_requests[ip]) < REQUESTS_PER_SECOND:
-            client_requests[ip].append(now)
-            return True
-        return False
+def _static_reply(status: str, headers: Dict[str, str], body: bytes) -> Reply:
+    # encoded once at import; sending it only appends the connection headers
+    headers = {**headers, "Content-Length": str(len(body))}
+    return Reply(status, headers, body, head=_encode_head(status, headers))
 
 
-def _respond_429(conn):
-    body = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">
+# "Connection: ..." lines plus the blank line that ends a head, for every
+# position a request can have on a persistent connection
+_CLOSE_TAIL = b"Connection: close\r\n\r\n"
+_KEEPALIVE_TAILS = [
+    f"Connection: keep-alive\r\nKeep-Alive: timeout={KEEPALIVE_TIMEOUT:g}, "
+    f"max={KEEPALIVE_MAX_REQUESTS - served}\r\n\r\n".encode()
+    for served in range(KEEPALIVE_MAX_REQUESTS + 1)
+]
+
+
+def _connection_tail(keep_alive: bool, served: int) -> bytes:
+    return _KEEPALIVE_TAILS[served] if keep_alive else _CLOSE_TAIL
+
+
+def _sendmsg_all(conn: socket.socket, buffers: List[bytes]):
+    # scatter-gather: head and body leave in one sendmsg() without being joined
+    # into a new buffer first; partial sends resume where the kernel stopped
+    sent = conn.sendmsg(buffers)
+    if sent == sum(map(len, buffers)):
+        return
+    views = [memoryview(b) for b in buffers if b]
+    while True:
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if not views:
+            return
+        views[0] = views[0][sent:]
+        sent = conn.sendmsg(views)
+
+if not hasattr(socket.socket, "sendmsg"):
+    def _sendmsg_all(conn: socket.socket, buffers: List[bytes]):
+        conn.sendall(b"".join(buffers))
+
+
+# built once: the accept loop sends this without touching the worker pool
+_BUSY_BODY = b"Server busy, try again later"
+_BUSY_RESPONSE = _encode_response("503 Service Unavailable", {
+    "Content-Type": "text/plain",
+    "Retry-After": "1",
+    "Content-Length": str(len(_BUSY_BODY)),
+    "Connection": "close"
+}, _BUSY_BODY)
+# the accept loop's answers to refused connections: a status line and nothing to render
+_RATE_REFUSED = _encode_response("429 Too Many Requests", {
+    "Retry-After": "1",
+    "Content-Length": "0",
+    "Connection": "close"
+}, b"")
+_LIMIT_REFUSED = _encode_response("503 Service Unavailable", {
+    "Retry-After": "1",
+    "Content-Length": "0",
+    "Connection": "close"
+}, b"")
+
+
+def allow_request(ip: str) -> bool:
+    #  Check if request from IP should be allowed based on rate limit
+    return RATE_LIMITER.allow(ip)
+
+
+# error pages are encoded once at import and sent as ready-made buffers
+_TOO_MANY_BODY = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <link href='https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;600&display=swap' rel='stylesheet'>
     <title>429 Too Many Requests</title>
@@ -97,21 +278,17 @@ def _respond_429(conn):
     <p>Too Many Requests</p>
     <p class="hint">Please slow down and try again in a moment.</p>
     </div></body></html>""".encode("utf-8")
-
-    respond(conn, "429 Too Many Requests", {
-        "Content-Type": "text/html; charset=utf-8",
-        "Retry-After": "1",
-        "Content-Length": str(len(body)),
-        "Connection": "close"
-    }, body)
+_TOO_MANY_REQUESTS = _static_reply("429 Too Many Requests", {
+    "Content-Type": "text/html; charset=utf-8",
+    "Retry-After": "1",
+}, _TOO_MANY_BODY)
 
 
-def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
-    import datetime as _dt
-    try:
-        entries = sorted(os.listdir(abs_dir))
-    except OSError:
-        return b"<html><body><h1>Forbidden</h1></body></html>"
+def _listing_template(req_path: str, abs_dir: str) -> Tuple[List[bytes], List[str]]:
+    # one os.scandir() pass -> (pieces, hit keys): the page is pieces[0], then
+    # for each row its hit count followed by the next piece. Raises OSError.
+    with os.scandir(abs_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
 
     lines = [
         "<!DOCTYPE html>",
@@ -152,39 +329,77 @@ def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
     lines.append("<thead><tr><th>Name</th><th>Size</th><th>Last modified</th><th>Hits</th></tr></thead>")
     lines.append("<tbody>")
 
-    for name in entries:
-        full = os.path.join(abs_dir, name)
-        is_directory = os.path.isdir(full)
+    pieces: List[bytes] = []
+    keys: List[str] = []
+    for entry in entries:
+        name = entry.name
+        try:
+            is_directory = entry.is_dir()
+            st = entry.stat()
+        except OSError:
+            # vanished or dangling symlink
+            continue
         href = quote(name) + ("/" if is_directory else "")
         row_class = "dir" if is_directory else "file"
-        size = "—" if is_directory else file_size(os.path.getsize(full))
-        ts = os.path.getmtime(full)
-        mtime = _dt.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
-        hits = COUNTS.get(req_path + name + ("/" if is_directory else ""), 0)
+        size = "—" if is_directory else file_size(st.st_size)
+        mtime = datetime.datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M")
         lines.append(
             f'<tr class="{row_class}"><td><a href="{href}">{name}{"/" if is_directory else ""}</a></td>'
-            f"<td>{size}</td><td>{mtime}</td><td>{hits}</td></tr>"
+            f"<td>{size}</td><td>{mtime}</td><td>"
         )
+        pieces.append("\n".join(lines).encode("utf-8"))
+        keys.append(req_path + name + ("/" if is_directory else ""))
+        lines = ["</td></tr>"]
 
     lines.append("</tbody></table>")
     lines.append("</main>")
     lines.append("<div class='footer'>© 2025 Maxim Roenco | Powered by Python Socket Server</div>")
     lines.append("</body></html>")
+    pieces.append("\n".join(lines).encode("utf-8"))
+    return pieces, keys
 
-    return "\n".join(lines).encode("utf-8")
 
+def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
+    # rendered once per directory version; only the Hits column is filled in per request
+    try:
+        dir_mtime = os.stat(abs_dir).st_mtime_ns
+    except OSError:
+        return b"<html><body><h1>Forbidden</h1></body></html>"
 
+    key = (abs_dir, req_path)
+    now = time.monotonic()
+    cached = LISTING_CACHE.get(key)
+    if cached is not None and cached[0] == dir_mtime and now - cached[1] < LISTING_CACHE_TTL:
+        pieces, keys = cached[2], cached[3]
+    else:
+        try:
+            pieces, keys = _listing_template(req_path, abs_dir)
+        except OSError:
+            return b"<html><body><h1>Forbidden</h1></body></html>"
+        with LISTING_LOCK:
+            LISTING_CACHE.pop(key, None)
+            LISTING_CACHE[key] = (dir_mtime, now, pieces, keys)
+            while len(LISTING_CACHE) > LISTING_CACHE_ENTRIES:
+                LISTING_CACHE.pop(next(iter(LISTING_CACHE)))
 
-def _respond_301(conn, location: str):
-    body = (f'<html><body>Moved: <a href="{location}">{location}</a></body></html>').encode("utf-8")
-    respond(conn, "301 Moved Permanently",
-            {"Location": location, "Content-Type": "text/html; charset=utf-8",
+    # one merge of the counter shards instead of a shard walk per row
+    hits = COUNTS.snapshot()
+    out = [pieces[0]]
+    for hit_key, piece in zip(keys, pieces[1:]):
+        out.append(str(hits.get(hit_key, 0)).encode())
+        out.append(piece)
+    return b"".join(out)
 
-             "Content-Length": str(len(body)), "Connection": "close"}, body)
 
 
-def _respond_404(conn):
-    body = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">
+def _reply_301(location: str) -> Reply:
+    body = (f'<html><body>Moved: <a href="{location}">{location}</a></body></html>').encode("utf-8")
+    return Reply("301 Moved Permanently",
+                 {"Location": location, "Content-Type": "text/html; charset=utf-8",
+                  "Content-Length": str(len(body))}, body)
+
+
+_NOT_FOUND_BODY = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <link href='https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;600&display=swap' rel='stylesheet'>
     <title>404 Not Found</title>
@@ -203,134 +418,995 @@ def _respond_404(conn):
     <p>Oops! The page you’re looking for doesn’t exist.</p>
     <p><a href="/">Return to Home</a></p>
     </div></body></html>""".encode("utf-8")
+_NOT_FOUND = _static_reply("404 Not Found", {"Content-Type": "text/html; charset=utf-8"}, _NOT_FOUND_BODY)
+# one per status the request parser can reject with
+_PARSE_ERRORS = {status: _static_reply(f"{status} {reason}", {"Content-Type": "text/plain"}, reason.encode())
+                 for status, reason in REASONS.items()}
+_METHOD_NOT_ALLOWED = _static_reply("405 Method Not Allowed",
+                                    {"Allow": "GET", "Content-Type": "text/plain"}, b"Only GET is allowed")
+_INTERNAL_ERROR = _static_reply("500 Internal Server Error",
+                                {"Content-Type": "text/plain"}, b"Internal Server Error")
+
+
+def _parse_request(head: RequestHead) -> Tuple[Optional[Reply], Optional[Request]]:
+    # parsed head -> (error reply, None) or (None, request)
+    if head.method != "GET":
+        return _METHOD_NOT_ALLOWED, None
+    target = head.target
+    if not target.startswith("/"):
+        target = "/"
+    target = unquote(target)
+    if "\x00" in target:
+        # "%00": no file name can hold it, and os.path functions raise on it
+        return _PARSE_ERRORS[400], None
+    return None, Request(target, head.version, head.headers)
+
+
+def _route(request: Request, content_dir: str) -> Reply:
+    # content_dir is the root's realpath, computed once in main()
+    target = request.target
+    # 1) map to the filesystem; None means the path escapes content_dir (or,
+    # with the content index, is not in it)
+    if CONTENT_INDEX is not None:
+        resolved = CONTENT_INDEX.lookup(target)
+    else:
+        resolved = PATH_CACHE.resolve(content_dir, target)
+    mark_phase("resolve")
+    if resolved is None:
+        return _NOT_FOUND
+    requested_abs = resolved.path
+
+    # 2) directory
+    if resolved.kind == "dir":
+        if not target.endswith("/"):
+            return _reply_301(target + "/")
+        body = _minimal_listing_html(target, requested_abs)
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if COMPRESSION:
+            headers["Vary"] = "Accept-Encoding"
+            for encoding in _encodings(request, "text/html"):
+                # the hit counts make every listing body new: a cached variant would never be reused
+                encoded = COMPRESSED_CACHE.encode(body, encoding) if can_compress(encoding) else None
+                if encoded is not None:
+                    headers["Content-Encoding"] = encoding
+                    body = encoded
+                    break
+        headers["Content-Length"] = str(len(body))
+        return Reply("200 OK", headers, body)
+
+    # 3) file
+    if resolved.kind != "file":
+        return _NOT_FOUND
+
+    ext = os.path.splitext(requested_abs)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        return _NOT_FOUND
+
+    mime_type = resolved.mime
+    if mime_type is None:
+        return _NOT_FOUND
+
+    # an encoded variant if the client takes one we have, else the file as it is
+    vary = {"Vary": "Accept-Encoding"} if COMPRESSION and compressible(mime_type) else {}
+    for encoding in _encodings(request, mime_type):
+        extra = {"Content-Encoding": encoding, **vary}
+        sibling = _sibling(content_dir, target, resolved, encoding)
+        reply = _file_reply(request, sibling, mime_type, extra) if sibling is not None else None
+        if reply is None and can_compress(encoding):
+            reply = _file_reply(request, requested_abs, mime_type, extra, encoding)
+        if reply is not None:
+            return reply
+    reply = _file_reply(request, requested_abs, mime_type, vary)
+    if reply is None:
+        # gone since it was resolved: don't wait for the entry to expire
+        if CONTENT_INDEX is not None:
+            CONTENT_INDEX.refresh(target)
+        else:
+            PATH_CACHE.invalidate(content_dir, target)
+        return _NOT_FOUND
+    return reply
+
+
+def _sibling(content_dir: str, target: str, resolved: ResolvedPath, encoding: str) -> Optional[str]:
+    # the precompressed variant of a resolved file ("index.html.gz" next to
+    # "index.html"), if there is one not older than the file. Looked up like any
+    # target, so that a missing sibling is remembered too: a hot file costs no stat()
+    sibling_target = target + SIBLING_SUFFIX[encoding]
+    if CONTENT_INDEX is not None:
+        sibling = CONTENT_INDEX.lookup(sibling_target)
+    else:
+        sibling = PATH_CACHE.resolve(content_dir, sibling_target)
+    if sibling is not None and sibling.kind == "file" and sibling.mtime_ns >= resolved.mtime_ns:
+        return sibling.path
+    return None
+
+
+def _index_changed(paths: List[str]) -> None:
+    # the content index saw these resolved paths change: drop what is cached for
+    # them now rather than when the caches next revalidate
+    if not paths:
+        return
+    if FILE_CACHE is not None:
+        for path in paths:
+            FILE_CACHE.invalidate(path)
+    dirs = set(paths) | {os.path.dirname(path) for path in paths}
+    with LISTING_LOCK:
+        for key in [key for key in LISTING_CACHE if key[0] in dirs]:
+            del LISTING_CACHE[key]
+
+
+def _encodings(request: Request, mime_type: str) -> List[str]:
+    # content codings worth trying for this request, best first. Range requests
+    # always get the identity body so that offsets mean the same thing to everyone
+    if not COMPRESSION or not compressible(mime_type) or "range" in request.headers:
+        return []
+    return accepted_encodings(request.headers.get("accept-encoding", ""))
+
+
+def _file_reply(request: Request, path: str, mime_type: str, extra: Dict[str, str],
+                encoding: str = "") -> Optional[Reply]:
+    # 200/206/304 for the file at `path`, with `extra` headers on every variant.
+    # With `encoding` the cached body is compressed on the fly; None when that is
+    # not possible (file not cached, not worth it) or the file is gone
+    range_spec = request.headers.get("range", "")
+    if FILE_CACHE is not None:
+        cached = FILE_CACHE.get(path, mime_type)
+        if cached is not None:
+            mtime = cached.mtime_ns / 1e9
+            etag, body = cached.etag, cached.body
+            if encoding:
+                body = COMPRESSED_CACHE.get(cached.body, encoding, cached.etag)
+                if body is None:
+                    return None
+                etag = variant_etag(cached.etag, encoding)
+            if not_modified(request.headers, etag, mtime):
+                return _reply_304(etag, mtime, extra)
+            if range_spec and not range_still_valid(request.headers, etag, mtime):
+                range_spec = ""
+            if not extra and not range_spec:
+                # the pre-encoded head covers the plain 200
+                return Reply("200 OK", {}, body, head=cached.head)
+            headers = _file_headers(mime_type, etag, mtime)
+            headers.update(extra)
+            # a Range reply gets its own Content-Length from the body plan
+            headers["Content-Length"] = str(len(body))
+            return Reply("200 OK", headers, body, range_spec=range_spec)
+    if encoding:
+        return None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    etag = etag_of_stat(st)
+    if not_modified(request.headers, etag, st.st_mtime):
+        return _reply_304(etag, st.st_mtime, extra)
+    if range_spec and not range_still_valid(request.headers, etag, st.st_mtime):
+        range_spec = ""
+
+    # body and Content-Length are filled in by the engine that sends it
+    headers = _file_headers(mime_type, etag, st.st_mtime)
+    headers.update(extra)
+    return Reply("200 OK", headers, file_path=path, range_spec=range_spec)
+
+
+def _validator_headers(etag: str, mtime: float) -> Dict[str, str]:
+    headers = {"ETag": etag, "Last-Modified": http_date(mtime)}
+    if CACHE_CONTROL:
+        headers["Cache-Control"] = CACHE_CONTROL
+    return headers
+
+
+def _file_headers(mime_type: str, etag: str, mtime: float) -> Dict[str, str]:
+    headers = {"Content-Type": mime_type}
+    headers.update(_validator_headers(etag, mtime))
+    return headers
+
+
+def _reply_304(etag: str, mtime: float, extra: Optional[Dict[str, str]] = None) -> Reply:
+    # validators (and Vary / Content-Encoding of the variant) only: a 304 never carries a body
+    headers = _validator_headers(etag, mtime)
+    headers.update(extra or {})
+    return Reply("304 Not Modified", headers)
+
+
+def _parse_range(spec: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    # "bytes=0-99, 500-, -200" -> [(offset, length), ...]. None means ignore the
+    # header and send the whole file (malformed, other unit, too many ranges);
+    # an empty list means none of the ranges is satisfiable
+    unit, _, ranges = spec.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges.strip():
+        return None
+    items = ranges.split(",")
+    if len(items) > MAX_RANGES:
+        return None
+    result = []
+    for item in items:
+        first, dash, last = item.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        end = min(end, size - 1)
+        result.append((start, end - start + 1))
+    return result
+
+
+def _body_plan(reply: Reply, size: int) -> Tuple[str, Dict[str, str], List[Tuple[bytes, int, int]], bytes]:
+    # how to send a file body of `size` bytes for this reply's Range header:
+    # (status, headers, [(part prefix, offset, length), ...], trailer)
+    headers = dict(reply.headers)
+    headers["Accept-Ranges"] = "bytes"
+    ranges = _parse_range(reply.range_spec, size) if reply.range_spec else None
+
+    if ranges is None:
+        headers["Content-Length"] = str(size)
+        return reply.status, headers, [(b"", 0, size)], b""
+
+    if not ranges:
+        headers["Content-Range"] = f"bytes */{size}"
+        headers["Content-Length"] = "0"
+        return "416 Range Not Satisfiable", headers, [], b""
+
+    if len(ranges) == 1:
+        offset, length = ranges[0]
+        headers["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{size}"
+        headers["Content-Length"] = str(length)
+        return "206 Partial Content", headers, [(b"", offset, length)], b""
+
+    boundary = os.urandom(12).hex()
+    content_type = headers.get("Content-Type", "application/octet-stream")
+    parts = []
+    for i, (offset, length) in enumerate(ranges):
+        prefix = ((b"\r\n" if i else b"") +
+                  f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+                  f"Content-Range: bytes {offset}-{offset + length - 1}/{size}\r\n\r\n".encode())
+        parts.append((prefix, offset, length))
+    trailer = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    headers["Content-Length"] = str(sum(len(prefix) + length for prefix, _, length in parts) + len(trailer))
+    return "206 Partial Content", headers, parts, trailer
+
+
+def _path_class(target: str) -> int:
+    # metrics label: what the request asked for, whatever the answer was
+    if target.endswith("/"):
+        return LISTING
+    if os.path.splitext(target)[1].lower() in ALLOWED_EXTENSIONS:
+        return FILE
+    return OTHER
+
+
+def _metrics_reply() -> Reply:
+    caches = {"path": PATH_CACHE.stats(), "listing": {"entries": len(LISTING_CACHE)}}
+    if CONTENT_INDEX is not None:
+        caches["index"] = CONTENT_INDEX.stats()
+    if FILE_CACHE is not None:
+        caches["file"] = FILE_CACHE.stats()
+    if MMAP_CACHE is not None:
+        caches["mmap"] = MMAP_CACHE.stats()
+    if COMPRESSION:
+        caches["compressed"] = COMPRESSED_CACHE.stats()
+    body = METRICS.render(caches, {**LIMITER.refused, **REAPER.reaped})
+    return Reply("200 OK", {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                            "Content-Length": str(len(body))}, body)
+
+
+def _wants_keep_alive(request: Request) -> bool:
+    # HTTP/1.1 is persistent unless the client says close, HTTP/1.0 only if it asks
+    connection = request.headers.get("connection", "").lower()
+    if request.version == "HTTP/1.1":
+        return connection != "close"
+    return connection == "keep-alive"
+
+
+def _read_request(conn: socket.socket, parser: RequestParser) -> Tuple[Optional[Reply], Optional[RequestHead]]:
+    # next request off the connection -> (None, head), or (error reply, None) when
+    # the parser rejects it; (None, None) on EOF or idle timeout. The parser keeps
+    # whatever arrived past this request (pipelining)
+    timeline = current_timeline()
+    armed = False
+    try:
+        head = parser.next_request()
+        while head is None:
+            try:
+                chunk = conn.recv(65536)
+            except socket.timeout:
+                return None, None
+            if not chunk:
+                return None, None
+            parser.feed(chunk)
+            # only the call that completes the head is timed, not the waiting
+            start = time.perf_counter()
+            if timeline is not None:
+                timeline.arrived(start)
+            head = parser.next_request()
+            if head is not None:
+                METRICS.observe(PARSE, time.perf_counter() - start)
+                if timeline is not None:
+                    timeline.mark("recv", start)
+            elif not armed and HEADER_TIMEOUT:
+                # the head has started to arrive: the rest of it is due within HEADER_TIMEOUT
+                REAPER.arm(conn, HEADER_TIMEOUT, HEADER_DEADLINE)
+                armed = True
+    except ParseError as e:
+        mark_phase("parse")
+        return _PARSE_ERRORS[e.status], None
+    finally:
+        if armed:
+            REAPER.disarm(conn)
+    if timeline is not None:
+        timeline.mark("parse")
+        timeline.method, timeline.target = head.method, head.target
+    return None, head
+
+
+def _reply_buffers(reply: Reply, keep_alive: bool, served: int) -> Tuple[str, List[bytes]]:
+    # response for replies that carry their body in memory -> (status sent, buffers
+    # to send in order): the head is never concatenated with the body
+    tail = _connection_tail(keep_alive, served)
+    if reply.range_spec:
+        status, headers, parts, trailer = _body_plan(reply, len(reply.body))
+        body = memoryview(reply.body)
+        out = [_encode_head(status, headers), tail]
+        for prefix, offset, length in parts:
+            out.append(prefix)
+            out.append(body[offset:offset + length])
+        out.append(trailer)
+        return status, out
+    if reply.head:
+        return reply.status, [reply.head, tail, reply.body]
+    return reply.status, [_encode_head(reply.status, reply.headers), tail, reply.body]
+
+
+def _buffers_size(buffers: List[bytes]) -> int:
+    total = 0
+    for buf in buffers:
+        total += len(buf)
+    return total
+
+
+def _send_budget(size: int) -> float:
+    # seconds a client may take to receive `size` bytes of response
+    return SEND_TIMEOUT + (size / MIN_SEND_RATE if MIN_SEND_RATE > 0 else 0.0)
+
+
+def _sent(status: str, path_class: int, sent: int, start: float) -> None:
+    # a response is out: into the metrics, and into the timeline if the request is timed
+    METRICS.response(status, path_class, sent, time.perf_counter() - start)
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.status = status
+        timeline.mark("send")
+
 
-    respond(conn, "404 Not Found", {
-        "Content-Type": "text/html; charset=utf-8",
-        "Content-Length": str(len(body)),
-        "Connection": "close"
-    }, body)
+def _send_planned(conn: socket.socket, reply: Reply, size: int, keep_alive: bool, served: int,
+                  send_segment: Callable[[int, int], None]) -> Tuple[str, int]:
+    # -> (status sent, bytes sent)
+    status, headers, parts, trailer = _body_plan(reply, size)
+    head = _encode_head(status, headers) + _connection_tail(keep_alive, served)
+    conn.sendall(head)
+    sent = len(head) + len(trailer)
+    for prefix, offset, length in parts:
+        if prefix:
+            conn.sendall(prefix)
+        send_segment(offset, length)
+        sent += len(prefix) + length
+    if trailer:
+        conn.sendall(trailer)
+    return status, sent
+
+
+def _send_reply(conn: socket.socket, reply: Reply, keep_alive: bool = False, served: int = 0,
+                path_class: int = OTHER) -> bool:
+    # returns whether the connection can carry another request. Past the send
+    # deadline the reaper shuts the socket down and the send fails with OSError
+    start = time.perf_counter()
+    try:
+        if reply.file_path is None:
+            status, buffers = _reply_buffers(reply, keep_alive, served)
+            size = _buffers_size(buffers)
+            if SEND_TIMEOUT:
+                REAPER.arm(conn, _send_budget(size), SEND_DEADLINE)
+            _sendmsg_all(conn, buffers)
+            _sent(status, path_class, size, start)
+            return keep_alive
+        mapping = MMAP_CACHE.acquire(reply.file_path) if MMAP_CACHE is not None else None
+        if mapping is not None:
+            if SEND_TIMEOUT:
+                REAPER.arm(conn, _send_budget(mapping.size), SEND_DEADLINE)
+            try:
+                # straight from the shared mapping: no per-request copy of the body
+                with memoryview(mapping.mmap) as view:
+                    status, sent = _send_planned(conn, reply, mapping.size, keep_alive, served,
+                                                 lambda offset, length: conn.sendall(view[offset:offset + length]))
+            finally:
+                MMAP_CACHE.release(mapping)
+            _sent(status, path_class, sent, start)
+            return keep_alive
+        try:
+            f = open(reply.file_path, "rb")
+        except OSError:
+            return _send_reply(conn, _INTERNAL_ERROR, False, served, path_class)
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if SEND_TIMEOUT:
+                REAPER.arm(conn, _send_budget(size), SEND_DEADLINE)
+            # zero-copy os.sendfile() where the platform has it; otherwise the
+            # stdlib falls back to send() of bounded chunks, never the whole file
+            status, sent = _send_planned(conn, reply, size, keep_alive, served,
+                                         lambda offset, length: conn.sendfile(f, offset, length))
+        _sent(status, path_class, sent, start)
+        return keep_alive
+    finally:
+        REAPER.disarm(conn)
 
 
 # multithreaded handler
-def _serve_connection(conn: socket.socket, addr, content_dir: str):
-    # Multithreaded handler with rate limiting
+def _serve_connection(conn: socket.socket, addr, content_dir: str, accepted: Optional[float] = None,
+                      parser: Optional[RequestParser] = None, served: int = 0,
+                      park: Optional[Callable[[socket.socket, object], None]] = None):
+    # Multithreaded handler with rate limiting, serving requests until the
+    # client closes, goes idle or reaches KEEPALIVE_MAX_REQUESTS. `accepted` is
+    # the perf_counter() of accept(), for the phase timings. With `park` (the
+    # pool), a kept-alive connection with nothing left to answer is handed to it
+    # instead of holding this thread while idle; it comes back with its
+    # `parser` and `served` once the client sends again
+    timeline = None
+    parked = False
     try:
+        if parser is None:
+            METRICS.connection_opened()
+            parser = RequestParser(MAX_HEAD_BYTES, MAX_HEADERS)
         client_ip = addr[0]
+        conn.settimeout(KEEPALIVE_TIMEOUT)
+        keep_alive = True
+        while keep_alive:
+            timeline = PROFILER.begin(client_ip, accepted if served == 0 else None)
+            error, head = _read_request(conn, parser)
+            if error is None and head is None:
+                return
+            served += 1
 
-        # Check rate limit
-        if not allow_request(client_ip):
-            _respond_429(conn)
-            return
+            if error is None and METRICS_PATH and head.target == METRICS_PATH:
+                _send_reply(conn, _metrics_reply())
+                return
 
-        time.sleep(0.5)  # simulate work
-        data = conn.recv(4096)
-        if not data:
-            return
+            # Check rate limit (the first request was admitted along with the connection)
+            allowed = served == 1 or allow_request(client_ip)
+            mark_phase("rate_limit")
+            if not allowed:
+                METRICS.rate_limited()
+                _send_reply(conn, _TOO_MANY_REQUESTS)
+                return
 
-        line = data.split(b"\r\n", 1)[0].decode(errors="replace")
-        parts = line.split()
-        if len(parts) != 3:
-            respond(conn, "400 Bad Request",
-                    {"Content-Type": "text/plain", "Connection": "close"},
-                    b"Bad Request")
-            return
+            if WORK_DELAY:
+                time.sleep(WORK_DELAY)  # simulate work
+            mark_phase("work")
 
-        method, target, version = parts
-        if method != "GET":
-            respond(conn, "405 Method Not Allowed",
-                    {"Allow": "GET", "Content-Type": "text/plain", "Connection": "close"},
-                    b"Only GET is allowed")
-            return
+            if error is None:
+                error, request = _parse_request(head)
+            if error is not None:
+                _send_reply(conn, error)
+                return
 
-        if not target.startswith("/"):
-            target = "/"
-        target = unquote(target)
-        _bump_count(target)
+            _bump_count(request.target)
+            mark_phase("count")
+            keep_alive = _wants_keep_alive(request) and served < KEEPALIVE_MAX_REQUESTS
+            start = time.perf_counter()
+            reply = _route(request, content_dir)
+            METRICS.observe(FILESYSTEM, time.perf_counter() - start)
+            mark_phase("body")
+            keep_alive = _send_reply(conn, reply, keep_alive, served, _path_class(request.target))
+            PROFILER.end(timeline)
+            timeline = None
+            if keep_alive and park is not None and not parser.buffered:
+                park(conn, (addr, parser, served))
+                parked = True
+                return
+    except socket.timeout:
+        # a send made no progress for KEEPALIVE_TIMEOUT: reset, rather than leave the
+        # kernel delivering the rest to a client that is not reading
+        linger_off(conn)
+    except OSError:
+        pass
+    finally:
+        PROFILER.end(timeline)
+        if not parked:
+            _close_connection(conn, addr)
 
-        # map to filesystem under content_dir
-        requested_rel = "" if target == "/" else target.lstrip("/")
-        requested_abs = os.path.realpath(os.path.join(content_dir, requested_rel))
 
-        # 1) traversal guard
-        if not _is_subpath(requested_abs, content_dir):
-            _respond_404(conn)
-            return
+def _close_connection(conn: socket.socket, addr) -> None:
+    METRICS.connection_closed()
+    LIMITER.close(addr[0])
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# event-loop handler: same routing, one coroutine per connection instead of a thread
+async def _send_planned_async(writer: asyncio.StreamWriter, reply: Reply, size: int,
+                              keep_alive: bool, served: int,
+                              send_segment: Callable[[int, int], Awaitable[None]]) -> Tuple[str, int]:
+    status, headers, parts, trailer = _body_plan(reply, size)
+    head = _encode_head(status, headers) + _connection_tail(keep_alive, served)
+    writer.write(head)
+    sent = len(head) + len(trailer)
+    for prefix, offset, length in parts:
+        if prefix:
+            writer.write(prefix)
+        await send_segment(offset, length)
+        sent += len(prefix) + length
+    if trailer:
+        writer.write(trailer)
+    await writer.drain()
+    return status, sent
+
+
+def _send_expired(writer: asyncio.StreamWriter) -> None:
+    # past the send deadline: reset the connection, so that neither asyncio's
+    # buffer nor the kernel's send queue is kept for a client that reads nothing
+    REAPER.expired(SEND_DEADLINE)
+    linger_off(writer.get_extra_info("socket"))
+    writer.transport.abort()
 
-        # 2) directory
-        if os.path.isdir(requested_abs):
-            if not target.endswith("/"):
-                _respond_301(conn, target + "/")
+
+def _arm_send_async(deadline: asyncio.Timeout, size: int) -> None:
+    if SEND_TIMEOUT:
+        deadline.reschedule(asyncio.get_running_loop().time() + _send_budget(size))
+
+
+async def _send_reply_async(writer: asyncio.StreamWriter, reply: Reply, keep_alive: bool = False,
+                            served: int = 0, path_class: int = OTHER) -> bool:
+    start = time.perf_counter()
+    try:
+        # armed once the response size is known; cancels a pending drain() or
+        # loop.sendfile() cleanly, which aborting the transport under it would not
+        async with asyncio.timeout(None) as deadline:
+            if reply.file_path is None:
+                status, buffers = _reply_buffers(reply, keep_alive, served)
+                size = _buffers_size(buffers)
+                writer.writelines(buffers)
+                if writer.transport.get_write_buffer_size():
+                    # the kernel did not take it all at once: the client sets the pace now
+                    _arm_send_async(deadline, size)
+                    await writer.drain()
+                _sent(status, path_class, size, start)
+                return keep_alive
+            mapping = MMAP_CACHE.acquire(reply.file_path) if MMAP_CACHE is not None else None
+            if mapping is not None:
+                _arm_send_async(deadline, mapping.size)
+                try:
+                    with memoryview(mapping.mmap) as view:
+                        async def send_view(offset: int, length: int):
+                            for start in range(offset, offset + length, MMAP_CHUNK):
+                                writer.write(view[start:min(start + MMAP_CHUNK, offset + length)])
+                                await writer.drain()
+
+                        status, sent = await _send_planned_async(writer, reply, mapping.size, keep_alive,
+                                                                 served, send_view)
+                finally:
+                    MMAP_CACHE.release(mapping)
+                _sent(status, path_class, sent, start)
+                return keep_alive
+            try:
+                f = open(reply.file_path, "rb")
+            except OSError:
+                return await _send_reply_async(writer, _INTERNAL_ERROR, False, served, path_class)
+            with f:
+                async def send_file(offset: int, length: int):
+                    await writer.drain()
+                    # os.sendfile() on the transport's socket, chunked read/write fallback otherwise
+                    await asyncio.get_running_loop().sendfile(writer.transport, f, offset, length)
+
+                size = os.fstat(f.fileno()).st_size
+                _arm_send_async(deadline, size)
+                status, sent = await _send_planned_async(writer, reply, size, keep_alive, served, send_file)
+            _sent(status, path_class, sent, start)
+            return keep_alive
+    except TimeoutError:
+        _send_expired(writer)
+        raise ConnectionResetError("send deadline passed")
+
+
+async def _read_request_async(reader: asyncio.StreamReader,
+                              parser: RequestParser) -> Tuple[Optional[Reply], Optional[RequestHead]]:
+    # same contract as _read_request
+    timeline = current_timeline()
+    deadline = None
+    try:
+        head = parser.next_request()
+        while head is None:
+            if deadline is None:
+                chunk = await asyncio.wait_for(reader.read(65536), KEEPALIVE_TIMEOUT)
+            else:
+                # the head has started to arrive: HEADER_TIMEOUT for all of it
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    REAPER.expired(HEADER_DEADLINE)
+                    return None, None
+                chunk = await asyncio.wait_for(reader.read(65536), min(wait, KEEPALIVE_TIMEOUT))
+            if not chunk:
+                return None, None
+            if deadline is None and HEADER_TIMEOUT:
+                deadline = time.monotonic() + HEADER_TIMEOUT
+            parser.feed(chunk)
+            start = time.perf_counter()
+            if timeline is not None:
+                timeline.arrived(start)
+            head = parser.next_request()
+            if head is not None:
+                METRICS.observe(PARSE, time.perf_counter() - start)
+                if timeline is not None:
+                    timeline.mark("recv", start)
+    except ParseError as e:
+        mark_phase("parse")
+        return _PARSE_ERRORS[e.status], None
+    except asyncio.TimeoutError:
+        return None, None
+    if timeline is not None:
+        timeline.mark("parse")
+        timeline.method, timeline.target = head.method, head.target
+    return None, head
+
+
+async def _serve_async_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                                  content_dir: str, client_ip: str):
+    # admitted by the accept loop, which opened the LIMITER slot of `client_ip`
+    timeline = None
+    try:
+        METRICS.connection_opened()
+        parser = RequestParser(MAX_HEAD_BYTES, MAX_HEADERS)
+        served = 0
+        keep_alive = True
+        while keep_alive:
+            timeline = PROFILER.begin(client_ip)
+            error, head = await _read_request_async(reader, parser)
+            if error is None and head is None:
                 return
-            body = _minimal_listing_html(target, requested_abs)
-            respond(conn, "200 OK",
-                    {"Content-Type": "text/html; charset=utf-8",
-                    "Content-Length": str(len(body)), "Connection": "close"},
-                    body)
-            return
+            served += 1
 
-        # 3) file
-        if not os.path.isfile(requested_abs):
-            _respond_404(conn)
-            return
+            if error is None and METRICS_PATH and head.target == METRICS_PATH:
+                await _send_reply_async(writer, _metrics_reply())
+                return
 
-        ext = os.path.splitext(requested_abs)[1].lower()
-        if ext not in ALLOWED_EXTENSIONS:
-            _respond_404(conn)
-            return
+            allowed = served == 1 or allow_request(client_ip)
+            mark_phase("rate_limit")
+            if not allowed:
+                METRICS.rate_limited()
+                await _send_reply_async(writer, _TOO_MANY_REQUESTS)
+                return
 
-        mime_type, _ = mimetypes.guess_type(requested_abs)
-        if mime_type is None:
-            _respond_404(conn)
-            return
+            if WORK_DELAY:
+                await asyncio.sleep(WORK_DELAY)  # simulate work
+            mark_phase("work")
 
-        try:
-            with open(requested_abs, "rb") as f:
-                body = f.read()
-            respond(conn, "200 OK",
-                    {"Content-Type": mime_type,
-                    "Content-Length": str(len(body)), "Connection": "close"},
-                    body)
-        except OSError:
-            respond(conn, "500 Internal Server Error",
-                    {"Content-Type": "text/plain", "Connection": "close"},
-                    b"Internal Server Error")
+            if error is None:
+                error, request = _parse_request(head)
+            if error is not None:
+                await _send_reply_async(writer, error)
+                return
+
+            # single-threaded loop: no race to demonstrate, so no artificial delay
+            _bump_count(request.target, delay=0)
+            mark_phase("count")
+            keep_alive = _wants_keep_alive(request) and served < KEEPALIVE_MAX_REQUESTS
+            start = time.perf_counter()
+            reply = _route(request, content_dir)
+            METRICS.observe(FILESYSTEM, time.perf_counter() - start)
+            mark_phase("body")
+            keep_alive = await _send_reply_async(writer, reply, keep_alive, served, _path_class(request.target))
+            PROFILER.end(timeline)
+            timeline = None
+    except (ConnectionError, OSError):
+        pass
     finally:
+        PROFILER.end(timeline)
+        METRICS.connection_closed()
+        LIMITER.close(client_ip)
+        writer.close()
+
+
+def _run_async(s: socket.socket, content_dir: str):
+    async def serve():
+        loop = asyncio.get_running_loop()
+        s.setblocking(False)
+
+        def protocol(client_ip: str) -> asyncio.StreamReaderProtocol:
+            # the address the accept loop admitted, not a peername lookup that
+            # may fail once the client is gone
+            def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+                return _serve_async_connection(reader, writer, content_dir, client_ip)
+            return asyncio.StreamReaderProtocol(asyncio.StreamReader(), connected)
+
+        while True:
+            try:
+                first = await loop.sock_accept(s)
+            except OSError as e:
+                print(f"Accept error: {e}")
+                await asyncio.sleep(ACCEPT_RETRY_DELAY)
+                continue
+            for conn, addr in _admit(_accept_pending(s, [first])):
+                # what asyncio.start_server() does with each connection, after admission
+                try:
+                    await loop.connect_accepted_socket(lambda ip=addr[0]: protocol(ip), conn)
+                except OSError:
+                    LIMITER.close(addr[0])
+                    conn.close()
+
+    asyncio.run(serve())
+
+
+def _shed(conn: socket.socket, response: bytes = _BUSY_RESPONSE, status: str = "503 Service Unavailable"):
+    # reject from the accept loop: never block, never spawn a thread
+    try:
+        conn.setblocking(False)
         try:
-            conn.close()
-        except Exception:
+            # drain what already arrived so close() doesn't turn into a RST
+            conn.recv(4096)
+        except (BlockingIOError, InterruptedError):
             pass
+        conn.send(response)
+        conn.shutdown(socket.SHUT_WR)
+        METRICS.shed(status, len(response))
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def _refuse(conn: socket.socket, policy: str, response: bytes, status: str):
+    if policy == "close":
+        linger_off(conn)
+        conn.close()
+    else:
+        _shed(conn, response, status)
+
+
+def _accept_pending(s: socket.socket, batch: List[Tuple[socket.socket, Tuple]]) -> List[Tuple[socket.socket, Tuple]]:
+    # adds the connections already waiting in the backlog, up to ACCEPT_BATCH;
+    # `s` is non-blocking. Raises OSError only when accept() fails with nothing
+    # accepted yet; with a batch in hand it stops there and the batch is served
+    while len(batch) < ACCEPT_BATCH:
+        try:
+            batch.append(s.accept())
+        except (BlockingIOError, InterruptedError):
+            break
+        except ConnectionAbortedError:
+            # the client gave up while queued; the next one may be fine
+            continue
+        except OSError:
+            if batch:
+                break
+            raise
+    return batch
+
+
+def _accept_batches(s: socket.socket) -> Iterator[List[Tuple[socket.socket, Tuple]]]:
+    # one wait per burst: blocks until connections arrive, then yields all of
+    # those already waiting together. A batch may come up empty when another
+    # pre-fork worker took the connection first
+    s.setblocking(False)
+    with selectors.DefaultSelector() as selector:
+        selector.register(s, selectors.EVENT_READ)
+        while True:
+            selector.select()
+            try:
+                batch = _accept_pending(s, [])
+            except OSError as e:
+                print(f"Accept error: {e}")
+                time.sleep(ACCEPT_RETRY_DELAY)
+                continue
+            if batch:
+                yield batch
+
+
+def _admit(batch: List[Tuple[socket.socket, Tuple]]) -> List[Tuple[socket.socket, Tuple]]:
+    # decides a burst of accepted connections at once: the rate limit for each
+    # one's first request, then the connection caps. Refused connections are
+    # answered or reset and closed here; the admitted ones are returned
+    allowed = RATE_LIMITER.allow_many([addr[0] for _, addr in batch])
+    admitted = []
+    for (conn, addr), ok in zip(batch, allowed):
+        if ok:
+            admitted.append((conn, addr))
+        else:
+            METRICS.rate_limited()
+            _refuse(conn, RATE_REJECT, _RATE_REFUSED, "429 Too Many Requests")
+    limits = LIMITER.open_many([addr[0] for _, addr in admitted])
+    out = []
+    for (conn, addr), limit in zip(admitted, limits):
+        if limit is None:
+            out.append((conn, addr))
+        else:
+            _refuse(conn, LIMIT_REJECT, _LIMIT_REFUSED, "503 Service Unavailable")
+    return out
+
+
+def _pool_worker(pending: "queue.Queue", content_dir: str, park: KeepAlivePark):
+    while True:
+        conn, addr, accepted, parser, served = pending.get()
+        try:
+            _serve_connection(conn, addr, content_dir, accepted, parser, served, park.park)
+        except Exception as e:
+            print(f"Worker error: {e}")
+
+
+def _run_thread_per_request(s: socket.socket, content_dir: str):
+    for batch in _accept_batches(s):
+        accepted = time.perf_counter()
+        for conn, addr in _admit(batch):
+            # Create a new thread for each request
+            thread = threading.Thread(
+                target=_serve_connection,
+                args=(conn, addr, content_dir, accepted),
+                daemon=True
+            )
+            thread.start()
+
+
+def _run_pool(s: socket.socket, content_dir: str):
+    global KEEPALIVE_PARK
+    pending: "queue.Queue" = queue.Queue(maxsize=ACCEPT_BACKLOG)
+
+    def resume(conn: socket.socket, data) -> None:
+        # the parked client sent its next request: back in line for a worker
+        addr, parser, served = data
+        try:
+            pending.put_nowait((conn, addr, None, parser, served))
+        except queue.Full:
+            _close_connection(conn, addr)
+
+    KEEPALIVE_PARK = KeepAlivePark(KEEPALIVE_TIMEOUT, resume, lambda conn, data: _close_connection(conn, data[0]))
+    for i in range(MAX_WORKERS):
+        threading.Thread(
+            target=_pool_worker,
+            args=(pending, content_dir, KEEPALIVE_PARK),
+            name=f"worker-{i}",
+            daemon=True
+        ).start()
+
+    for batch in _accept_batches(s):
+        accepted = time.perf_counter()
+        for conn, addr in _admit(batch):
+            try:
+                pending.put_nowait((conn, addr, accepted, None, 0))
+            except queue.Full:
+                LIMITER.close(addr[0])
+                _shed(conn)
+
+
+def _listening_socket(reuse_port: bool) -> socket.socket:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((HOST, PORT))
+    s.listen(ACCEPT_BACKLOG)
+    return s
+
+
+def _serve(s: socket.socket, content_dir: str):
+    if CONTENT_INDEX is not None:
+        # here rather than in main(): a pre-forked worker needs its own watcher thread
+        CONTENT_INDEX.watch(_index_changed)
+    try:
+        if SERVER_MODE == "pool":
+            _run_pool(s, content_dir)
+        elif SERVER_MODE == "async":
+            _run_async(s, content_dir)
+        else:
+            _run_thread_per_request(s, content_dir)
+    except KeyboardInterrupt:
+        print("\nShutting down server...")
+        if FILE_CACHE is not None:
+            print(f"File cache: {FILE_CACHE.stats()}")
+        if MMAP_CACHE is not None:
+            print(f"Mapped files: {MMAP_CACHE.stats()}")
+        if COMPRESSION:
+            print(f"Compressed variants: {COMPRESSED_CACHE.stats()}")
+        print(f"Resolved paths: {PATH_CACHE.stats()}")
+        if CONTENT_INDEX is not None:
+            print(f"Content index ({CONTENT_INDEX.watching}): {CONTENT_INDEX.stats()}")
+        print(f"Connections: {LIMITER.stats()}, deadlines: {REAPER.stats()}")
+        if KEEPALIVE_PARK is not None:
+            print(f"Idle keep-alive connections: {KEEPALIVE_PARK.stats()}")
+        if PROFILER.enabled:
+            print(f"Slow requests: {PROFILER.slow}, profiles written: {PROFILER.samples}")
+        sys.exit(0)
+
+
+def _run_prefork(content_dir: str):
+    # the kernel spreads new connections over the workers' SO_REUSEPORT sockets;
+    # where that option is missing every worker accepts on one inherited socket
+    if hasattr(socket, "SO_REUSEPORT"):
+        sockets = [_listening_socket(True) for _ in range(PROCESSES)]
+    else:
+        sockets = [_listening_socket(False)] * PROCESSES
+
+    children = []
+    for i, s in enumerate(sockets):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for other in sockets:
+                    if other is not s:
+                        other.close()
+                _serve(s, content_dir)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    for s in sockets:
+        s.close()
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C reaches the whole process group, so the workers stop on their own
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for pid in children:
+        os.waitpid(pid, 0)
+
 
 def main():
     if len(sys.argv) != 2:
         print("Usage: python server_mt.py <directory>")
         sys.exit(1)
-    content_dir = os.path.abspath(sys.argv[1])
+    # resolved once: every request's path is checked against this
+    content_dir = os.path.realpath(sys.argv[1])
     if not os.path.isdir(content_dir):
         print(f"Error: Directory '{content_dir}' does not exist.")
         sys.exit(1)
 
-    print(f"Serving directory (MT - Thread per request): {content_dir}")
+    if SERVER_MODE == "pool":
+        print(f"Serving directory (MT - pool of {MAX_WORKERS} workers, queue {ACCEPT_BACKLOG}): {content_dir}")
+    elif SERVER_MODE == "thread":
+        print(f"Serving directory (MT - Thread per request): {content_dir}")
+    elif SERVER_MODE == "async":
+        print(f"Serving directory (asyncio event loop): {content_dir}")
+    else:
+        print(f"Error: Unknown SERVER_MODE '{SERVER_MODE}' (expected 'thread', 'pool' or 'async').")
+        sys.exit(1)
+    if LARGE_FILE_MODE not in ("sendfile", "mmap"):
+        print(f"Error: Unknown LARGE_FILE_MODE '{LARGE_FILE_MODE}' (expected 'sendfile' or 'mmap').")
+        sys.exit(1)
+    if RATE_REJECT not in ("reply", "close") or LIMIT_REJECT not in ("reply", "close"):
+        print("Error: RATE_REJECT and LIMIT_REJECT must be 'reply' or 'close'.")
+        sys.exit(1)
+    if PROCESSES > 1:
+        print(f"Pre-fork: {PROCESSES} worker processes sharing the port")
+    if CONTENT_INDEX is not None:
+        start = time.perf_counter()
+        CONTENT_INDEX.build(content_dir)
+        print(f"Content index: {CONTENT_INDEX.stats()['entries']} entries "
+              f"in {(time.perf_counter() - start) * 1e3:.1f}ms")
     print(f"Server running on: http://0.0.0.0:{PORT}")
     print("Press Ctrl+C to stop")
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        s.listen()
-        
-        try:
-            while True:
-                conn, addr = s.accept()
-                # Create a new thread for each request
-                thread = threading.Thread(
-                    target=_serve_connection, 
-                    args=(conn, addr, content_dir),
-                    daemon=True
-                )
-                thread.start()
-        except KeyboardInterrupt:
-            print("\nShutting down server...")
-            sys.exit(0)
+    if PROCESSES > 1:
+        _run_prefork(content_dir)
+        return
+    with _listening_socket(False) as s:
+        _serve(s, content_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+import hashlib
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ratelimit import BURST_SLACK
+
+# longest key SharedCounter stores; longer request targets are not counted
+KEY_BYTES = 254
+_RECORD = 2 + KEY_BYTES
+
+
+class SharedCounter:
+    """ShardedCounter's interface over memory shared by forked worker processes.
+
+    The first time any process counts a key, the key gets the next sequential
+    id and is appended to a shared log; the id indexes an int64 slot in a
+    shared array. Every process keeps its own key -> id dict and reads the new
+    log entries when it meets a key it does not know yet, so known keys cost
+    one dict lookup and one striped lock. Create it before forking.
+    Capacity is fixed: keys past `max_keys`, or longer than KEY_BYTES encoded,
+    are not counted.
+    """
+
+    def __init__(self, max_keys: int = 65536, stripes: int = 64):
+        self.max_keys = max_keys
+        # anonymous mappings are MAP_SHARED, so forked children see the same pages
+        self._map = mmap.mmap(-1, 8 + 8 * max_keys + _RECORD * max_keys)
+        view = memoryview(self._map)
+        # [0] = number of keys in the log
+        self._header = view[:8].cast("q")
+        self._values = view[8:8 + 8 * max_keys].cast("q")
+        self._log = 8 + 8 * max_keys
+        self._register_lock = multiprocessing.Lock()
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        # this process's view of the log
+        self._ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._local_lock = threading.Lock()
+
+    def _sync(self) -> None:
+        # caller holds _local_lock; records are written before the count is bumped
+        for i in range(len(self._keys), self._header[0]):
+            offset = self._log + i * _RECORD
+            (length,) = struct.unpack_from("<H", self._map, offset)
+            key = self._map[offset + 2:offset + 2 + length].decode("utf-8", "surrogatepass")
+            self._ids[key] = i
+            self._keys.append(key)
+
+    def _id(self, key: str, create: bool) -> int:
+        # -1 when the key is unknown and not created (or there is no room for it)
+        i = self._ids.get(key)
+        if i is not None:
+            return i
+        with self._local_lock:
+            self._sync()
+            i = self._ids.get(key)
+            if i is not None or not create:
+                return -1 if i is None else i
+            encoded = key.encode("utf-8", "surrogatepass")
+            if len(encoded) > KEY_BYTES:
+                return -1
+            with self._register_lock:
+                # another process may have registered it since the last sync
+                self._sync()
+                i = self._ids.get(key)
+                if i is None:
+                    i = self._header[0]
+                    if i >= self.max_keys:
+                        return -1
+                    struct.pack_into(f"<H{len(encoded)}s", self._map, self._log + i * _RECORD,
+                                     len(encoded), encoded)
+                    self._header[0] = i + 1
+                    self._sync()
+            return i
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        i = self._id(key, create=True)
+        if i < 0:
+            return
+        with self._locks[i % len(self._locks)]:
+            self._values[i] += amount
+
+    def get(self, key: str, default: int = 0) -> int:
+        i = self._id(key, create=False)
+        total = self._values[i] if i >= 0 else 0
+        return total if total else default
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._local_lock:
+            self._sync()
+            keys = list(self._keys)
+        values = self._values[:len(keys)].tolist()
+        return {key: value for key, value in zip(keys, values) if value}
+
+
+class SharedRateLimiter:
+    """RateLimiter's GCRA over memory shared by forked worker processes.
+
+    Clients hash into `buckets` sets of `ways` slots; a slot holds a 64-bit
+    hash of the client and its theoretical arrival time (TAT). A slot whose
+    TAT has passed is as good as empty and is reused, so memory stays fixed
+    however many addresses show up. If all slots of a set are busy, the one
+    closest to expiring is taken over. The limits live in shared memory too,
+    so configure() in any worker applies to all of them. Create it before
+    forking.
+    """
+
+    def __init__(self, rate: int, per: float = 1.0, buckets: int = 16384, ways: int = 4,
+                 stripes: int = 64):
+        self.buckets = buckets
+        self.ways = ways
+        slots = buckets * ways
+        self._map = mmap.mmap(-1, 32 + 16 * slots)
+        view = memoryview(self._map)
+        # rate, per, interval, tolerance
+        self._limits = view[:32].cast("d")
+        self._hashes = view[32:32 + 8 * slots].cast("Q")
+        self._tats = view[32 + 8 * slots:].cast("d")
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        self.configure(rate, per)
+
+    @property
+    def rate(self) -> int:
+        return int(self._limits[0])
+
+    @property
+    def per(self) -> float:
+        return self._limits[1]
+
+    def configure(self, rate: int, per: float = 1.0) -> None:
+        interval = per / rate if rate > 0 else 0.0
+        self._limits[2] = interval
+        self._limits[3] = interval * (rate - 1 + BURST_SLACK) if rate > 0 else 0.0
+        self._limits[1] = per
+        # written last: allow() only reads the rest once the rate is on
+        self._limits[0] = rate
+
+    def allow(self, client: str, now: Optional[float] = None) -> bool:
+        if self._limits[0] <= 0:
+            return True
+        if now is None:
+            # CLOCK_MONOTONIC is system-wide, so TATs compare across processes
+            now = time.monotonic()
+        interval, tolerance = self._limits[2], self._limits[3]
+        # 0 marks an empty slot
+        h = int.from_bytes(hashlib.blake2b(client.encode(), digest_size=8).digest(), "little") or 1
+        bucket = h % self.buckets
+        first = bucket * self.ways
+        hashes, tats = self._hashes, self._tats
+        with self._locks[bucket % len(self._locks)]:
+            slot = -1
+            victim = first
+            for s in range(first, first + self.ways):
+                if hashes[s] == h:
+                    slot = s
+                    break
+                if tats[s] < tats[victim]:
+                    victim = s
+            if slot < 0:
+                slot = victim
+                hashes[slot] = h
+                tats[slot] = now
+            tat = tats[slot]
+            if tat < now:
+                tat = now
+            if tat - now > tolerance:
+                return False
+            tats[slot] = tat + interval
+            return True
+
+    def allow_many(self, clients: List[str], now: Optional[float] = None) -> List[bool]:
+        # same interface as RateLimiter.allow_many(); the stripes are process-shared
+        # locks, so this saves the clock reads but not the per-client locking
+        if now is None:
+            now = time.monotonic()
+        return [self.allow(client, now) for client in clients]
+
+    def __len__(self) -> int:
+        # clients whose TAT is still ahead, i.e. the ones the limiter remembers
+        now = time.monotonic()
+        return sum(1 for tat in self._tats if tat > now)
@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import tempfile
+import unittest
+
+from filecache import FileCache
+from mmapcache import MmapCache
+from pathcache import PathCache, resolve
+
+
+class TempTree(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+class FileCacheTest(TempTree):
+    def test_lru_eviction_by_bytes(self):
+        cache = FileCache(max_bytes=250, max_file_bytes=200, revalidate=60)
+        a, b, c = (self.write(n, n.encode() * 100) for n in "abc")
+        self.assertEqual(cache.get(a, "text/plain").body, b"a" * 100)
+        cache.get(b, "text/plain")
+        # touching a makes b the least recently used
+        cache.get(a, "text/plain")
+        cache.get(c, "text/plain")
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["bytes"], stats["evictions"]), (2, 200, 1))
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 3))
+        cache.get(a, "text/plain")
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_too_large(self):
+        cache = FileCache(max_bytes=1000, max_file_bytes=10)
+        self.assertIsNone(cache.get(self.write("big", b"x" * 11), "text/plain"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_revalidates_a_changed_file(self):
+        cache = FileCache(max_bytes=1000, max_file_bytes=1000, revalidate=0)
+        path = self.write("a", b"one")
+        first = cache.get(path, "text/plain")
+        self.assertIn(b"Content-Length: 3\r\n", first.head)
+        self.write("a", b"three")
+        second = cache.get(path, "text/plain")
+        self.assertEqual(second.body, b"three")
+        self.assertNotEqual(first.etag, second.etag)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        os.unlink(path)
+        self.assertIsNone(cache.get(path, "text/plain"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_invalidate(self):
+        cache = FileCache(max_bytes=1000, max_file_bytes=1000, revalidate=60)
+        path = self.write("a", b"one")
+        cache.get(path, "text/plain")
+        # within `revalidate` only invalidate() makes the change visible
+        self.write("a", b"two")
+        self.assertEqual(cache.get(path, "text/plain").body, b"one")
+        cache.invalidate(path)
+        self.assertEqual(cache.get(path, "text/plain").body, b"two")
+
+
+class PathCacheTest(TempTree):
+    def test_resolve(self):
+        self.write("a.html", b"hi")
+        os.mkdir(os.path.join(self.root, "dir"))
+        entry = resolve(self.root, "/a.html")
+        self.assertEqual((entry.kind, entry.size, entry.mime), ("file", 2, mimetypes.guess_type("a.html")[0]))
+        self.assertEqual(resolve(self.root, "/dir").kind, "dir")
+        self.assertEqual(resolve(self.root, "/").path, self.root)
+        self.assertEqual(resolve(self.root, "/nope").kind, "missing")
+        self.assertIsNone(resolve(self.root, "/../etc/passwd"))
+        self.assertIsNone(resolve(self.root, "/a\x00b"))
+
+    def test_symlink_out_of_the_root(self):
+        os.symlink("/", os.path.join(self.root, "escape"))
+        self.assertIsNone(resolve(self.root, "/escape/etc"))
+
+    def test_cache_and_invalidate(self):
+        cache = PathCache(max_entries=2, ttl=60)
+        self.assertEqual(cache.resolve(self.root, "/a").kind, "missing")
+        self.write("a", b"x")
+        # the cached answer holds for `ttl`, or until invalidate()
+        self.assertEqual(cache.resolve(self.root, "/a").kind, "missing")
+        cache.invalidate(self.root, "/a")
+        self.assertEqual(cache.resolve(self.root, "/a").kind, "file")
+        cache.resolve(self.root, "/b")
+        cache.resolve(self.root, "/c")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 4, "entries": 2})
+
+
+class MmapCacheTest(TempTree):
+    def test_shared_until_released(self):
+        cache = MmapCache(max_entries=1, revalidate=60)
+        a = self.write("a", b"a" * 100)
+        first = cache.acquire(a)
+        self.assertIs(cache.acquire(a), first)
+        self.assertEqual((first.refs, first.mmap[:3]), (2, b"aaa"))
+        # evicted while in use: retired, but still mapped for its readers
+        cache.acquire(self.write("b", b"b" * 10))
+        self.assertTrue(first.retired)
+        self.assertEqual(first.mmap[99:], b"a")
+        cache.release(first)
+        self.assertFalse(first.mmap.closed)
+        cache.release(first)
+        self.assertTrue(first.mmap.closed)
+        self.assertEqual(cache.stats()["unmaps"], 1)
+
+    def test_remaps_a_changed_file(self):
+        cache = MmapCache(max_entries=4, revalidate=0)
+        path = self.write("a", b"one")
+        first = cache.acquire(path)
+        cache.release(first)
+        self.write("a", b"three")
+        second = cache.acquire(path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.mmap[:], b"three")
+        self.assertTrue(first.mmap.closed)
+        cache.release(second)
+
+    def test_empty_and_missing(self):
+        cache = MmapCache(max_entries=4)
+        self.assertIsNone(cache.acquire(self.write("empty", b"")))
+        self.assertIsNone(cache.acquire(os.path.join(self.root, "missing")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from contentindex import ContentIndex, _Inotify
+
+
+class ContentIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        os.mkdir(os.path.join(self.root, "dir"))
+        self.write("a.html", b"hello")
+        self.write("dir/b.txt", b"bb")
+        self.index = ContentIndex(poll=0.05)
+        self.index.build(self.root)
+        self.changed = []
+        self._changed_lock = threading.Lock()
+        # file timestamps come from a coarse clock: step past its tick so the
+        # changes below move the directory mtimes the poller compares
+        time.sleep(0.05)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.root, name), "wb") as f:
+            f.write(data)
+
+    def on_change(self, paths):
+        with self._changed_lock:
+            self.changed.extend(paths)
+
+    def update(self) -> None:
+        # one round of the polling watcher
+        self.on_change(self.index._poll())
+
+    def wait_until(self, done) -> None:
+        deadline = time.monotonic() + 5
+        while not done():
+            self.assertLess(time.monotonic(), deadline, "the watcher did not catch up")
+            time.sleep(0.01)
+
+    def test_lookup(self):
+        entry = self.index.lookup("/a.html")
+        self.assertEqual((entry.kind, entry.size, entry.mime), ("file", 5, mimetypes.guess_type("a.html")[0]))
+        self.assertEqual(self.index.lookup("/").path, self.root)
+        for target in ("/dir", "/dir/", "//dir", "/dir/../dir"):
+            self.assertEqual(self.index.lookup(target).kind, "dir", target)
+        self.assertEqual(self.index.lookup("/dir/b.txt").size, 2)
+        self.assertIsNone(self.index.lookup("/missing"))
+        # ".." cannot climb above the root
+        self.assertEqual(self.index.lookup("/../a.html"), entry)
+        self.assertEqual(self.index.stats()["entries"], 4)
+
+    def test_symlink_out_of_the_root_is_left_out(self):
+        os.symlink("/", os.path.join(self.root, "escape"))
+        os.symlink("dir", os.path.join(self.root, "inside"))
+        self.index.build(self.root)
+        self.assertIsNone(self.index.lookup("/escape"))
+        self.assertEqual(self.index.lookup("/inside/b.txt").path, os.path.join(self.root, "dir", "b.txt"))
+
+    def check_create_delete_rename(self, update) -> None:
+        # `update` returns once the index has caught up with the change
+        b = os.path.join(self.root, "dir", "b.txt")
+
+        self.write("dir/new.txt", b"new")
+        update(lambda: self.index.lookup("/dir/new.txt") is not None)
+        self.assertEqual(self.index.lookup("/dir/new.txt").size, 3)
+
+        os.unlink(b)
+        update(lambda: self.index.lookup("/dir/b.txt") is None)
+        self.assertIn(b, self.changed)
+
+        os.rename(os.path.join(self.root, "dir"), os.path.join(self.root, "moved"))
+        update(lambda: self.index.lookup("/moved/new.txt") is not None)
+        self.assertIsNone(self.index.lookup("/dir"))
+        self.assertIsNone(self.index.lookup("/dir/new.txt"))
+        self.assertEqual(self.index.lookup("/moved").kind, "dir")
+
+        self.write("a.html", b"hello, world")
+        update(lambda: self.index.lookup("/a.html").size == 12)
+        self.assertEqual(self.index.stats()["errors"], 0)
+
+    def test_poll(self):
+        def update(done):
+            self.update()
+            self.assertTrue(done())
+            time.sleep(0.05)
+
+        self.check_create_delete_rename(update)
+
+    def test_inotify(self):
+        if _Inotify.open() is None:
+            self.skipTest("no inotify here")
+        self.index.watch(self.on_change)
+        self.assertEqual(self.index.watching, "inotify")
+        # wait for the watches to be in place
+        self.wait_until(lambda: self.index.watches == 2)
+        self.check_create_delete_rename(self.wait_until)
+        self.assertEqual(self.index.watching, "inotify")
+
+    def test_lookup_during_directory_changes(self):
+        # a name that exists before and after an update must never be missing
+        # while the update runs
+        sub = os.path.join(self.root, "dir")
+        for i in range(300):
+            self.write(f"dir/f{i}.html", b"x")
+        self.index.build(self.root)
+        inotify = _Inotify.open() is not None
+        if inotify:
+            self.index.watch(self.on_change)
+            self.wait_until(lambda: self.index.watches == 2)
+        before = self.index.lookup("/dir/f5.html")
+        stop = threading.Event()
+        misses = []
+
+        def reader():
+            n = 0
+            while not stop.is_set():
+                if self.index.lookup("/dir/f5.html") is None or self.index.lookup("/dir") is None:
+                    n += 1
+            misses.append(n)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            for i in range(1, 21):
+                os.chmod(sub, 0o700 if i % 2 else 0o755)
+                os.utime(sub, ns=(i * 10**9, i * 10**9))
+                if inotify:
+                    self.wait_until(lambda: self.index.lookup("/dir").mtime_ns == i * 10**9)
+                # what a rename or a lost event leads to: the whole subtree re-read
+                self.index.refresh("/dir")
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(misses, [0])
+        self.assertEqual(self.index.lookup("/dir/f5.html"), before)
+        self.assertEqual(self.index.lookup("/dir").mtime_ns, 20 * 10**9)
+
+    def test_attribute_change_is_not_a_rescan(self):
+        if _Inotify.open() is None:
+            self.skipTest("no inotify here")
+        self.index.watch(self.on_change)
+        # the watches, then the watcher's own rescan
+        self.wait_until(lambda: self.index.watches == 2 and self.index.rescans == 2)
+        before = self.index.lookup("/dir/b.txt")
+        os.utime(os.path.join(self.root, "dir"), ns=(10**9, 10**9))
+        self.wait_until(lambda: self.index.lookup("/dir").mtime_ns == 10**9)
+        # the entries under it were not even re-read
+        self.assertIs(self.index.lookup("/dir/b.txt"), before)
+        os.utime(os.path.join(self.root, "a.html"), ns=(10**9, 10**9))
+        self.wait_until(lambda: self.index.lookup("/a.html").mtime_ns == 10**9)
+        self.assertIn(os.path.join(self.root, "a.html"), self.changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
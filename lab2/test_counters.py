@@ -0,0 +1,59 @@
+import os
+import threading
+import unittest
+
+from counters import ShardedCounter
+from shared import KEY_BYTES, SharedCounter
+
+
+class ShardedCounterTest(unittest.TestCase):
+    def test_totals_across_threads(self):
+        counter = ShardedCounter(shards=4)
+
+        def work():
+            for i in range(1000):
+                counter.increment("/a")
+                counter.increment(f"/b{i % 2}", 2)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(counter.get("/a"), 8000)
+        self.assertEqual(counter.snapshot(), {"/a": 8000, "/b0": 8000, "/b1": 8000})
+        self.assertEqual(counter.get("/missing", -1), -1)
+
+
+class SharedCounterTest(unittest.TestCase):
+    def test_counts_from_forked_children(self):
+        counter = SharedCounter(max_keys=16)
+        counter.increment("/parent")
+        children = []
+        for n in range(4):
+            pid = os.fork()
+            if pid == 0:
+                # the children register keys the parent has never seen
+                try:
+                    for _ in range(500):
+                        counter.increment("/shared")
+                        counter.increment(f"/child{n}")
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+        self.assertEqual(counter.get("/shared"), 2000)
+        self.assertEqual(counter.snapshot(),
+                         {"/parent": 1, "/shared": 2000, "/child0": 500, "/child1": 500,
+                          "/child2": 500, "/child3": 500})
+
+    def test_capacity(self):
+        counter = SharedCounter(max_keys=2)
+        for key in ("/a", "/b", "/c", "/" + "x" * KEY_BYTES):
+            counter.increment(key)
+        self.assertEqual(counter.snapshot(), {"/a": 1, "/b": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
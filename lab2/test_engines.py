@@ -0,0 +1,176 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from typing import Dict, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Reader:
+    """Responses off one client socket, in order: (status, headers, body)."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buf = b""
+
+    def _fill(self) -> None:
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("closed by the server")
+        self.buf += chunk
+
+    def response(self) -> Tuple[int, Dict[str, str], bytes]:
+        while b"\r\n\r\n" not in self.buf:
+            self._fill()
+        head, self.buf = self.buf.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        status = int(lines[0].split()[1])
+        length = 0 if status == 304 else int(headers.get("content-length", "0"))
+        while len(self.buf) < length:
+            self._fill()
+        body, self.buf = self.buf[:length], self.buf[length:]
+        return status, headers, body
+
+
+class _EngineChecks:
+    """lab1/test_server.py's checks, plus the HTTP/1.1 ones, against one SERVER_MODE."""
+
+    mode = ""
+    env: Dict[str, str] = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        root = cls._tmp.name
+        os.mkdir(os.path.join(root, "books"))
+        for name, data in (("index.html", b"<h1>home</h1>"), ("logo.png", b"\x89PNG" + b"x" * 5000),
+                           ("books/book1.pdf", b"%PDF" + b"y" * 100000)):
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(data)
+        cls.port = _free_port()
+        env = dict(os.environ, PORT=str(cls.port), SERVER_MODE=cls.mode, WORK_DELAY="0",
+                   COUNT_DELAY="0", REQUESTS_PER_SECOND="0", **cls.env)
+        cls.server = subprocess.Popen([sys.executable, os.path.join(HERE, "server_mt.py"), root],
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", cls.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or cls.server.poll() is not None:
+                    cls.tearDownClass()
+                    raise
+                time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.kill()
+        cls.server.wait()
+        cls._tmp.cleanup()
+
+    def connect(self) -> socket.socket:
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        self.addCleanup(sock.close)
+        return sock
+
+    def get(self, target: str, headers: Optional[Dict[str, str]] = None, sock: Optional[socket.socket] = None):
+        sock = sock or self.connect()
+        lines = [f"GET {target} HTTP/1.1", "Host: localhost"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+        return _Reader(sock).response()
+
+    def test_files(self):
+        for target, size, mime in (("/", None, "text/html"), ("/index.html", 13, "text/html"),
+                                   ("/logo.png", 5004, "image/png"), ("/books/book1.pdf", 100004, "application/pdf")):
+            status, headers, body = self.get(target)
+            self.assertEqual(status, 200, target)
+            self.assertTrue(headers["content-type"].startswith(mime), target)
+            if size is not None:
+                self.assertEqual(len(body), size, target)
+
+    def test_directory(self):
+        status, _, body = self.get("/books/")
+        self.assertEqual(status, 200)
+        self.assertIn(b"book1.pdf", body)
+        status, headers, _ = self.get("/books")
+        self.assertEqual(status, 301)
+        self.assertEqual(headers["location"], "/books/")
+
+    def test_not_found(self):
+        self.assertEqual(self.get("/nonexistent.pdf")[0], 404)
+        self.assertEqual(self.get("/../../etc/passwd")[0], 404)
+
+    def test_keep_alive(self):
+        sock = self.connect()
+        for target in ("/index.html", "/logo.png", "/missing", "/index.html"):
+            status, headers, _ = self.get(target, sock=sock)
+            self.assertIn(status, (200, 404))
+            self.assertNotEqual(headers.get("connection"), "close")
+
+    def test_pipelining(self):
+        sock = self.connect()
+        sock.sendall(b"".join(f"GET {t} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+                              for t in ("/logo.png", "/missing", "/index.html", "/books")))
+        reader = _Reader(sock)
+        replies = [reader.response() for _ in range(4)]
+        self.assertEqual([r[0] for r in replies], [200, 404, 200, 301])
+        self.assertEqual(len(replies[0][2]), 5004)
+        self.assertEqual(replies[2][2], b"<h1>home</h1>")
+
+    def test_not_modified(self):
+        status, headers, _ = self.get("/index.html")
+        etag = headers["etag"]
+        status, headers, body = self.get("/index.html", {"If-None-Match": etag})
+        self.assertEqual((status, body), (304, b""))
+        self.assertEqual(headers["etag"], etag)
+        self.assertEqual(self.get("/index.html", {"If-None-Match": '"other"'})[0], 200)
+
+    def test_idle_connections_do_not_block_new_clients(self):
+        # more idle keep-alive connections than the pool has workers
+        idle = [self.connect() for _ in range(6)]
+        for sock in idle:
+            self.assertEqual(self.get("/index.html", sock=sock)[0], 200)
+        start = time.monotonic()
+        self.assertEqual(self.get("/index.html")[0], 200)
+        self.assertLess(time.monotonic() - start, 1.0)
+        # and the idle ones are still served when they come back
+        for sock in idle:
+            self.assertEqual(self.get("/logo.png", sock=sock)[0], 200)
+
+    def test_header_too_large(self):
+        status, headers, _ = self.get("/index.html", {"X-Big": "a" * 9000})
+        self.assertEqual(status, 431)
+        self.assertEqual(headers.get("connection"), "close")
+
+
+class ThreadEngineTest(_EngineChecks, unittest.TestCase):
+    mode = "thread"
+
+
+class PoolEngineTest(_EngineChecks, unittest.TestCase):
+    mode = "pool"
+    env = {"MAX_WORKERS": "4"}
+
+
+class AsyncEngineTest(_EngineChecks, unittest.TestCase):
+    mode = "async"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from histogram import SUB_BUCKET_BITS, LatencyHistogram
+
+
+def exact_percentile(values, p):
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_empty(self):
+        h = LatencyHistogram()
+        self.assertEqual(h.percentile(99), 0.0)
+        self.assertEqual(h.mean(), 0.0)
+        self.assertEqual(list(h.buckets()), [])
+
+    def test_small_values_are_exact(self):
+        h = LatencyHistogram()
+        for us in range(1, 101):
+            h.record(us / 1e6)
+        self.assertEqual(round(h.percentile(50) * 1e6), 50)
+        self.assertEqual(round(h.percentile(99) * 1e6), 99)
+        self.assertEqual(round(h.percentile(100) * 1e6), 100)
+        self.assertEqual((h.min_us, h.max_us, h.count), (1, 100, 100))
+        self.assertAlmostEqual(h.mean(), 50.5e-6)
+
+    def test_percentiles_within_the_relative_error(self):
+        rng = random.Random(1)
+        values = [int(rng.lognormvariate(8, 2)) for _ in range(20000)]
+        h = LatencyHistogram()
+        for us in values:
+            h.record(us / 1e6)
+        for p in (50, 90, 99, 99.9, 100):
+            exact = exact_percentile(values, p)
+            got = h.percentile(p) * 1e6
+            self.assertGreaterEqual(round(got), exact, p)
+            self.assertLessEqual(got, exact * (1 + 1 / (1 << SUB_BUCKET_BITS)) + 1, p)
+        self.assertEqual(round(h.percentile(100) * 1e6), max(values))
+
+    def test_merge(self):
+        rng = random.Random(2)
+        values = [rng.expovariate(1 / 0.005) for _ in range(5000)]
+        whole = LatencyHistogram()
+        parts = [LatencyHistogram() for _ in range(3)]
+        for i, seconds in enumerate(values):
+            whole.record(seconds)
+            parts[i % 3].record(seconds)
+        merged = LatencyHistogram()
+        for part in parts:
+            merged.merge(part)
+        # merging into an empty histogram and into a non-empty one
+        merged.merge(LatencyHistogram())
+        self.assertEqual(list(merged.buckets()), list(whole.buckets()))
+        self.assertEqual((merged.count, merged.total_us, merged.min_us, merged.max_us),
+                         (whole.count, whole.total_us, whole.min_us, whole.max_us))
+        self.assertEqual(merged.summary(), whole.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
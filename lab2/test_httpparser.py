@@ -0,0 +1,103 @@
+import unittest
+
+from httpparser import ParseError, RequestParser
+
+GET = b"GET /index.html HTTP/1.1\r\nHost: localhost\r\nAccept: */*\r\n\r\n"
+
+
+class RequestParserTest(unittest.TestCase):
+    def parse_all(self, parser: RequestParser):
+        requests = []
+        request = parser.next_request()
+        while request is not None:
+            requests.append(request)
+            request = parser.next_request()
+        return requests
+
+    def assertStatus(self, data: bytes, status: int, **limits):
+        parser = RequestParser(**limits)
+        parser.feed(data)
+        with self.assertRaises(ParseError) as caught:
+            self.parse_all(parser)
+        self.assertEqual(caught.exception.status, status)
+
+    def test_whole_request(self):
+        parser = RequestParser()
+        parser.feed(GET)
+        head = parser.next_request()
+        self.assertEqual((head.method, head.target, head.version), ("GET", "/index.html", "HTTP/1.1"))
+        self.assertEqual(head.headers, {"host": "localhost", "accept": "*/*"})
+        self.assertIsNone(parser.next_request())
+        self.assertEqual(parser.buffered, 0)
+
+    def test_split_across_feeds(self):
+        # every split point, down to one byte at a time
+        for size in (1, 2, 3, 7, 64):
+            parser = RequestParser()
+            heads = []
+            for i in range(0, len(GET), size):
+                parser.feed(GET[i:i + size])
+                heads.extend(self.parse_all(parser))
+            self.assertEqual(len(heads), 1, size)
+            self.assertEqual(heads[0].target, "/index.html")
+            self.assertEqual(heads[0].headers["accept"], "*/*")
+
+    def test_blank_line_split_between_feeds(self):
+        parser = RequestParser()
+        parser.feed(GET[:-3])
+        self.assertIsNone(parser.next_request())
+        parser.feed(GET[-3:-1])
+        self.assertIsNone(parser.next_request())
+        parser.feed(GET[-1:])
+        self.assertEqual(parser.next_request().target, "/index.html")
+
+    def test_pipelined(self):
+        parser = RequestParser()
+        parser.feed(GET + b"GET /a HTTP/1.1\r\n\r\n\r\nGET /b HTTP/1.0\r\nHost: x\r\n\r\nGET /c")
+        heads = self.parse_all(parser)
+        self.assertEqual([h.target for h in heads], ["/index.html", "/a", "/b"])
+        self.assertEqual(heads[2].version, "HTTP/1.0")
+        # the start of the fourth stays buffered
+        self.assertEqual(parser.buffered, len(b"GET /c"))
+        parser.feed(b" HTTP/1.1\r\n\r\n")
+        self.assertEqual(parser.next_request().target, "/c")
+
+    def test_body_is_skipped(self):
+        parser = RequestParser()
+        parser.feed(b"GET /a HTTP/1.1\r\nContent-Length: 5\r\n\r\nab")
+        self.assertEqual(parser.next_request().target, "/a")
+        self.assertIsNone(parser.next_request())
+        parser.feed(b"cdeGET /b HTTP/1.1\r\n\r\n")
+        self.assertEqual(parser.next_request().target, "/b")
+
+    def test_repeated_headers_are_joined(self):
+        parser = RequestParser()
+        parser.feed(b"GET / HTTP/1.1\r\nAccept: a\r\nACCEPT:  b \r\n\r\n")
+        self.assertEqual(parser.next_request().headers["accept"], "a, b")
+
+    def test_malformed(self):
+        self.assertStatus(b"GET /index.html\r\n\r\n", 400)
+        self.assertStatus(b"GET  / HTTP/1.1\r\n\r\n", 400)
+        self.assertStatus(b"GET / FTP/1.1\r\n\r\n", 400)
+        self.assertStatus(b"GET / HTTP/2.0\r\n\r\n", 505)
+        self.assertStatus(b"GET / HTTP/1.1\r\nNoColon\r\n\r\n", 400)
+        self.assertStatus(b"GET / HTTP/1.1\r\nHost : x\r\n\r\n", 400)
+        self.assertStatus(b"GET / HTTP/1.1\r\n folded\r\n\r\n", 400)
+        self.assertStatus(b"GET / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400)
+        self.assertStatus(b"GET / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", 501)
+
+    def test_limits(self):
+        self.assertStatus(b"GET / HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n", 413)
+        # an over-long request line is 414, even when it takes the head over max_header_bytes
+        self.assertStatus(b"GET /" + b"a" * 9000 + b" HTTP/1.1\r\n\r\n", 414)
+        self.assertStatus(b"GET /" + b"a" * 9000 + b" HTTP/1.1\r\n\r\n", 414, max_header_bytes=16384)
+        # a short request line with too much header is 431
+        self.assertStatus(b"GET / HTTP/1.1\r\nX: " + b"a" * 9000 + b"\r\n\r\n", 431)
+        # no end of the request line yet, but already too long for one
+        self.assertStatus(b"GET /" + b"a" * 9000, 414)
+        self.assertStatus(b"GET / HTTP/1.1\r\nX: " + b"a" * 9000, 431)
+        self.assertStatus(b"GET / HTTP/1.1\r\n" + b"X: y\r\n" * 5 + b"\r\n", 431, max_headers=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from metrics import FILE, OTHER, Metrics
+
+
+class MetricsTest(unittest.TestCase):
+    def render(self, metrics: Metrics) -> str:
+        return metrics.render({}).decode()
+
+    def test_shed_is_not_a_send_sample(self):
+        metrics = Metrics(shards=2)
+        metrics.response("200 OK", FILE, 100, 0.002)
+        for _ in range(3):
+            metrics.shed("503 Service Unavailable", 20)
+        metrics.response("429 Too Many Requests", OTHER, 10, 0.0005)
+        text = self.render(metrics)
+        self.assertIn('http_connections_shed_total{code="503"} 3\n', text)
+        self.assertNotIn('code="503",class=', text)
+        self.assertIn('http_requests_total{code="429",class="other"} 1\n', text)
+        self.assertIn('http_phase_seconds_count{phase="send"} 2\n', text)
+        self.assertIn("http_response_bytes_total 170\n", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from ratelimit import RateLimiter
+from shared import SharedRateLimiter
+
+
+class RateLimiterTest(unittest.TestCase):
+    limiter = RateLimiter
+
+    def test_burst_then_refill(self):
+        limiter = self.limiter(5, 1.0)
+        now = 1000.0
+        self.assertEqual([limiter.allow("a", now) for _ in range(6)], [True] * 5 + [False])
+        # one request's worth every per / rate seconds
+        self.assertFalse(limiter.allow("a", now + 0.1))
+        self.assertTrue(limiter.allow("a", now + 0.2))
+        self.assertFalse(limiter.allow("a", now + 0.2))
+        # idle for a whole period: the full burst again, and no more
+        later = now + 10
+        self.assertEqual([limiter.allow("a", later) for _ in range(6)], [True] * 5 + [False])
+
+    def test_clients_are_independent(self):
+        limiter = self.limiter(2, 1.0)
+        now = 1000.0
+        self.assertEqual([limiter.allow("a", now) for _ in range(3)], [True, True, False])
+        self.assertEqual([limiter.allow("b", now) for _ in range(3)], [True, True, False])
+
+    def test_allow_many(self):
+        limiter = self.limiter(3, 1.0)
+        now = 1000.0
+        self.assertEqual(limiter.allow_many(["a", "b", "a", "a", "a", "b"], now),
+                         [True, True, True, True, False, True])
+        self.assertEqual(limiter.allow_many(["a", "b"], now + 1 / 3), [True, True])
+
+    def test_configure(self):
+        limiter = self.limiter(1, 1.0)
+        now = 1000.0
+        self.assertTrue(limiter.allow("a", now))
+        self.assertFalse(limiter.allow("a", now))
+        limiter.configure(0)
+        # 0 turns the limit off
+        self.assertTrue(all(limiter.allow("a", now) for _ in range(100)))
+
+
+class SharedRateLimiterTest(RateLimiterTest):
+    limiter = SharedRateLimiter
+
+    def test_full_set_takes_over_a_slot(self):
+        # one set of two slots: a third client evicts the one closest to expiring
+        limiter = SharedRateLimiter(1, 1.0, buckets=1, ways=2)
+        now = 1000.0
+        self.assertTrue(limiter.allow("a", now))
+        self.assertTrue(limiter.allow("b", now + 0.5))
+        self.assertTrue(limiter.allow("c", now + 0.5))
+        # "a" was forgotten, "b" was not
+        self.assertTrue(limiter.allow("a", now + 0.5))
+        self.assertFalse(limiter.allow("b", now + 0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from httpparser import RequestHead
+from server_mt import (MAX_RANGES, PATH_CACHE, Reply, Request, _body_plan, _parse_range, _parse_request,
+                       _route)
+from validators import etag_of_stat
+
+
+class ParseRangeTest(unittest.TestCase):
+    # (offset, length) pairs for a 1000-byte file
+
+    def test_closed(self):
+        self.assertEqual(_parse_range("bytes=0-99", 1000), [(0, 100)])
+        self.assertEqual(_parse_range("bytes=999-999", 1000), [(999, 1)])
+
+    def test_open_ended(self):
+        self.assertEqual(_parse_range("bytes=900-", 1000), [(900, 100)])
+
+    def test_suffix(self):
+        self.assertEqual(_parse_range("bytes=-200", 1000), [(800, 200)])
+        # a suffix longer than the file is the whole file
+        self.assertEqual(_parse_range("bytes=-5000", 1000), [(0, 1000)])
+
+    def test_end_past_the_file_is_clamped(self):
+        self.assertEqual(_parse_range("bytes=500-99999999999999999999", 1000), [(500, 500)])
+
+    def test_multi_range(self):
+        self.assertEqual(_parse_range("bytes=0-9, 500-, -10", 1000), [(0, 10), (500, 500), (990, 10)])
+        # unsatisfiable parts are dropped, the rest are kept
+        self.assertEqual(_parse_range("bytes=0-9,5000-6000", 1000), [(0, 10)])
+
+    def test_unsatisfiable(self):
+        # an empty list: answer 416
+        self.assertEqual(_parse_range("bytes=1000-", 1000), [])
+        self.assertEqual(_parse_range("bytes=-0", 1000), [])
+        self.assertEqual(_parse_range("bytes=5000-6000,2000-", 1000), [])
+
+    def test_ignored(self):
+        # None: send the whole file
+        for spec in ("items=0-9", "bytes=", "bytes=abc", "bytes=10-5", "bytes=5", "bytes=1-2-3"):
+            self.assertIsNone(_parse_range(spec, 1000), spec)
+
+    def test_too_many_ranges(self):
+        spec = "bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES + 1))
+        self.assertIsNone(_parse_range(spec, 1000))
+        spec = "bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES))
+        self.assertEqual(len(_parse_range(spec, 1000)), MAX_RANGES)
+
+    def test_body_plan(self):
+        reply = Reply("200 OK", {"Content-Type": "text/plain"}, range_spec="bytes=2000-")
+        status, headers, parts, _ = _body_plan(reply, 1000)
+        self.assertEqual(status, "416 Range Not Satisfiable")
+        self.assertEqual(headers["Content-Range"], "bytes */1000")
+        self.assertEqual(parts, [])
+
+        reply = Reply("200 OK", {"Content-Type": "text/plain"}, range_spec="bytes=-100")
+        status, headers, parts, _ = _body_plan(reply, 1000)
+        self.assertEqual(status, "206 Partial Content")
+        self.assertEqual(headers["Content-Range"], "bytes 900-999/1000")
+        self.assertEqual(parts, [(b"", 900, 100)])
+
+        reply = Reply("200 OK", {"Content-Type": "text/plain"}, range_spec="bytes=0-0,-1")
+        status, headers, parts, trailer = _body_plan(reply, 1000)
+        self.assertTrue(headers["Content-Type"].startswith("multipart/byteranges; boundary="))
+        self.assertEqual(int(headers["Content-Length"]),
+                         sum(len(prefix) + length for prefix, _, length in parts) + len(trailer))
+
+
+class ParseRequestTest(unittest.TestCase):
+    def parse(self, target: str, method: str = "GET"):
+        return _parse_request(RequestHead(method, target, "HTTP/1.1", {}))
+
+    def test_target_is_decoded(self):
+        error, request = self.parse("/a%20b.html")
+        self.assertIsNone(error)
+        self.assertEqual(request.target, "/a b.html")
+
+    def test_nul_is_rejected(self):
+        error, request = self.parse("/%00")
+        self.assertIsNone(request)
+        self.assertTrue(error.status.startswith("400"))
+
+    def test_only_get(self):
+        error, _ = self.parse("/", "POST")
+        self.assertTrue(error.status.startswith("405"))
+
+
+class ETagTest(unittest.TestCase):
+    def test_changes_with_the_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.html")
+            with open(path, "w") as f:
+                f.write("one")
+            first = etag_of_stat(os.stat(path))
+            self.assertEqual(first, etag_of_stat(os.stat(path)))
+            with open(path, "w") as f:
+                f.write("three")
+            self.assertNotEqual(first, etag_of_stat(os.stat(path)))
+            self.assertTrue(first.startswith('"') and first.endswith('"'))
+
+
+class SiblingTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        with open(os.path.join(self.root, "index.html"), "wb") as f:
+            f.write(b"<p>hello</p>" * 100)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def get(self):
+        return _route(Request("/index.html", "HTTP/1.1", {"accept-encoding": "br, gzip"}), self.root)
+
+    def test_hot_file_costs_no_stat(self):
+        self.get()
+        with mock.patch("os.stat", wraps=os.stat) as stat:
+            for _ in range(10):
+                self.get()
+        self.assertEqual(stat.call_count, 0)
+
+    def test_new_sibling_is_served(self):
+        self.assertNotEqual(self.get().body, b"pre-built")
+        with open(os.path.join(self.root, "index.html.gz"), "wb") as f:
+            f.write(b"pre-built")
+        # seen once the path cache entry is re-checked
+        PATH_CACHE.invalidate(self.root, "/index.html.gz")
+        reply = self.get()
+        self.assertEqual(reply.headers["Content-Encoding"], "gzip")
+        self.assertEqual(reply.body, b"pre-built")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+
+def etag_of_stat(st: os.stat_result) -> str:
+    # strong validator for one version of a file: a write changes the mtime or the
+    # size, and an atomic replace (new file renamed over the old one) the inode.
+    # Taken from the stat result alone, so it costs no read, and it describes
+    # exactly the version that stat() saw
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(headers: Dict[str, str], etag: str, mtime: float) -> bool:
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if "if-none-match" in headers:
+        return _etag_matches(headers["if-none-match"], etag)
+    since = headers.get("if-modified-since")
+    if since:
+        parsed = _parse_http_date(since)
+        return parsed is not None and int(mtime) <= parsed
+    return False
+
+
+def range_still_valid(headers: Dict[str, str], etag: str, mtime: float) -> bool:
+    # If-Range: only honor Range when the client's copy is still current
+    condition = headers.get("if-range")
+    if not condition:
+        return True
+    condition = condition.strip()
+    if condition.startswith('"'):
+        return condition == etag
+    parsed = _parse_http_date(condition)
+    return parsed is not None and int(mtime) <= parsed